@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""Benchmark the collector by replaying fixtures.
+
+Equipments are explored from fixtures, recorded with the C{record}
+option of the collector or generated with make_fixtures.py, like in
+production: community probe, basic information, plugins and write
+to the database through DatabaseWriter. Answers are given without
+any delay.
+
+All equipments with a fixture are explored for several rounds. For
+each round, the number of equipments explored per second and the
+growth of memory per equipment are reported. At the end, the mean
+duration of an exploration is reported for each plugin. Any
+exploration failure makes the benchmark fail.
+
+The schema from database.sql is loaded in schema "wiremaps_bench" of
+a scratch database.
+
+!!! Schema "wiremaps_bench" is destroyed !!!
+
+Usage: python tools/bench_collector.py "dbname=scratch" fixtures [rounds [parallel]]
+"""
+
+import os
+import sys
+import time
+import resource
+
+import psycopg2
+from pkg_resources import resource_string
+from twisted.internet import defer, reactor
+from twisted.enterprise import adbapi
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.collector.core import CollectorService
+
+SCHEMA = "wiremaps_bench"
+
+def searchPath(conn):
+    """Make a new connection of the pool use the benchmark schema."""
+    cur = conn.cursor()
+    cur.execute("SET search_path TO %s" % SCHEMA)
+    cur.close()
+    conn.commit()
+
+def explore(collector, ips, parallel):
+    """Explore equipments, no more than C{parallel} at the same time.
+
+    @return: deferred list of C{(ip, failure)} for failed explorations
+    """
+    explorations = defer.DeferredSemaphore(parallel)
+    failures = []
+    dl = []
+    for ip in ips:
+        d = explorations.run(collector.startExploreIP, ip)
+        d.addErrback(lambda failure, ip: failures.append((ip, failure)), ip)
+        dl.append(d)
+    d = defer.DeferredList(dl)
+    d.addCallback(lambda _: failures)
+    return d
+
+def bench(collector, ips, rounds, parallel, output):
+    """Run the rounds of the benchmark.
+
+    Collector messages are discarded, results are written to
+    C{output}.
+
+    @return: deferred C{True} if all explorations succeeded
+    """
+    for r in range(rounds):
+        started = time.time()
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        failures = yield explore(collector, ips, parallel)
+        elapsed = time.time() - started
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxrss
+        print >>output, "round %d: %d equipments in %.1f seconds " \
+            "(%.2f equipments/s, %d KB of memory per equipment)" % (
+            r + 1, len(ips), elapsed, len(ips)/elapsed, maxrss/len(ips))
+        if failures:
+            for ip, failure in failures:
+                print >>output, "  %s: %s" % (ip, failure.getErrorMessage())
+            defer.returnValue(False)
+    print >>output, "Mean exploration duration for each plugin:"
+    for plugin, (explorations, duration) in \
+            sorted(collector.stats.plugins.items()):
+        print >>output, "  %-30s %6.3f s (%d explorations)" % (
+            plugin, duration/explorations, explorations)
+    defer.returnValue(True)
+bench = defer.inlineCallbacks(bench)
+
+def main(dsn, directory, rounds, parallel):
+    ips = sorted([ip for ip in os.listdir(directory)
+                  if not ip.endswith(".tmp")])
+    if not ips:
+        print "No fixture in %s" % directory
+        return False
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS %s CASCADE" % SCHEMA)
+    cur.execute("CREATE SCHEMA %s" % SCHEMA)
+    cur.execute("SET search_path TO %s" % SCHEMA)
+    cur.execute(resource_string("wiremaps.core", "database.sql"))
+    conn.commit()
+    conn.close()
+
+    dbpool = adbapi.ConnectionPool("psycopg2", dsn,
+                                   cp_min=1, cp_max=2,
+                                   cp_openfun=searchPath)
+    collector = CollectorService({'collector': {
+                'community': ["public"],
+                'replay': directory,
+                'parallel': parallel,
+                'timeout': 1000,
+                'retries': 0,
+                }}, dbpool)
+    collector.loadPlugins()
+
+    result = []
+    output = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    d = bench(collector, ips, rounds, parallel, output)
+    d.addBoth(result.append)
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+    sys.stdout = output
+    dbpool.close()
+    if not isinstance(result[0], bool):
+        print result[0]
+        return False
+    return result[0]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print __doc__
+        sys.exit(2)
+    rounds = len(sys.argv) > 3 and int(sys.argv[3]) or 3
+    parallel = len(sys.argv) > 4 and int(sys.argv[4]) or 10
+    sys.exit(not main(sys.argv[1], sys.argv[2], rounds, parallel) and 1 or 0)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+"""Measure the cost of SNMP answers as the number of agents grows.
+
+Each session registers its own socket in the reactor and a single
+timer handles retransmissions for all sessions with requests in
+flight. The cost of handling an answer should not depend on the
+number of sessions.
+
+A responder process answers GET requests on a local UDP port with
+an empty string. For each number of agents, as many sessions are
+opened, each one with its own socket, and each session keeps one
+GET in flight until the given number of answers has been received.
+The CPU time spent by the benchmark process (the responder is not
+counted) for each answer is reported along with the number of
+answers per second and the number of requests without answer.
+
+All numbers of agents are then run again with sessions sending their
+requests through a few shared sockets, like with the C{sockets}
+option of the collector. Shared sockets cannot be disabled once
+enabled, so they come last.
+
+The limit of open files is raised to the hard limit. It may need to
+be raised further (ulimit -Hn) for the largest number of agents.
+
+Usage: python tools/bench_snmp.py [answers [sockets [agents ...]]]
+
+C{answers} is the number of answers for each number of agents (50000
+by default), C{sockets} the number of shared sockets (4 by default,
+0 to only run sessions with their own socket).
+"""
+
+import os
+import sys
+import time
+import socket
+import resource
+import multiprocessing
+
+from twisted.internet import epollreactor
+epollreactor.install()
+from twisted.internet import defer, reactor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.collector import snmp
+
+AGENTS = [10, 100, 1000, 5000]
+SYSDESCR = '.1.3.6.1.2.1.1.1.0'
+
+def header(data, pos):
+    """Decode the header of a BER element.
+
+    @param data: encoded data
+    @param pos: position of the element
+    @return: position of the content of the element and position of
+       the next element
+    """
+    length = ord(data[pos + 1])
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int(data[pos:pos + size].encode("hex"), 16)
+        pos += size
+    return pos, pos + length
+
+def answer(request):
+    """Turn a GET request for a single OID into its answer.
+
+    The PDU type becomes GetResponse and the NULL value becomes an
+    empty string. Both have the same length as the original ones, so
+    no length needs to be changed.
+
+    @return: the answer or C{None} if this is not such a request
+    """
+    try:
+        message, end = header(request, 0)
+        pos = header(request, message)[1] # Version
+        pos = header(request, pos)[1]     # Community
+    except (IndexError, ValueError):
+        return None
+    if request[pos:pos + 1] != "\xa0" or not request.endswith("\x05\x00"):
+        return None
+    return "%s\xa2%s\x04\x00" % (request[:pos], request[pos + 1:-2])
+
+def respond(sock):
+    """Answer requests received on a socket, forever."""
+    while True:
+        request, peer = sock.recvfrom(65535)
+        response = answer(request)
+        if response is not None:
+            sock.sendto(response, peer)
+
+def cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def run(port, agents, answers):
+    """Keep one request in flight for each agent until enough answers.
+
+    @return: deferred tuple C{(answers, requests without answer,
+       elapsed time, CPU time)}
+    """
+    sessions = [snmp.AgentProxy("127.0.0.1:%d" % port, "public", 2)
+                for i in range(agents)]
+    done = defer.Deferred()
+    counts = [0, 0]             # Answers, requests without answer
+
+    def ask(session):
+        if done.called:
+            return
+        d = session.get([SYSDESCR])
+        d.addCallbacks(answered, failed, errbackArgs=(session,),
+                       callbackArgs=(session,))
+
+    def answered(result, session):
+        counts[0] += 1
+        if counts[0] >= answers and not done.called:
+            done.callback(None)
+        ask(session)
+
+    def failed(failure, session):
+        if done.called:
+            return
+        failure.trap(snmp.SNMPException)
+        counts[1] += 1
+        ask(session)
+
+    started, used = time.time(), cpu()
+    for session in sessions:
+        ask(session)
+    yield done
+    elapsed, used = time.time() - started, cpu() - used
+    for session in sessions:
+        session.close()
+    defer.returnValue((counts[0], counts[1], elapsed, used))
+run = defer.inlineCallbacks(run)
+
+def bench(port, levels, answers, output):
+    print >>output, "%8s %12s %16s %10s" % ("agents", "answers/s",
+                                             "CPU us/answer", "timeouts")
+    costs = []
+    for agents in levels:
+        count, timeouts, elapsed, used = yield run(port, agents, answers)
+        costs.append(used/count)
+        print >>output, "%8d %12.0f %16.1f %10d" % (
+            agents, count/elapsed, used*1000000/count, timeouts)
+    print >>output, "Cost of an answer with %d agents: %.2f times the " \
+        "cost with %d agents" % (levels[-1], costs[-1]/costs[0], levels[0])
+bench = defer.inlineCallbacks(bench)
+
+def both(port, levels, answers, sockets, output):
+    """Run all levels with own sockets, then with shared sockets."""
+    print >>output, "Each session with its own socket:"
+    yield bench(port, levels, answers, output)
+    if sockets:
+        snmp.share(sockets)
+        print >>output, "Sessions sharing %d sockets:" % sockets
+        yield bench(port, levels, answers, output)
+both = defer.inlineCallbacks(both)
+
+def main(answers, sockets, levels):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and hard < max(levels) + 100:
+        print "Not enough files can be opened for %d agents (ulimit -Hn)" % (
+            max(levels))
+        return False
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4*1024*1024)
+    responder = multiprocessing.Process(target=respond, args=(sock,))
+    responder.daemon = True
+    responder.start()
+
+    result = []
+    d = both(sock.getsockname()[1], levels, answers, sockets, sys.stdout)
+    d.addBoth(result.append)
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+    responder.terminate()
+    if result[0] is not None:
+        print result[0]
+        return False
+    return True
+
+if __name__ == "__main__":
+    answers = len(sys.argv) > 1 and int(sys.argv[1]) or 50000
+    sockets = int(len(sys.argv) > 2 and sys.argv[2] or 4)
+    levels = [int(x) for x in sys.argv[3:]] or AGENTS
+    sys.exit(not main(answers, sockets, levels) and 1 or 0)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Compare the two ways to write FDB and ARP tables.
+
+With C{bulkwrite}, DatabaseWriter stages FDB and ARP entries with a
+single COPY and merges them with a few set-based statements.
+Without it, each entry is inserted with its own INSERT and the
+C{insert_*} rules update the entries already known.
+
+A synthetic equipment with many FDB and ARP entries is written with
+both ways, each one in its own schema of a scratch database. Three
+writes are timed, each in its own transaction, commit included:
+entries never seen, the same entries again and entries with a part
+of them replaced. The tables written both ways are then compared.
+
+!!! Schemas "wiremaps_bulk" and "wiremaps_rows" are destroyed !!!
+
+Usage: python tools/bench_write.py "dbname=scratch" [entries [changed]]
+
+C{entries} is the number of FDB and of ARP entries (50000 by
+default), C{changed} the percentage of entries replaced for the
+last write (10 by default).
+"""
+
+import os
+import sys
+import time
+
+import psycopg2
+from pkg_resources import resource_string
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.collector.database import DatabaseWriter
+from wiremaps.collector.datastore import Equipment, Port, int2mac
+
+SCHEMAS = [("wiremaps_bulk", True), ("wiremaps_rows", False)]
+PORTS = 48
+
+def equipment(entries, generation=0, changed=0):
+    """Build a synthetic equipment.
+
+    @param entries: number of FDB and of ARP entries
+    @param generation: entries are replaced by new ones for each
+       generation
+    @param changed: percentage of entries replaced by a generation
+    """
+    e = Equipment("192.0.2.1", "bench.example.com", ".1.3.6.1.4.1.9.1.516",
+                  "Synthetic switch", None)
+    for index in range(1, PORTS + 1):
+        e.ports[index] = Port("Gi0/%d" % index, "up", speed=1000)
+    replaced = entries*changed/100
+    for n in range(entries):
+        value = n
+        if n < replaced:
+            value += generation*entries
+        e.ports[n % PORTS + 1].fdb.append(0x020000000000 + value)
+        e.arp["10.%d.%d.%d" % (value >> 16 & 0xff, value >> 8 & 0xff,
+                               value & 0xff)] = int2mac(0x020000000000 + value)
+    return e
+
+def write(conn, schema, bulk, e):
+    """Write FDB and ARP entries of an equipment.
+
+    @return: time spent writing FDB and ARP entries, commit included
+    """
+    cur = conn.cursor()
+    writer = DatabaseWriter(e, {'bulkwrite': bulk})
+    cur.execute("SET LOCAL search_path TO %s" % schema)
+    start = time.time()
+    writer._fdb(cur)
+    fdb = time.time()
+    writer._arp(cur)
+    conn.commit()
+    end = time.time()
+    return fdb - start, end - fdb
+
+def dump(cur, schema, table, columns):
+    cur.execute("SELECT %s FROM %s.%s WHERE deleted='infinity'" % (
+            columns, schema, table))
+    return sorted([tuple([str(x) for x in row]) for row in cur.fetchall()])
+
+def main(dsn, entries, changed):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    e = equipment(entries)
+    for schema, bulk in SCHEMAS:
+        cur.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema)
+        cur.execute("CREATE SCHEMA %s" % schema)
+        cur.execute("SET search_path TO %s" % schema)
+        cur.execute(resource_string("wiremaps.core", "database.sql"))
+        # Equipment and ports are written the same way
+        writer = DatabaseWriter(e, {'bulkwrite': bulk})
+        writer._equipment(cur)
+        writer._port(cur)
+    conn.commit()
+
+    print "%d FDB and %d ARP entries, %d%% replaced for the last write" % (
+        entries, len(e.arp), changed)
+    print "%-10s %-10s %10s %10s" % ("", "", "FDB", "ARP")
+    for label, e in [("new", e),
+                     ("unchanged", e),
+                     ("changed", equipment(entries, 1, changed))]:
+        for schema, bulk in SCHEMAS:
+            fdb, arp = write(conn, schema, bulk, e)
+            print "%-10s %-10s %9.2fs %9.2fs" % (
+                label, bulk and "COPY" or "per row", fdb, arp)
+
+    for table, columns in [("fdb", "port, mac"), ("arp", "mac, ip")]:
+        if dump(cur, SCHEMAS[0][0], table, columns) != \
+                dump(cur, SCHEMAS[1][0], table, columns):
+            print "%s differs between both ways to write" % table
+            return False
+    conn.rollback()
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(2)
+    entries = len(sys.argv) > 2 and int(sys.argv[2]) or 50000
+    changed = len(sys.argv) > 3 and int(sys.argv[3]) or 10
+    sys.exit(not main(sys.argv[1], entries, changed) and 1 or 0)
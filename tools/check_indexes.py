@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""Check that name searches of the web interface use indexes.
+
+The schema from database.sql is loaded into a scratch database and
+filled with synthetic equipments and neighbors. The queries of the
+search and completion pages are then run through EXPLAIN, in the
+present and in the past. The check fails when a searched table is
+scanned instead of being looked up with an index.
+
+In the present, only live tables are checked. In the past, only _past
+tables are checked: the indexes of live tables only cover current
+rows.
+
+Parameters are inlined, like in the custom plans PostgreSQL builds
+for prepared statements.
+
+Everything happens in a transaction that is rolled back at the end.
+However, the schema is dropped and created again in this transaction:
+use a scratch database.
+
+Usage: python tools/check_indexes.py "dbname=scratch user=wiremaps"
+"""
+
+import os
+import re
+import sys
+
+import psycopg2
+from pkg_resources import resource_string
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.core.database import Database
+from wiremaps.web.search import SearchHostnameResource, \
+    SearchHostnameInLldp, SearchHostnameInCdp, SearchHostnameInEdp
+from wiremaps.web.complete import CompleteEquipmentResource, COMPLETE_LIMIT
+
+EQUIPMENTS = 20000
+GENERATIONS = 5                 # Number of past versions of each row
+
+def fill(cur):
+    """Fill the database with synthetic rows.
+
+    @return: C{True} if trigram indexes are available
+    """
+    cur.execute(resource_string("wiremaps.core", "database.sql"))
+    cur.execute("SAVEPOINT trgm")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg2.Error, e:
+        print "pg_trgm not available, substring searches not checked: %s" % e
+        cur.execute("ROLLBACK TO SAVEPOINT trgm")
+        trigram = False
+    else:
+        for index in Database.trigramIndexes:
+            cur.execute(index)
+        trigram = True
+
+    tables = [
+        ("equipment", "ip, name, oid",
+         "'10.0.0.0'::inet + i, 'sw' || i || '.example.com', '.1.3.6.1.4.1.9'"),
+        ("port", "equipment, index, name, cstate",
+         "'10.0.0.0'::inet + i, 1, 'eth0', 'up'"),
+        ("lldp", "equipment, port, mgmtip, portdesc, sysname, sysdesc",
+         "'10.0.0.0'::inet + i, 1, '10.0.0.0'::inet + i, 'eth0', "
+         "'lldp' || i || '.example.com', 'Linux'"),
+        ("cdp", "equipment, port, sysname, portname, mgmtip, platform",
+         "'10.0.0.0'::inet + i, 1, 'cdp' || i || '.example.com', "
+         "'eth0', '10.0.0.0'::inet + i, 'IOS'"),
+        ("edp", "equipment, port, sysname, remoteslot, remoteport",
+         "'10.0.0.0'::inet + i, 1, 'edp' || i || '.example.com', 1, 1"),
+        ]
+    for table, columns, values in tables:
+        cur.execute("INSERT INTO %s (%s) SELECT %s "
+                    "FROM generate_series(1, %%(n)s) i" % (table, columns,
+                                                           values),
+                    {'n': EQUIPMENTS})
+        cur.execute("INSERT INTO %s_past (%s, created, deleted) "
+                    "SELECT %s, "
+                    "(CURRENT_TIMESTAMP - (g + 1) * interval '1 day')::abstime, "
+                    "(CURRENT_TIMESTAMP - g * interval '1 day')::abstime "
+                    "FROM generate_series(1, %%(n)s) i, "
+                    "generate_series(1, %%(g)s) g" % (table, columns, values),
+                    {'n': EQUIPMENTS, 'g': GENERATIONS})
+    cur.execute("ANALYZE")
+    return trigram
+
+def check(cur, label, statement, params, tables, past=False):
+    """EXPLAIN a statement and check that tables are not scanned.
+
+    @return: C{True} if the check succeeded
+    """
+    if past:
+        params = dict(params)
+        cur.execute("SELECT (CURRENT_TIMESTAMP - "
+                    "interval '2 days 12 hours')::abstime")
+        params["__date"] = str(cur.fetchone()[0])
+    cur.execute("EXPLAIN %s" % statement.sql, params)
+    plan = "\n".join([row[0] for row in cur.fetchall()])
+    scanned = [table for table in tables
+               if re.search(r"Seq Scan on %s\b" % table, plan)]
+    if scanned:
+        print "FAIL %s: sequential scan of %s" % (label, ", ".join(scanned))
+        print plan
+        return False
+    print "ok   %s" % label
+    return True
+
+def main(dsn):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    trigram = fill(cur)
+    ok = True
+    cases = [
+        ("complete", CompleteEquipmentResource.query,
+         {'name': 'sw12', 'l': COMPLETE_LIMIT},
+         ["equipment", "lldp", "cdp", "edp"]),
+        ("search in lldp", SearchHostnameInLldp.query, {'name': 'lldp12'},
+         ["lldp"]),
+        ("search in cdp", SearchHostnameInCdp.query, {'name': 'cdp12'},
+         ["cdp"]),
+        ("search in edp", SearchHostnameInEdp.query, {'name': 'edp12'},
+         ["edp"]),
+        ]
+    if trigram:
+        cases.append(("search equipment", SearchHostnameResource.query,
+                      {'name': 'w1234'}, ["equipment"]))
+    for label, query, params, tables in cases:
+        ok = check(cur, "%s (present)" % label, query.present,
+                   params, tables) and ok
+        ok = check(cur, "%s (past)" % label, query.past,
+                   params, ["%s_past" % t for t in tables], past=True) and ok
+    conn.rollback()
+    return ok
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print __doc__
+        sys.exit(2)
+    sys.exit(not main(sys.argv[1]) and 1 or 0)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""Check that both ways to write neighbors give the same tables.
+
+With C{diffwrite}, DatabaseWriter only touches rows that changed.
+Without it, all live rows are closed and inserted again, and the
+C{insert_*} rules revive the ones that did not change. Both should
+leave the tables in the same state, including the creation and
+deletion dates.
+
+The schema from database.sql is loaded into two schemas of a scratch
+database. Random equipments are then written for several cycles, once
+in each schema and in the same transaction, so both writes share
+the same CURRENT_TIMESTAMP. Tables are compared after each cycle.
+Cycles are one second apart because dates are stored with a one
+second resolution.
+
+!!! Schemas "wiremaps_rules" and "wiremaps_diff" are destroyed !!!
+
+Usage: python tools/check_writer.py "dbname=scratch" [cycles [seed]]
+"""
+
+import os
+import sys
+import time
+import random
+
+import psycopg2
+from pkg_resources import resource_string
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.collector.database import DatabaseWriter
+from wiremaps.collector.datastore import Equipment, Port, Lldp, Cdp, Edp, \
+    Sonmp, Trunk, LocalVlan, RemoteVlan
+
+SCHEMAS = [("wiremaps_rules", False), ("wiremaps_diff", True)]
+TABLES = ["equipment", "port", "trunk", "sonmp", "edp", "cdp", "lldp", "vlan"]
+EQUIPMENTS = ["192.0.2.%d" % i for i in range(1, 6)]
+
+def maybe(rand, value, probability=0.6):
+    """Return C{value} with the given probability, C{None} otherwise."""
+    if rand.random() < probability:
+        return value
+    return None
+
+def equipment(rand, ip):
+    """Build a random equipment.
+
+    Values are drawn from small sets so that rows are often kept,
+    changed, removed and added back from one cycle to the next.
+    """
+    e = Equipment(ip, "sw-%s" % ip, ".1.3.6.1.4.1.9.1.%d" % rand.randint(1, 2),
+                  "switch", None)
+    for index in rand.sample(range(1, 9), rand.randint(1, 8)):
+        port = Port("port%d" % index, rand.choice(["up", "down"]),
+                    speed=rand.choice([100, 1000]))
+        port.lldp = maybe(rand, Lldp("host%d" % rand.randint(1, 3),
+                                     "Linux", "eth%d" % rand.randint(0, 1),
+                                     "198.51.100.%d" % rand.randint(1, 3)))
+        port.cdp = maybe(rand, Cdp("host%d" % rand.randint(1, 3),
+                                   "Gi0/%d" % rand.randint(1, 2),
+                                   "198.51.100.%d" % rand.randint(1, 3),
+                                   "IOS"))
+        port.edp = maybe(rand, Edp("host%d" % rand.randint(1, 3),
+                                   1, rand.randint(1, 2)))
+        port.sonmp = maybe(rand, Sonmp("198.51.100.%d" % rand.randint(1, 3),
+                                       rand.randint(1, 2)))
+        port.trunk = maybe(rand, Trunk(rand.choice([100, 101])), 0.3)
+        for vid in rand.sample(range(1, 5), rand.randint(0, 3)):
+            port.vlan.append(LocalVlan(vid, "vlan%d" % rand.randint(1, 2)))
+            if rand.random() < 0.3:
+                # Same key, another name: the first one should win
+                port.vlan.append(LocalVlan(vid, "other"))
+        if rand.random() < 0.3:
+            port.vlan.append(RemoteVlan(rand.randint(1, 4), "remote"))
+        e.ports[index] = port
+    return e
+
+def dump(cur, schema, table):
+    cur.execute("SELECT * FROM %s.%s" % (schema, table))
+    return sorted([tuple([str(x) for x in row]) for row in cur.fetchall()])
+
+def main(dsn, cycles, seed):
+    rand = random.Random(seed)
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    for schema, diff in SCHEMAS:
+        cur.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema)
+        cur.execute("CREATE SCHEMA %s" % schema)
+        cur.execute("SET search_path TO %s" % schema)
+        cur.execute(resource_string("wiremaps.core", "database.sql"))
+    conn.commit()
+
+    for cycle in range(cycles):
+        for ip in rand.sample(EQUIPMENTS, rand.randint(1, len(EQUIPMENTS))):
+            e = equipment(rand, ip)
+            for schema, diff in SCHEMAS:
+                cur.execute("SET LOCAL search_path TO %s" % schema)
+                DatabaseWriter(e, {'diffwrite': diff,
+                                   'bulkwrite': False}).write(None, cur)
+            conn.commit()
+        for table in TABLES:
+            rules = dump(cur, SCHEMAS[0][0], table)
+            diff = dump(cur, SCHEMAS[1][0], table)
+            if rules != diff:
+                print "cycle %d: %s differs (seed %d)" % (cycle, table, seed)
+                for row in sorted(set(rules) - set(diff)):
+                    print "  rules only: %s" % ", ".join(row)
+                for row in sorted(set(diff) - set(rules)):
+                    print "  diff only:  %s" % ", ".join(row)
+                return False
+        conn.commit()
+        print "cycle %d: ok" % cycle
+        time.sleep(1.1)
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(2)
+    cycles = len(sys.argv) > 2 and int(sys.argv[2]) or 20
+    seed = len(sys.argv) > 3 and int(sys.argv[3]) or int(time.time())
+    sys.exit(not main(sys.argv[1], cycles, seed) and 1 or 0)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+
+"""Generate synthetic fixtures for every collector plugin.
+
+A fixture holds the answers of an equipment to the SNMP requests of
+an exploration (see the C{record} and C{replay} options of the
+collector). This script builds fixtures without any equipment: each
+synthetic equipment answers from a simulated MIB holding ports, FDB,
+ARP, LLDP, CDP, EDP, SONMP and VLAN tables in the flavours walked
+by the plugins. Several equipments are generated for the OID of each
+plugin (and for an unknown OID, handled by the generic plugin).
+
+Equipments are explored like the collector does: community probe,
+basic information and plugins. Answers are recorded with the
+community "public" and SNMPv2. The generation fails if a plugin is
+not used or if an exploration fails.
+
+Fixtures are named after the IP of each equipment, in 198.18.0.0/15.
+
+Usage: python tools/make_fixtures.py directory [equipments [ports [fdb]]]
+"""
+
+import os
+import sys
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from wiremaps.collector import snmp
+from wiremaps.collector.core import CollectorService
+from wiremaps.collector.replay import Fixture, fixtureKey
+
+# One OID for each plugin, with the first ifIndex of the ports
+OIDS = [
+    ('.1.3.6.1.4.1.43.10.27.4.1.2.2', 0), # 3Com SuperStack
+    ('.1.3.6.1.4.1.45.3.74.1', 0),        # Nortel 5510
+    ('.1.3.6.1.4.1.1872.1.13.1.5', 256),  # Alteon 2208
+    ('.1.3.6.1.4.1.2467.4.2', 0),         # Arrowpoint CS-800
+    ('.1.3.6.1.4.1.1872.1.18.1', 0),      # Nortel Blade switch
+    ('.1.3.6.1.4.1.26543.1.18.5', 0),     # BNT Blade switch
+    ('.1.3.6.1.4.1.11.2.3.7.11.33.4.1.1', 0), # HP Blade switch
+    ('.1.3.6.1.4.1.9.1.516', 0),          # Cisco Catalyst
+    ('.1.3.6.1.4.1.9.9.368.4.1', 0),      # Cisco CSS
+    ('.1.3.6.1.4.1.674.10895.3000', 0),   # Dell PowerConnect
+    ('.1.3.6.1.4.1.674.10892.2', 0),      # Dell DRAC
+    ('.1.3.6.1.4.1.1916.2.28', 0),        # Extreme Summit
+    ('.1.3.6.1.4.1.1916.2.40', 0),        # Old Extreme Summit
+    ('.1.3.6.1.4.1.1916.2.11', 0),        # ExtremeWare chassis
+    ('.1.3.6.1.4.1.3375.2.1.3.4.10', 0),  # F5 BigIP
+    ('.1.3.6.1.4.1.1991.1.3.35.1', 0),    # Foundry
+    ('.1.3.6.1.4.1.2636.1.1.1.2.30', 0),  # Juniper
+    ('.1.3.6.1.4.1.8072.3.2.10', 0),      # Linux
+    ('.1.3.6.1.4.1.3224.1.16', 0),        # Netscreen ISG
+    ('.1.3.6.1.4.1.2272.30', 63),         # Nortel Passport
+    ('.1.3.6.1.4.1.11.2.3.7.11.45', 0),   # HP Procurve
+    ('.1.3.6.1.4.1.99999.1', 0),          # Unknown, generic plugin
+    ]
+VLANS = 4
+ARP = 250
+
+IF = '.1.3.6.1.2.1.2.2.1'
+IFX = '.1.3.6.1.2.1.31.1.1.1'
+IFSTACK = '.1.3.6.1.2.1.31.1.2.1.3'
+BRIDGE = '.1.3.6.1.2.1.17'
+LLDP = '.1.0.8802.1.1.2.1'
+CDP = '.1.3.6.1.4.1.9.9.23.1.2.1.1'
+EDP = '.1.3.6.1.4.1.1916.1.13'
+EXTREME = '.1.3.6.1.4.1.1916.1'
+NORTEL = '.1.3.6.1.4.1.2272.1'
+ALTEON = ['.1.3.6.1.4.1.1872.2.5', '.1.3.6.1.4.1.26543.2.5',
+          '.1.3.6.1.4.1.11.2.3.7.11.33.4.2']
+F5 = '.1.3.6.1.4.1.3375.2.1.2'
+
+def octets(value, length):
+    """Encode an integer as an octet string."""
+    return "".join([chr((value >> (8*i)) & 0xff)
+                    for i in reversed(range(length))])
+
+def portlist(positions):
+    """Encode positions (the first one is 1) as a bitmap."""
+    result = bytearray((max(positions) + 7)/8)
+    for p in positions:
+        result[(p - 1)/8] |= 0x80 >> ((p - 1) % 8)
+    return str(result)
+
+def string(s):
+    """Encode a string as an index prefixed by its length."""
+    return (len(s),) + tuple([ord(c) for c in s])
+
+def synthetic(number, oid, base, ports, fdb):
+    """Build the simulated MIB of an equipment.
+
+    @param number: number of the equipment, used to get unique values
+    @param oid: OID of the equipment
+    @param base: ifIndex of the first port minus one
+    @param ports: number of ports
+    @param fdb: number of FDB entries for each port
+    @return: C{(scalars, tables, vlans)} where C{scalars} maps OID to
+       values, C{tables} maps column OID to a list of C{(index,
+       value)} and C{vlans} maps VLAN ID to the tables overridden
+       when the community of this VLAN is used
+    """
+    scalars = {
+        '.1.3.6.1.2.1.1.1.0': "Synthetic equipment %d" % number,
+        '.1.3.6.1.2.1.1.2.0': oid,
+        '.1.3.6.1.2.1.1.5.0': "bench%d.example.com" % number,
+        '.1.3.6.1.2.1.1.6.0': "Benchmark",
+        '.1.3.6.1.4.1.674.10892.2.1.1.10.0': "bench%d" % number,
+        '.1.3.6.1.4.1.674.10892.2.1.1.1.0': "Synthetic",
+        '.1.3.6.1.4.1.674.10892.2.1.1.2.0': "RAC",
+        }
+    tables = {}
+    vlans = {}
+    def add(column, index, value, vid=None):
+        tables.setdefault(column, []).append((index, value))
+        if vid is not None:
+            vlans.setdefault(vid, {}).setdefault(column, []).append((index,
+                                                                    value))
+
+    nhigh, nlow = number >> 8, number & 0xff
+    vids = [10*(k + 1) for k in range(VLANS)]
+    members = {}                # VLAN ID -> list of ports
+    for i in range(1, ports + 1):
+        ifindex = base + i
+        vid = vids[i % VLANS]
+        members.setdefault(vid, []).append(i)
+        add(IF + '.1', (ifindex,), ifindex)
+        add(IF + '.2', (ifindex,), "Port %d" % i)
+        add(IF + '.3', (ifindex,), 6)
+        add(IF + '.5', (ifindex,), 1000000000)
+        add(IF + '.6', (ifindex,), octets(0x020000000000 | number << 16 | i, 6))
+        add(IF + '.8', (ifindex,), i % 8 and 1 or 2)
+        add(IFX + '.1', (ifindex,), "eth%d" % i)
+        add(IFX + '.15', (ifindex,), 1000)
+        add(IFX + '.18', (ifindex,), "link to host %d" % i)
+        add(BRIDGE + '.1.4.1.2', (i,), ifindex)
+        for k in range(fdb):
+            mac = tuple(bytearray(octets(0x00aa00000000 | number << 16 |
+                                         (i*fdb + k) & 0xffff, 6)))
+            add(BRIDGE + '.4.3.1.2', mac, i, vid)
+            add(BRIDGE + '.7.1.2.2.1.2', (vid,) + mac, i)
+        # Speed and duplex
+        add(LLDP + '.5.4623.1.2.1.1.4', (ifindex,), 30)
+        add(LLDP + '.5.4623.1.2.1.1.2', (ifindex,), 1)
+        add(NORTEL + '.4.10.1.1.13', (ifindex,), 2)
+        add(NORTEL + '.4.10.1.1.15', (ifindex,), 1000)
+        add(NORTEL + '.4.10.1.1.11', (ifindex,), 1)
+        for baseoid in ALTEON:
+            add(baseoid + '.1.3.2.1.1.2', (i,), 4)
+            add(baseoid + '.1.3.2.1.1.3', (i,), 2)
+            add(baseoid + '.1.1.2.2.1.11', (i,), 2)
+            add(baseoid + '.1.1.2.2.1.15', (ifindex,), "Port %d" % i)
+        # Neighbors
+        add(LLDP + '.3.7.1.3', (ifindex,), "eth%d" % i)
+        add(LLDP + '.5.32962.1.2.3.1.2', (ifindex, vid), "vlan%d" % vid)
+        if i % 2:
+            remote = (0, ifindex, 1)
+            add(LLDP + '.4.1.1.6', remote, 5)
+            add(LLDP + '.4.1.1.7', remote, "eth0")
+            add(LLDP + '.4.1.1.8', remote, "eth0")
+            add(LLDP + '.4.1.1.9', remote, "host%d-%d.example.com" % (number, i))
+            add(LLDP + '.4.1.1.10', remote, "Linux")
+            add(LLDP + '.4.2.1.4', remote + (1, 4, 172, 16 + nhigh, nlow, i), 0)
+            add(LLDP + '.5.32962.1.3.3.1.2', remote + (vid,), "vlan%d" % vid)
+        elif i % 4 == 0:
+            add(CDP + '.6', (ifindex, 1), "cdp%d-%d.example.com" % (number, i))
+            add(CDP + '.7', (ifindex, 1), "GigabitEthernet0/1")
+            add(CDP + '.8', (ifindex, 1), "cisco WS-C2960")
+            add(CDP + '.3', (ifindex, 1), 1)
+            add(CDP + '.4', (ifindex, 1), octets(0xac000000 | number << 8 | i, 4))
+            add('.1.3.6.1.4.1.45.1.6.13.2.1.1.4',
+                (1, i, 172, 16 + nhigh, nlow, i, 1), 1)
+        else:
+            neighbor = (0, 0, 0, 4, 150, 0, nlow, i)
+            add(EDP + '.2.1.3', (ifindex,) + neighbor,
+                "edp%d-%d.example.com" % (number, i))
+            add(EDP + '.2.1.5', (ifindex,) + neighbor, 1)
+            add(EDP + '.2.1.6', (ifindex,) + neighbor, i)
+            add(EDP + '.3.1.2', (ifindex,) + neighbor + string("vlan%d" % vid),
+                vid)
+        add('.1.3.6.1.4.1.9.9.68.1.2.2.1.2', (ifindex,), vid)
+
+    for k, vid in enumerate(vids):
+        name = "vlan%d" % vid
+        vlanif = 1000 + k
+        ifindexes = [base + i for i in members[vid]]
+        # IF-MIB
+        add(IF + '.2', (vlanif,), "802.1Q Encapsulation Tag %04d" % vid)
+        add(IF + '.3', (vlanif,), 135)
+        for ifindex in ifindexes:
+            add(IFSTACK, (vlanif, ifindex), 1)
+        # Q-BRIDGE-MIB
+        add(BRIDGE + '.7.1.4.3.1.1', (vid,), name)
+        add(BRIDGE + '.7.1.4.2.1.4', (0, vid), portlist(ifindexes))
+        # Nortel
+        add(NORTEL + '.3.2.1.2', (vid,), name)
+        add(NORTEL + '.3.2.1.11', (vid,), portlist([x + 1 for x in ifindexes]))
+        add(NORTEL + '.3.2.1.13', (vid,), portlist([x + 1 for x in ifindexes]))
+        for baseoid in ALTEON:
+            add(baseoid + '.2.1.1.3.1.2', (vid,), name)
+            add(baseoid + '.2.1.1.3.1.3', (vid,),
+                portlist([i + 1 for i in members[vid]]))
+        # Extreme
+        add(EXTREME + '.2.1.2.1.2', (vlanif,), name)
+        add(EXTREME + '.2.1.2.1.10', (vlanif,), vid)
+        add(EXTREME + '.2.6.1.1', (vlanif, 1), portlist(ifindexes))
+        for j in range(fdb):
+            add(EXTREME + '.16.1.1.3', (vlanif, j),
+                octets(0x00bb00000000 | number << 16 | k << 8 | j, 6))
+        # 3Com
+        add('.1.3.6.1.4.1.43.10.1.14.1.1.1.2', (vid,), name)
+        add('.1.3.6.1.4.1.43.10.1.14.1.2.1.4', (vlanif,), vid)
+        add('.1.3.6.1.4.1.43.10.1.14.1.2.1.2', (vlanif,), name)
+        # Cisco
+        add('.1.3.6.1.4.1.9.9.46.1.3.1.1.4', (1, vid), name)
+        # Juniper
+        add('.1.3.6.1.4.1.2636.3.40.1.5.1.5.1.5', (k,), vid)
+        add('.1.3.6.1.4.1.2636.3.40.1.5.1.5.1.2', (k,), name)
+        for i in members[vid]:
+            add('.1.3.6.1.4.1.2636.3.40.1.5.1.7.1.3', (k, i), 1)
+
+    # F5, indexed by names
+    interfaces = ["1.%d" % i for i in range(1, ports + 1)]
+    for i, interface in enumerate(interfaces):
+        index = string(interface)
+        add(F5 + '.4.1.2.1.4', index, 1000)
+        add(F5 + '.4.1.2.1.5', index, 2)
+        add(F5 + '.4.1.2.1.6', index, octets(0x020000000000 | number << 16 | i, 6))
+        add(F5 + '.4.1.2.1.17', index, i % 8 == 7 and 1 or 0)
+        vid = vids[i % VLANS]
+        add(F5 + '.13.2.2.1.1', string("vlan%d" % vid) + index, interface)
+    add(F5 + '.12.1.2.1.2', string("TrunkIf"), 0)
+    add(F5 + '.12.1.2.1.3', string("TrunkIf"), octets(0x020000000000 | number << 16, 6))
+    add(F5 + '.12.1.2.1.5', string("TrunkIf"), 2000)
+    for interface in interfaces[:2]:
+        add(F5 + '.12.3.2.1.2', string("TrunkIf") + string(interface), interface)
+    for vid in vids:
+        add(F5 + '.13.1.2.1.2', string("vlan%d" % vid), vid)
+
+    # ARP
+    for k in range(1, ARP + 1):
+        add('.1.3.6.1.2.1.4.22.1.2', (base + 1, 10, nhigh, nlow, k),
+            octets(0x00cc00000000 | number << 16 | k, 6))
+    return scalars, tables, vlans
+
+class SimulatedAgentProxy:
+    """Act like AgentProxy but answer from a simulated MIB.
+
+    Answers are recorded in C{fixture}, with the same keys as
+    AgentProxy. Walks using the community of a VLAN (C{community@vid})
+    only get FDB entries for this VLAN.
+    """
+
+    use_getbulk = True
+
+    def __init__(self, ip, community, version, mib):
+        self.ip = ip
+        self.community = community
+        self.version = version
+        self.scalars, self.tables, self.vlans = mib
+        self.fixture = Fixture(ip, community, version)
+
+    def get(self, *args, **kwargs):
+        try:
+            d = defer.succeed(dict([(oid, self.scalars[oid])
+                                    for oid in args[0]]))
+        except KeyError:
+            d = defer.fail(snmp.SNMPNoSuchObject("No such object"))
+        d.addBoth(self.fixture.record, fixtureKey("get", args, kwargs))
+        return d
+
+    def walk(self, oid, community=None, indexes=False):
+        kwargs = {'indexes': indexes}
+        tables = self.tables
+        if community is not None:
+            kwargs['community'] = community
+            if "@" in community:
+                tables = tables.copy()
+                tables.update(self.vlans.get(int(community.split("@")[1]),
+                                             {}))
+        results = {}
+        for column in tables:
+            if column != oid and not column.startswith("%s." % oid):
+                continue
+            prefix = tuple([int(x) for x in column[len(oid):].split(".")[1:]])
+            for index, value in tables[column]:
+                index = prefix + index
+                if not indexes:
+                    index = "%s%s" % (oid, "".join([".%d" % x for x in index]))
+                results[index] = value
+        d = defer.succeed(results)
+        d.addBoth(self.fixture.record, fixtureKey("walk", (oid,), kwargs))
+        return d
+
+    def close(self):
+        pass
+
+def collect(info, collector):
+    """Run the plugins of an equipment like the collector does."""
+    proxy, equipment = info
+    plugins = collector.pluginsFor(str(equipment.oid))
+    d = defer.succeed(None)
+    for plugin in plugins:
+        plugin.config = collector.config
+        d.addCallback(lambda x, p: p.collectData(equipment, proxy), plugin)
+    d.addCallback(lambda x: (plugins, equipment))
+    return d
+
+def main(directory, equipments, ports, fdb):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    collector = CollectorService({'collector': {'community': ["public"]}},
+                                 None)
+    collector.loadPlugins()
+    used = []
+    for p, (oid, base) in enumerate(OIDS):
+        for n in range(1, equipments + 1):
+            ip = "198.18.%d.%d" % (p, n)
+            proxy = SimulatedAgentProxy(ip, "public", 2,
+                                        synthetic(p*256 + n, oid, base,
+                                                  ports, fdb))
+            result = []
+            d = collector.probeProxy(proxy)
+            d.addCallback(collector.getBasicInformation)
+            d.addCallback(collect, collector)
+            d.addBoth(result.append)
+            if not result:
+                print "%s (%s): exploration did not complete" % (ip, oid)
+                return False
+            if isinstance(result[0], Failure):
+                print "%s (%s): %s" % (ip, oid, result[0].getTraceback())
+                return False
+            plugins, equipment = result[0]
+            used.extend(plugins)
+            proxy.fixture.save(directory)
+        print "%s: %s, %d ports, %d FDB and %d ARP entries" % (
+            oid, ", ".join([plugin.__class__.__name__ for plugin in plugins]),
+            len(equipment.ports),
+            sum([len(port.fdb) for port in equipment.ports.values()]),
+            len(equipment.arp))
+    unused = [plugin for plugin in collector.plugins if plugin not in used]
+    for plugin in unused:
+        print "No fixture for %s" % plugin.__class__.__name__
+    return not unused
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(2)
+    equipments = len(sys.argv) > 2 and int(sys.argv[2]) or 5
+    ports = len(sys.argv) > 3 and int(sys.argv[3]) or 48
+    fdb = len(sys.argv) > 4 and int(sys.argv[4]) or 20
+    if max(equipments, ports, fdb) > 250:
+        print "No more than 250 equipments, ports and FDB entries per port"
+        sys.exit(2)
+    sys.exit(not main(sys.argv[1], equipments, ports, fdb) and 1 or 0)
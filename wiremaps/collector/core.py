@@ -2,7 +2,13 @@
 Handle collection of data in database with the help of SNMP
 """
 
+import os
 import sys
+import time
+import heapq
+import socket
+import struct
+import resource
 
 from IPy import IP
 from twisted.internet import defer, task
@@ -13,21 +19,149 @@ from twisted.python.failure import Failure
 import wiremaps.collector.equipment
 from wiremaps.collector.datastore import Equipment
 from wiremaps.collector.database import DatabaseWriter
-from wiremaps.collector import exception
+from wiremaps.collector import exception, snmp
 from wiremaps.collector.proxy import AgentProxy
+from wiremaps.collector.replay import Fixture, ReplayAgentProxy
+from wiremaps.collector.stats import CollectorStats
 from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.equipment.generic import generic
 
+def ntoa(ip, version):
+    """Convert an integer to an IP address.
+
+    @param ip: IP address as an integer
+    @param version: IP version (4 or 6)
+    @return: IP address as a string
+    """
+    if version == 4:
+        return socket.inet_ntoa(struct.pack("!I", ip))
+    return socket.inet_ntop(socket.AF_INET6,
+                            struct.pack("!QQ", ip >> 64, ip & (2**64 - 1)))
+
+class CommunityTable:
+    """Communities attached to ranges of IP.
+
+    Lookups are done with a longest prefix match: one dictionary
+    lookup for each prefix length in use.
+    """
+
+    def __init__(self):
+        self.prefixes = {}      # (version, prefix length) -> {network: communities}
+        self.lengths = []       # (version, prefix length), longest first
+
+    def add(self, ip, community):
+        """Attach a community to a range of IP.
+
+        @param ip: range of IP (C{IPy.IP})
+        @param community: community for this range
+        """
+        key = (ip.version(), ip.prefixlen())
+        if key not in self.prefixes:
+            self.prefixes[key] = {}
+            self.lengths.append(key)
+            self.lengths.sort(key=lambda x: -x[1])
+        self.prefixes[key].setdefault(ip.int(), []).append(community)
+
+    def lookup(self, ip):
+        """Get communities for an IP.
+
+        @param ip: IP to look for
+        @return: list of communities, most specific range first
+        """
+        ip = IP(ip)
+        version, address = ip.version(), ip.int()
+        bits = version == 4 and 32 or 128
+        communities = []
+        for v, length in self.lengths:
+            if v != version:
+                continue
+            mask = ((1 << length) - 1) << (bits - length)
+            communities += self.prefixes[v, length].get(address & mask, [])
+        return communities
+
 class CollectorService(service.Service):
     """Service to collect data from SNMP"""
 
     def __init__(self, config, dbpool):
         self.config = config['collector']
         self.dbpool = dbpool
+        # Writes to the database waiting or running
+        self.writes = defer.DeferredSemaphore(self.config.get("writequeue", 2))
+        self.pendingWrites = {} # IP -> [equipment, deferreds] waiting
         self.setName("SNMP collector")
         self.exploring = False
         self.ips = []
+        self.ipCommunities = CommunityTable()
+        self.communities = {}   # IP -> (community, version) that worked
+        self.unreachable = {}   # IP -> (failures, time of next try)
+        self.plugins = None
+        self.oidPlugins = {}    # OID -> plugins handling this OID
+        self.stats = CollectorStats()
+        self.scheduler = None
+        self.devices = {}       # IP -> [next exploration,
+                                #        next volatile exploration,
+                                #        community]
+        self.ranges = {}        # Range -> [range, community,
+                                #           addresses left to sweep,
+                                #           next sweep]
+        self.queue = []         # Heap of (due time, IP)
+        self.running = {}       # IP being explored by the scheduler,
+                                # False if it should be explored again
+        self.ipfile = False     # Modification time of ipfile
+        self.nextCleanup = None
+        self.cleaning = False
         AgentProxy.use_getbulk = self.config.get("bulk", True)
+        AgentProxy.max_walks = self.config.get("walks", 4)
+        AgentProxy.max_repetitions = self.config.get("maxrepetitions", 50)
+        # Use a few shared sockets instead of one socket per equipment
+        snmp.share(self.config.get("sockets", 0))
+        # Record answers of equipments or replay recorded answers
+        AgentProxy.record = self.config.get("record", None)
+        ReplayAgentProxy.latency = self.config.get("replaylatency", 0)
+        ReplayAgentProxy.loss = self.config.get("replayloss", 0)
+
+    def startService(self):
+        self.loadPlugins()
+        service.Service.startService(self)
+        if self.config.get("interval", 0) > 0:
+            self.scheduler = task.LoopingCall(self.scheduleExploration)
+            self.scheduler.start(1, now=False)
+
+    def stopService(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        return service.Service.stopService(self)
+
+    def loadPlugins(self):
+        """Search for collector plugins.
+
+        Plugins are searched only once. Call this method again to
+        find new plugins.
+        """
+        self.plugins = list(getPlugins(ICollector,
+                                       wiremaps.collector.equipment))
+        self.oidPlugins = {}
+
+    def pluginsFor(self, oid):
+        """Get the plugins handling a given OID.
+
+        @param oid: OID identifying the kind of equipment
+        @return: list of plugins handling this equipment
+        """
+        try:
+            return self.oidPlugins[oid]
+        except KeyError:
+            pass
+        if self.plugins is None:
+            self.loadPlugins()
+        plugins = [ plugin for plugin in self.plugins
+                    if plugin.handleEquipment(oid) ]
+        if not plugins:
+            print "No plugin found for OID %s, using generic one" % oid
+            plugins = [generic]
+        self.oidPlugins[oid] = plugins
+        return plugins
 
     def enumerateIP(self):
         """Enumerate the list of IP to explore.
@@ -36,12 +170,14 @@ class CollectorService(service.Service):
            explored.
         """
         self.ips = []
+        self.ipCommunities = CommunityTable()
         def appendIP(ip):
             parts = ip.split("@", 1)
             ip = IP(parts[0])
             community = None
             if len(parts) > 1:
                 community = parts[1]
+                self.ipCommunities.add(ip, community)
             self.ips += [(ip, community)]
 
         if "ipfile" in self.config:
@@ -58,20 +194,224 @@ class CollectorService(service.Service):
                 for ip in self.config['ips']:
                     appendIP(ip)
 
+    def expandIP(self, ip):
+        """Enumerate the addresses of a range of IP.
+
+        Network and broadcast addresses are skipped. Addresses are
+        generated one at a time.
+
+        @param ip: range of IP (C{IPy.IP})
+        @return: iterator over addresses as integers
+        """
+        first = ip.int()
+        if ip.len() == 1:
+            yield first
+            return
+        x, last = first + 1, first + ip.len() - 1
+        while x < last:
+            yield x
+            x += 1
+
+    def updateDevices(self, now):
+        """Update the list of equipments known by the scheduler.
+
+        The list of IP is enumerated again when C{ipfile} is
+        modified. New equipments are spread over the next
+        C{volatileinterval} seconds. Equipments no longer listed are
+        forgotten.
+
+        Ranges are not expanded here: they are swept by
+        L{sweepRanges} and only their addresses that answered are
+        kept as equipments, as long as the range is listed.
+
+        @param now: current time
+        """
+        mtime = None
+        if "ipfile" in self.config:
+            try:
+                mtime = os.stat(self.config['ipfile']).st_mtime
+            except OSError:
+                pass
+        if mtime == self.ipfile:
+            return
+        self.ipfile = mtime
+        self.enumerateIP()
+        ips = {}
+        ranges = {}
+        for ip, community in self.ips:
+            if ip.len() == 1:
+                ips[ntoa(ip.int(), ip.version())] = community
+            else:
+                ranges[str(ip)] = (ip, community)
+        for key in self.ranges.keys():
+            if key not in ranges:
+                del self.ranges[key]
+        for key, (ip, community) in ranges.items():
+            if key in self.ranges:
+                self.ranges[key][1] = community
+            else:
+                self.ranges[key] = [ip, community, None, now]
+        for ip in self.devices.keys():
+            if ip in ips:
+                continue
+            found = [community for r, community in ranges.values()
+                     if IP(ip) in r]
+            if found:
+                self.devices[ip][2] = found[0]
+            else:
+                del self.devices[ip]
+        new = [ip for ip in ips if ip not in self.devices]
+        spread = self.config.get("volatileinterval",
+                                 self.config["interval"])
+        for i, ip in enumerate(new):
+            due = now + spread*i/len(new)
+            self.devices[ip] = [due, due, None]
+            heapq.heappush(self.queue, (due, ip))
+        for ip in ips:
+            self.devices[ip][2] = ips[ip]
+        if new:
+            print "%d new equipments to explore" % len(new)
+
+    def scheduleExploration(self):
+        """Start exploration of equipments that are due.
+
+        Each equipment has its own due time for a complete
+        exploration (every C{interval} seconds) and for the
+        exploration of volatile information like FDB and ARP (every
+        C{volatileinterval} seconds). No more than C{parallel}
+        equipments are explored at the same time.
+        """
+        now = time.time()
+        self.updateDevices(now)
+        while self.queue and len(self.running) < self.config['parallel']:
+            due, ip = self.queue[0]
+            if due > now:
+                break
+            heapq.heappop(self.queue)
+            if ip not in self.devices or ip in self.running or \
+                    min(self.devices[ip][:2]) != due:
+                continue        # Outdated entry
+            self.exploreDevice(ip, now)
+        self.sweepRanges(now)
+        # Periodic cleanup
+        if self.nextCleanup is None or self.nextCleanup <= now:
+            self.nextCleanup = now + self.config.get("volatileinterval",
+                                                     self.config["interval"])
+            if not self.cleaning:
+                self.cleaning = True
+                d = self.cleanup()
+                d.addErrback(self.reportError, "database")
+                d.addBoth(lambda x: setattr(self, "cleaning", False))
+
+    def exploreDevice(self, ip, now):
+        """Explore an equipment from the scheduler.
+
+        @param ip: IP of the equipment
+        @param now: current time
+        """
+        device = self.devices[ip]
+        volatile = device[0] > now
+        self.running[ip] = True
+        d = self.startExploreIP(ip, device[2], backoff=True,
+                                volatile=volatile)
+        d.addErrback(self.reportError, ip)
+        d.addBoth(lambda x: self.exploredDevice(ip, now, volatile))
+
+    def sweepRanges(self, now):
+        """Explore addresses of ranges with the remaining slots.
+
+        Each range is swept every C{interval} seconds, one address
+        at a time. An address that answers is then scheduled like
+        any other equipment.
+
+        @param now: current time
+        """
+        for sweep in self.ranges.values():
+            if sweep[2] is None:
+                if sweep[3] > now:
+                    continue
+                sweep[2] = self.expandIP(sweep[0])
+                sweep[3] = now + self.config["interval"]
+            while len(self.running) < self.config['parallel']:
+                try:
+                    ip = ntoa(sweep[2].next(), sweep[0].version())
+                except StopIteration:
+                    sweep[2] = None
+                    break
+                if ip in self.devices or ip in self.running:
+                    continue
+                self.sweepDevice(ip, sweep[1], now)
+            else:
+                return
+
+    def sweepDevice(self, ip, community, now):
+        """Explore an address of a range from the scheduler.
+
+        @param ip: IP of the address
+        @param community: community to use for this range
+        @param now: current time
+        """
+        def answered(ignored):
+            if ip not in self.devices:
+                self.devices[ip] = [now, now, community]
+
+        self.running[ip] = True
+        d = self.startExploreIP(ip, community, backoff=True)
+        d.addCallbacks(answered, self.reportError, errbackArgs=(ip,))
+        d.addBoth(lambda x: self.exploredDevice(ip, now, False))
+
+    def exploredDevice(self, ip, started, volatile):
+        """Compute the next due time of an equipment once explored.
+
+        @param ip: IP of the equipment
+        @param started: time the exploration started
+        @param volatile: was only volatile information collected?
+        """
+        again = not self.running.pop(ip)
+        if ip not in self.devices:
+            return
+        device = self.devices[ip]
+        if not again:
+            if not volatile:
+                device[0] = started + self.config["interval"]
+            device[1] = started + self.config.get("volatileinterval",
+                                                  self.config["interval"])
+        heapq.heappush(self.queue, (min(device[:2]), ip))
+
     def startExploration(self):
         """Start to explore the range of IP.
 
         We try to explore several IP in parallel. The parallelism is
         defined in the configuration file.
+
+        When the scheduler is used, all equipments are just made due
+        now and ranges are swept again. Equipments being explored are
+        explored again once done.
         """
 
         def doWork(remaining):
             for ip, community in remaining:
-                for x in list(ip):
-                    if ip.net() == ip.broadcast() or (x != ip.net() and x != ip.broadcast()):
-                        d = self.startExploreIP(x, community)
-                        d.addErrback(self.reportError, x)
-                        yield d
+                for x in self.expandIP(ip):
+                    x = ntoa(x, ip.version())
+                    d = self.startExploreIP(x, community, backoff=True)
+                    d.addErrback(self.reportError, x)
+                    yield d
+
+        if self.scheduler is not None:
+            print "Schedule exploration of all equipments..."
+            now = time.time()
+            self.ipfile = False
+            self.updateDevices(now)
+            for ip, device in self.devices.items():
+                device[0] = device[1] = now
+                if ip in self.running:
+                    self.running[ip] = False
+                else:
+                    heapq.heappush(self.queue, (now, ip))
+            for sweep in self.ranges.values():
+                sweep[2] = None
+                sweep[3] = now
+            return
 
         # Don't explore if already exploring
         if self.exploring:
@@ -79,6 +419,8 @@ class CollectorService(service.Service):
                 "Exploration still running")
         self.exploring = True
         print "Start exploration..."
+        self.exploreStart = (time.time(), self.stats.explorations,
+                             resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
 
         # Expand list of IP to explore
         self.enumerateIP()
@@ -92,7 +434,7 @@ class CollectorService(service.Service):
             dl.append(d)
         defer.DeferredList(dl).addCallback(self.stopExploration)
 
-    def startExploreIP(self, ip, community=None):
+    def startExploreIP(self, ip, community=None, backoff=False, volatile=False):
         """Start to explore a given IP.
 
         @param ip: IP to explore
@@ -100,13 +442,15 @@ class CollectorService(service.Service):
         @param community: community to use for this specific IP. If
            C{True}, we will try to recover the community from the list
            of IP.
+
+        @param backoff: if C{True}, skip IP that did not answer recently
+
+        @param volatile: if C{True}, only collect volatile information
         """
         print "Explore IP %s" % ip
         if community is True:
             # We need to take the community from the list of IP, if available
-            community = []
-            community += [c for i,c in self.ips if str(i) == str(ip) and c]
-            community += [c for i,c in self.ips if str(i) == str(IP(ip).net()) and c]
+            community = self.ipCommunities.lookup(ip)
         elif community:
             # A community has been provided, don't try to guess
             community = [community]
@@ -114,18 +458,18 @@ class CollectorService(service.Service):
             # No community, just try to guess from the defaults
             community = self.config['community']
         d = defer.maybeDeferred(self.guessCommunity,
-                                None, None, ip,
-                                community)
-        d.addCallback(self.getInformations)
+                                ip, community, backoff)
+        d.addCallback(self.getInformations, volatile)
         return d
 
-    def getInformations(self, proxy):
+    def getInformations(self, proxy, volatile=False):
         """Get informations for a given host
 
         @param proxy: proxy to host
+        @param volatile: if C{True}, only collect volatile information
         """
         d = self.getBasicInformation(proxy)
-        d.addCallback(self.handlePlugins)
+        d.addCallback(self.handlePlugins, volatile)
         d.addBoth(lambda x: self.closeProxy(proxy, x))
         return d
 
@@ -135,6 +479,7 @@ class CollectorService(service.Service):
         @param proxy: proxy to close
         @param obj: object from callback
         """
+        proxy.save()
         del proxy
         if isinstance(obj, Failure):
             return obj
@@ -143,24 +488,91 @@ class CollectorService(service.Service):
     def stopExploration(self, ignored):
         """Stop exploration process."""
         print "Exploration finished!"
+        started, explorations, maxrss = self.exploreStart
+        explorations = self.stats.explorations - explorations
+        if explorations:
+            elapsed = time.time() - started
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxrss
+            print "%d equipments explored in %.1f seconds " \
+                "(%.2f equipments/s, %d KB of memory per equipment)" % (
+                explorations, elapsed, explorations/elapsed,
+                maxrss/explorations)
         self.exploring = False
-        self.dbpool.runInteraction(self.cleanup)
+        self.cleanup().addErrback(self.reportError, "database")
+
+    def cleanup(self):
+        """Clean older entries and move them in _past tables.
+
+        Entries are moved by batches of C{cleanupbatch} rows, each
+        batch in its own transaction, to avoid locking live tables
+        for a long time. Entries older than C{pastexpire} days are
+        removed from _past tables (unless C{pastexpire} is 0).
 
-    def cleanup(self, txn):
-        """Clean older entries and move them in _past tables"""
-        # Expire old entries
+        @return: deferred firing when cleanup is done
+        """
+        d = self.dbpool.runInteraction(self.expire)
+        d.addCallback(lambda count: count and DatabaseWriter.notify(None))
+        for table in ["equipment", "port", "fdb", "arp", "sonmp", "edp", "cdp", "lldp",
+                      "vlan", "trunk"]:
+            d.addCallback(lambda x, t: self.cleanupBatches(self.archive, t), table)
+            if self.config.get("pastexpire", 0) > 0:
+                d.addCallback(lambda x, t: self.cleanupBatches(self.purge, t), table)
+        return d
+
+    def cleanupBatches(self, f, table):
+        """Run a cleanup function in batches until there is nothing left.
+
+        @param f: function to run in a transaction with the table and
+           the size of the batch, returns the number of rows handled
+        @param table: table to clean
+        """
+        batch = self.config.get("cleanupbatch", 10000)
+        d = self.dbpool.runInteraction(f, table, batch)
+        d.addCallback(lambda count:
+                          count >= batch and self.cleanupBatches(f, table) or None)
+        return d
+
+    def expire(self, txn):
+        """Expire old equipments, return how many were expired"""
         txn.execute("""
 UPDATE equipment SET deleted=CURRENT_TIMESTAMP
 WHERE CURRENT_TIMESTAMP - interval '%(expire)s days' > updated
 AND deleted='infinity'
 """,
                     {'expire': self.config.get('expire', 1)})
-        # Move old entries to _past tables
-        for table in ["equipment", "port", "fdb", "arp", "sonmp", "edp", "cdp", "lldp",
-                      "vlan", "trunk"]:
-            txn.execute("INSERT INTO %s_past "
-                        "SELECT * FROM %s WHERE deleted != 'infinity'" % ((table,)*2))
-            txn.execute("DELETE FROM %s WHERE deleted != 'infinity'" % table)
+        return txn.rowcount
+
+    def archive(self, txn, table, batch):
+        """Move a batch of old entries to _past table
+
+        Rows of the batch are locked, so they keep their C{ctid}
+        until both the copy and the removal are done.
+        """
+        txn.execute("""
+SELECT ctid FROM %(table)s WHERE deleted < 'infinity' LIMIT %(batch)d
+FOR UPDATE
+""" % {'table': table, 'batch': batch})
+        rows = txn.fetchall()
+        if not rows:
+            return 0
+        ctids = "{%s}" % ",".join(['"%s"' % row[0] for row in rows])
+        txn.execute("INSERT INTO %s_past SELECT * FROM %s "
+                    "WHERE ctid = ANY(%%(ctids)s::tid[])" % (table, table),
+                    {'ctids': ctids})
+        txn.execute("DELETE FROM %s WHERE ctid = ANY(%%(ctids)s::tid[])" % table,
+                    {'ctids': ctids})
+        return len(rows)
+
+    def purge(self, txn, table, batch):
+        """Remove a batch of entries too old from _past table"""
+        txn.execute("""
+DELETE FROM %(table)s_past WHERE ctid = ANY(ARRAY(
+  SELECT ctid FROM %(table)s_past
+  WHERE deleted < CURRENT_TIMESTAMP - interval '%(expire)d days'
+  LIMIT %(batch)d))
+""" % {'table': table, 'batch': batch,
+       'expire': self.config['pastexpire']})
+        return txn.rowcount
 
     def reportError(self, failure, ip):
         """Generic method to report an error on failure
@@ -174,46 +586,137 @@ AND deleted='infinity'
             print "The following error occured while exploring %s:\n%s" % (ip,
                                                                            str(failure))
 
-    def handlePlugins(self, info):
+    def handlePlugins(self, info, volatile=False):
         """Give control to plugins.
 
         @param info: C{(proxy, equipment)} tuple
+        @param volatile: if C{True}, only collect volatile information
         """
         proxy, equipment = info
-        # Filter out plugins that do not handle our equipment
-        plugins = [ plugin for plugin
-                    in getPlugins(ICollector,
-                                  wiremaps.collector.equipment)
-                    if plugin.handleEquipment(str(equipment.oid)) ]
-        if not plugins:
-            print "No plugin found for OID %s, using generic one" % str(equipment.oid)
-            plugins = [generic]
+        equipment.volatile = volatile
+        plugins = self.pluginsFor(str(equipment.oid))
         print "Using %s to collect data from %s" % ([str(plugin.__class__)
                                                      for plugin in plugins],
                                                     proxy.ip)
+        started = time.time()
+        collected = [None, None]
         d = defer.succeed(None)
         # Run each plugin to complete C{equipment}
         for plugin in plugins:
             plugin.config = self.config
             d.addCallback(lambda x: plugin.collectData(equipment, proxy))
         # At the end, write C{equipment} to the database
-        d.addCallback(lambda _: DatabaseWriter(equipment, self.config).write(self.dbpool))
+        d.addCallback(lambda _: collected.__setitem__(0, time.time()))
+        d.addCallback(lambda _: self.writeEquipment(equipment, collected))
+        d.addBoth(self.stats.explored, proxy, equipment, plugins,
+                  started, collected)
         return d
 
-    def guessCommunity(self, ignored, proxy, ip, communities, version=2):
+    def writeEquipment(self, equipment, timings=None):
+        """Write an equipment to the database.
+
+        No more than C{writequeue} writes are sent to the database at
+        the same time, the other ones wait in a queue. Explorations
+        wait until their write has completed, queue included, which
+        slows down explorations when the database cannot follow. If
+        the newest write for the same equipment is still waiting, it
+        is replaced by this one, unless this would lose information
+        (volatile data replacing complete data).
+
+        @param equipment: equipment to write
+        @param timings: if not C{None}, list whose second item is set
+           to the time the write leaves the queue
+        @return: deferred firing when the equipment has been written
+        """
+        d = defer.Deferred()
+        waiting = self.pendingWrites.get(equipment.ip)
+        if waiting is not None and \
+                (not equipment.volatile or waiting[0].volatile):
+            waiting[0] = equipment
+            waiting[1].append(d)
+            waiting[2].append(timings)
+            return d
+        # Later writes are folded into the newest one, never into an
+        # older write queued before a volatile one
+        waiting = [equipment, [d], [timings]]
+        self.pendingWrites[equipment.ip] = waiting
+        def write(ignored):
+            if self.pendingWrites.get(equipment.ip) is waiting:
+                del self.pendingWrites[equipment.ip]
+            now = time.time()
+            for t in waiting[2]:
+                if t is not None:
+                    t[1] = now
+            return DatabaseWriter(waiting[0], self.config).write(self.dbpool)
+        def written(result):
+            self.writes.release()
+            for w in waiting[1]:
+                if isinstance(result, Failure):
+                    w.errback(result)
+                else:
+                    w.callback(result)
+        self.writes.acquire().addCallback(write).addBoth(written)
+        return d
+
+    def guessCommunity(self, ip, communities, backoff=False):
         """Try to guess a community.
 
-        @param proxy: an old proxy to close if different of C{None}
+        The community and version that worked for this IP are tried
+        first. Otherwise, all of them are tried at the same time.
+
         @param ip: ip of the equipment to test
         @param communities: list of communities to test
+        @param backoff: if C{True}, don't try IP that did not answer
+           recently
+        @return: deferred proxy
+        """
+        ip = str(ip)
+        if backoff and ip in self.unreachable:
+            failures, retry = self.unreachable[ip]
+            if retry > time.time():
+                raise exception.NoCommunity(
+                    "unable to guess community, next try in %d seconds" % (
+                        retry - time.time()))
+        if ip in self.communities and self.communities[ip][0] in communities:
+            d = self.probeCommunity(ip, *self.communities[ip])
+            d.addErrback(lambda x: self.probeCommunities(ip, communities))
+        else:
+            d = self.probeCommunities(ip, communities)
+        d.addCallbacks(self.gotCommunity, self.noCommunity,
+                       callbackArgs=(ip,), errbackArgs=(ip,))
+        return d
+
+    def gotCommunity(self, proxy, ip):
+        self.communities[ip] = (proxy.community, proxy.version)
+        if ip in self.unreachable:
+            del self.unreachable[ip]
+        return proxy
+
+    def noCommunity(self, failure, ip):
+        failure.trap(exception.NoCommunity)
+        if ip in self.communities:
+            del self.communities[ip]
+        # Exponential backoff
+        failures = self.unreachable.get(ip, (0, None))[0] + 1
+        delay = min(self.config.get("backoff", 300) * 2**(failures - 1),
+                    self.config.get("maxbackoff", 86400))
+        self.unreachable[ip] = (failures, time.time() + delay)
+        return failure
+
+    def newProxy(self, ip, community, version):
+        """Create a proxy for an equipment.
+
+        @param ip: ip of the equipment
+        @param community: community to use
         @param version: SNMP version (1 or 2)
+        @return: proxy using this community and version
         """
-        if not communities:
-            raise exception.NoCommunity("unable to guess community")
-        community = communities[0]
-        if proxy:
-            proxy.community=community
-            proxy.version=version
+        replay = self.config.get("replay", None)
+        if replay is not None:
+            proxy = ReplayAgentProxy(Fixture.load(replay, str(ip)),
+                                     ip=str(ip),
+                                     community=community,
+                                     version=version)
         else:
             proxy = AgentProxy(ip=str(ip),
                                community=community,
@@ -226,18 +729,101 @@ AND deleted='infinity'
             proxy.timeout = timeout
         if retries is not None and retries >= 0:
             proxy.retries = retries
+        return proxy
+
+    def probeProxy(self, proxy):
+        """Check that an equipment answers to a proxy.
+
+        The proxy is closed if the equipment does not answer.
+
+        @param proxy: proxy to test
+        @return: deferred proxy
+        """
+        def failed(failure):
+            proxy.close()
+            return failure
 
-        # Set version and communities for next run if this one doesn't succeed
-        version-=1
-        if version == 0:
-            version=2
-            communities=communities[1:]
         d = proxy.get(['.1.3.6.1.2.1.1.1.0'])
-        d.addCallbacks(callback=lambda x,y: y, callbackArgs=(proxy,),
-                       errback=self.guessCommunity, errbackArgs=(proxy, ip,
-                                                                 communities, version))
+        d.addCallbacks(lambda x: proxy, failed)
         return d
 
+    def probeCommunity(self, ip, community, version):
+        """Check that an equipment answers to a community.
+
+        @param ip: ip of the equipment to test
+        @param community: community to test
+        @param version: SNMP version (1 or 2)
+        @return: deferred proxy using this community and version
+        """
+        return self.probeProxy(self.newProxy(ip, community, version))
+
+    def probeCommunities(self, ip, communities):
+        """Probe communities and versions concurrently.
+
+        The first one to answer wins. However, an answer with SNMPv1
+        is only accepted once SNMPv2 failed for the same community
+        since we want to use GETBULK when possible.
+
+        Each probe needs its own proxy. Only C{probes} of them are
+        run at the same time for a given equipment and the other
+        proxies are closed as soon as there is a winner.
+
+        @param ip: ip of the equipment to test
+        @param communities: list of communities to test
+        @return: deferred proxy
+        """
+        result = defer.Deferred()
+        candidates = []
+        for community in communities:
+            for version in (2, 1):
+                if (community, version) not in candidates:
+                    candidates.append((community, version))
+        probes = defer.DeferredSemaphore(self.config.get("probes", 2))
+        proxies = {}            # candidate -> proxy
+        answers = {}            # candidate -> proxy or None if failed
+
+        def check():
+            if result.called:
+                return
+            for community, version in candidates:
+                proxy = answers.get((community, version), None)
+                if proxy is None:
+                    continue
+                if version == 2 or (community, 2) in answers:
+                    # Pending probes of the other proxies fail
+                    for other in proxies.values():
+                        if other is not proxy:
+                            other.close()
+                    result.callback(proxy)
+                    return
+            if len(answers) == len(candidates):
+                result.errback(
+                    exception.NoCommunity("unable to guess community"))
+
+        def answered(proxy, candidate):
+            answers[candidate] = proxy
+            check()
+
+        def failed(failure, candidate):
+            answers[candidate] = None
+            check()
+
+        def probe(candidate):
+            if result.called:
+                # We already have a winner
+                return
+            proxy = proxies[candidate] = self.newProxy(ip, *candidate)
+            d = self.probeProxy(proxy)
+            d.addCallbacks(answered, failed,
+                           callbackArgs=(candidate,), errbackArgs=(candidate,))
+            return d
+
+        if not candidates:
+            raise exception.NoCommunity("unable to guess community")
+        for candidate in candidates:
+            probes.run(probe, candidate)
+        return result
+
     def getBasicInformation(self, proxy):
         """Get some basic information to file C{equipment} table.
 
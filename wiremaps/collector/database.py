@@ -1,7 +1,38 @@
-from wiremaps.collector.datastore import ILocalVlan, IRemoteVlan
+from cStringIO import StringIO
+
+from wiremaps.collector.datastore import ILocalVlan, IRemoteVlan, int2mac
+
+def normmac(mac):
+    """Normalize a MAC address like PostgreSQL would display it.
+
+    @param mac: MAC address in any form accepted by C{macaddr} type
+    @return: MAC address as C{xx:xx:xx:xx:xx:xx} or C{None}
+    """
+    if mac is None:
+        return None
+    mac = str(mac).lower().replace("-", ":").replace(".", ":")
+    parts = mac.split(":")
+    try:
+        if len(parts) == 6:
+            return ":".join(["%02x" % int(p, 16) for p in parts])
+        mac = "".join(parts)
+        if len(mac) == 12:
+            return ":".join(["%02x" % int(mac[i:i+2], 16)
+                             for i in range(0, 12, 2)])
+    except ValueError:
+        pass
+    return mac
 
 class DatabaseWriter:
-    """Write an equipment datastore to the database."""
+    """Write an equipment datastore to the database.
+
+    Functions in C{observers} are called with the IP of the
+    equipment each time a write modifying the equipment table is
+    committed. C{None} is used when several equipments may have been
+    modified.
+    """
+
+    observers = []
 
     def __init__(self, equipment, config):
         """Create an instance of database writer.
@@ -10,17 +41,41 @@ class DatabaseWriter:
         """
         self.equipment = equipment
         self.config = config
+        self.changed = False
+
+    def notify(cls, ip):
+        """Tell observers that the equipment table has been modified.
+
+        @param ip: IP of the modified equipment or C{None}
+        """
+        for observer in cls.observers:
+            observer(ip)
+    notify = classmethod(notify)
+
+    def written(self, result):
+        if self.changed:
+            self.notify(self.equipment.ip)
+        return result
 
     def write(self, dbpool, txn=None):
         """Write the equipment to the database.
 
+        If only volatile information has been collected, other
+        tables are left untouched.
+
         @param dbpool: dbpool to use for write
         @param txn: transaction, used internally
         """
         # We run everything in a transaction
         if txn is None:
-            return dbpool.runInteraction(lambda x: self.write(dbpool, x))
+            d = dbpool.runInteraction(lambda x: self.write(dbpool, x))
+            d.addCallback(self.written)
+            return d
         self._equipment(txn)
+        if self.equipment.volatile:
+            self._fdb(txn)
+            self._arp(txn)
+            return
         self._port(txn)
         self._fdb(txn)
         self._arp(txn)
@@ -47,10 +102,12 @@ class DatabaseWriter:
             txn.execute("INSERT INTO equipment (ip, name, oid, description, location) VALUES "
                         "(%(ip)s, %(name)s, %(oid)s, %(description)s, %(location)s)",
                         target)
+            self.changed = True
         else:
             # Maybe something changed
             if id[0][1] != target["name"] or id[0][2] != target["oid"] or \
                     id[0][3] != target["description"] or id[0][4] != target["location"]:
+                self.changed = True
                 txn.execute("UPDATE equipment SET deleted=CURRENT_TIMESTAMP "
                             "WHERE ip=%(ip)s AND deleted='infinity'",
                             target)
@@ -64,6 +121,7 @@ class DatabaseWriter:
 
     def _port(self, txn):
         """Write port related information to the database."""
+        closed = []        # List of ports to close
         uptodate = []      # List of ports that are already up-to-date
         # Try to get existing ports
         txn.execute("SELECT index, name, alias, cstate, mac, speed, duplex, autoneg "
@@ -73,66 +131,129 @@ class DatabaseWriter:
         for port, name, alias, cstate, mac, speed, duplex, autoneg in txn.fetchall():
             if port not in self.equipment.ports:
                 # Delete port
-                txn.execute("UPDATE port SET deleted=CURRENT_TIMESTAMP "
-                            "WHERE equipment = %(ip)s "
-                            "AND index = %(index)s AND deleted='infinity'",
-                            {'ip': self.equipment.ip,
-                             'index': port})
-            else:
-                # Refresh port
-                nport = self.equipment.ports[port]
-                # We ask PostgreSQL to compare MAC addresses for us
-                txn.execute("SELECT 1 WHERE %(mac1)s::macaddr = %(mac2)s::macaddr",
-                            {'mac1': mac,
-                             'mac2': nport.mac})
-                if not(txn.fetchall()) or \
-                        name != nport.name or \
-                        alias != nport.alias or \
-                        cstate != nport.state or \
-                        speed != nport.speed or \
-                        duplex != nport.duplex or \
-                        autoneg != nport.autoneg:
-                    # Delete the old one
-                    txn.execute("UPDATE port SET deleted=CURRENT_TIMESTAMP "
-                                "WHERE equipment = %(ip)s "
-                                "AND index = %(index)s AND deleted='infinity'",
-                                {'ip': self.equipment.ip,
-                                 'index': port})
-                else:
-                    # We don't need to update it, it is up-to-date
-                    uptodate.append(port)
-        for port in self.equipment.ports:
-            if port in uptodate: continue
-            # Add port
+                closed.append(port)
+                continue
+            # Refresh port
             nport = self.equipment.ports[port]
-            txn.execute("""
-INSERT INTO port
-(equipment, index, name, alias, cstate, mac, speed, duplex, autoneg)
-VALUES (%(ip)s, %(port)s, %(name)s, %(alias)s, %(state)s, %(address)s,
-        %(speed)s, %(duplex)s, %(autoneg)s)
-""",
-                        {'ip': self.equipment.ip,
-                         'port': port,
-                         'name': nport.name,
-                         'alias': nport.alias,
-                         'state': nport.state,
-                         'address': nport.mac,
-                         'speed': nport.speed,
-                         'duplex': nport.duplex,
-                         'autoneg': nport.autoneg,
-                         })
+            if normmac(mac) != normmac(nport.mac) or \
+                    name != nport.name or \
+                    alias != nport.alias or \
+                    cstate != nport.state or \
+                    speed != nport.speed or \
+                    duplex != nport.duplex or \
+                    autoneg != nport.autoneg:
+                # Delete the old one
+                closed.append(port)
+            else:
+                # We don't need to update it, it is up-to-date
+                uptodate.append(port)
+        if closed:
+            params = dict([("index_%d" % i, port)
+                           for i, port in enumerate(closed)])
+            params['ip'] = self.equipment.ip
+            txn.execute("UPDATE port SET deleted=CURRENT_TIMESTAMP "
+                        "WHERE equipment = %%(ip)s "
+                        "AND index IN (%s) AND deleted='infinity'" % \
+                            ", ".join(["%%(index_%d)s" % i
+                                       for i in range(len(closed))]),
+                        params)
+        # Add ports
+        self._insertmany(txn, "port",
+                         ["equipment", "index", "name", "alias", "cstate",
+                          "mac", "speed", "duplex", "autoneg"],
+                         [(self.equipment.ip, port,
+                           nport.name, nport.alias, nport.state, nport.mac,
+                           nport.speed, nport.duplex, nport.autoneg)
+                          for port, nport in self.equipment.ports.items()
+                          if port not in uptodate])
+
+    def _values(self, columns, rows, params):
+        """Build a C{VALUES} list for several rows.
+
+        @param columns: list of columns
+        @param rows: list of tuples with values for each column
+        @param params: dictionary to complete with the values
+        @return: C{VALUES} clause with placeholders
+        """
+        values = []
+        for i, row in enumerate(rows):
+            values.append("(%s)" % ", ".join(["%%(%s_%d)s" % (column, i)
+                                              for column in columns]))
+            for column, value in zip(columns, row):
+                params["%s_%d" % (column, i)] = value
+        return "VALUES %s" % ", ".join(values)
+
+    def _insertmany(self, txn, table, columns, rows):
+        """Insert several rows with a single INSERT statement.
+
+        @param table: table to insert rows into
+        @param columns: list of columns
+        @param rows: list of tuples with values for each column
+        """
+        if not rows:
+            return
+        params = {}
+        values = self._values(columns, rows, params)
+        txn.execute("INSERT INTO %s (%s) %s" % (table,
+                                                ", ".join(columns),
+                                                values),
+                    params)
+
+    def _bulk(self, txn):
+        """Should we use COPY to write large tables?
+
+        COPY is only available with psycopg2. It can be disabled with
+        C{bulkwrite} in configuration.
+        """
+        return self.config.get('bulkwrite', True) and hasattr(txn, "copy_from")
+
+    def _copy(self, txn, table, columns, rows):
+        """Stage rows in a temporary table with a single COPY.
+
+        The temporary table is dropped at the end of the transaction.
+
+        @param table: name of the temporary table to create
+        @param columns: list of C{(name, type)} tuples
+        @param rows: list of tuples to copy into the table
+        """
+        txn.execute("CREATE TEMPORARY TABLE %s (%s) ON COMMIT DROP" % (
+                table, ", ".join(["%s %s" % c for c in columns])))
+        buf = StringIO()
+        for row in rows:
+            buf.write("\t".join([str(x) for x in row]))
+            buf.write("\n")
+        buf.seek(0)
+        txn.copy_from(buf, table, columns=[c[0] for c in columns])
 
     def _fdb(self, txn):
         """Write FDB to database"""
-        for port in self.equipment.ports:
-            for mac in self.equipment.ports[port].fdb:
-                # Some magic here: PostgreSQL will take care of
-                # updating the record if it already exists.
-                txn.execute("INSERT INTO fdb (equipment, port, mac) "
-                            "VALUES (%(ip)s, %(port)s, %(mac)s)",
-                            {'ip': self.equipment.ip,
-                             'port': port,
-                             'mac': mac})
+        if self._bulk(txn):
+            self._copy(txn, "fdb_new", [("port", "int"), ("mac", "macaddr")],
+                       [(port, int2mac(mac))
+                        for port in self.equipment.ports
+                        for mac in self.equipment.ports[port].fdb])
+            # Refresh entries we already know, then add the new ones
+            txn.execute("UPDATE fdb SET updated=CURRENT_TIMESTAMP "
+                        "FROM fdb_new n "
+                        "WHERE fdb.equipment=%(ip)s AND fdb.port=n.port "
+                        "AND fdb.mac=n.mac AND fdb.deleted='infinity'",
+                        {'ip': self.equipment.ip})
+            txn.execute("INSERT INTO fdb (equipment, port, mac) "
+                        "SELECT DISTINCT %(ip)s::inet, n.port, n.mac FROM fdb_new n "
+                        "WHERE NOT EXISTS (SELECT 1 FROM fdb "
+                        "WHERE equipment=%(ip)s AND port=n.port AND mac=n.mac "
+                        "AND deleted='infinity')",
+                        {'ip': self.equipment.ip})
+        else:
+            for port in self.equipment.ports:
+                for mac in self.equipment.ports[port].fdb:
+                    # Some magic here: PostgreSQL will take care of
+                    # updating the record if it already exists.
+                    txn.execute("INSERT INTO fdb (equipment, port, mac) "
+                                "VALUES (%(ip)s, %(port)s, %(mac)s)",
+                                {'ip': self.equipment.ip,
+                                 'port': port,
+                                 'mac': int2mac(mac)})
         # Expire oldest entries
         txn.execute("UPDATE fdb SET deleted=CURRENT_TIMESTAMP WHERE "
                     "CURRENT_TIMESTAMP - interval '%(expire)s hours' > updated "
@@ -142,14 +263,30 @@ VALUES (%(ip)s, %(port)s, %(name)s, %(alias)s, %(state)s, %(address)s,
 
     def _arp(self, txn):
         """Write ARP table to database"""
-        for ip in self.equipment.arp:
-            # Some magic here: PostgreSQL will take care of
-            # updating the record if it already exists.
-            txn.execute("INSERT INTO arp (equipment, mac, ip) VALUES (%(ip)s, "
-                        "%(mac)s, %(rip)s)",
-                        {'ip': self.equipment.ip,
-                         'mac': self.equipment.arp[ip],
-                         'rip': ip})
+        if self._bulk(txn):
+            self._copy(txn, "arp_new", [("mac", "macaddr"), ("ip", "inet")],
+                       [(self.equipment.arp[ip], ip)
+                        for ip in self.equipment.arp])
+            txn.execute("UPDATE arp SET updated=CURRENT_TIMESTAMP "
+                        "FROM arp_new n "
+                        "WHERE arp.equipment=%(ip)s AND arp.mac=n.mac "
+                        "AND arp.ip=n.ip AND arp.deleted='infinity'",
+                        {'ip': self.equipment.ip})
+            txn.execute("INSERT INTO arp (equipment, mac, ip) "
+                        "SELECT DISTINCT %(ip)s::inet, n.mac, n.ip FROM arp_new n "
+                        "WHERE NOT EXISTS (SELECT 1 FROM arp "
+                        "WHERE equipment=%(ip)s AND mac=n.mac AND ip=n.ip "
+                        "AND deleted='infinity')",
+                        {'ip': self.equipment.ip})
+        else:
+            for ip in self.equipment.arp:
+                # Some magic here: PostgreSQL will take care of
+                # updating the record if it already exists.
+                txn.execute("INSERT INTO arp (equipment, mac, ip) VALUES (%(ip)s, "
+                            "%(mac)s, %(rip)s)",
+                            {'ip': self.equipment.ip,
+                             'mac': self.equipment.arp[ip],
+                             'rip': ip})
         # Expire oldest entries
         txn.execute("UPDATE arp SET deleted=CURRENT_TIMESTAMP WHERE "
                     "CURRENT_TIMESTAMP - interval '%(expire)s hours' > updated "
@@ -157,92 +294,152 @@ VALUES (%(ip)s, %(port)s, %(name)s, %(alias)s, %(state)s, %(address)s,
                     {'ip': self.equipment.ip,
                      'expire': self.config.get('arpexpire', 24)})
 
+    def _replace(self, txn, table, key, columns, rows):
+        """Replace live rows of a table for the current equipment.
+
+        Unless C{diffwrite} is disabled in configuration, only rows
+        that changed are touched (see L{_diff}). Otherwise, all live
+        rows are closed and inserted again: C{insert_*} rules will
+        revive the ones that did not change.
+
+        @param table: table to write
+        @param key: columns identifying a live row, without C{equipment}
+        @param columns: columns to write, without C{equipment}
+        @param rows: list of tuples with values for each column
+        """
+        if self.config.get('diffwrite', True):
+            return self._diff(txn, table, key, columns, rows)
+        txn.execute("UPDATE %s SET deleted=CURRENT_TIMESTAMP "
+                    "WHERE equipment=%%(ip)s AND deleted='infinity'" % table,
+                    {'ip': self.equipment.ip})
+        for row in rows:
+            params = dict(zip(columns, row))
+            params['ip'] = self.equipment.ip
+            txn.execute("INSERT INTO %s (equipment, %s) VALUES (%%(ip)s, %s)" % (
+                    table, ", ".join(columns),
+                    ", ".join(["%%(%s)s" % column for column in columns])),
+                        params)
+
+    def _diff(self, txn, table, key, columns, rows):
+        """Write rows of a table by only touching rows that changed.
+
+        The result is the same as closing all live rows and inserting
+        them again. Rows already closed in this transaction (for
+        example by C{update_port} rule) are revived if they are still
+        present, like C{insert_*} rules would do.
+
+        Rows are compared like the rules do: a C{NULL} (C{None})
+        value is never equal to anything, so a row containing one is
+        always closed and inserted again, never kept or revived.
+        Values are compared as returned by the database: a value
+        written in another form (for example, C{10.0.0.1/32} for an
+        C{inet}) is inserted again instead of being revived, which
+        only loses the creation date.
+
+        @param table: table to write
+        @param key: columns identifying a live row, without C{equipment}
+        @param columns: columns to write, without C{equipment}
+        @param rows: list of tuples with values for each column
+        """
+        def norm(row):
+            return tuple([type(x) is str and x.decode("utf-8", "replace") or x
+                          for x in row])
+        def rowkey(row):
+            return tuple([row[columns.index(k)] for k in key])
+        def same(row1, row2):
+            return row1 is not None and row2 is not None and \
+                None not in row1 and row1 == row2
+
+        # Rows we want. When several rows share the same key, the
+        # first one wins (this is what `insert_vlan_duplicate' does).
+        wanted = {}
+        for row in rows:
+            row = norm(row)
+            if rowkey(row) not in wanted:
+                wanted[rowkey(row)] = row
+        # Rows we have
+        live = {}
+        closed = {}
+        txn.execute("SELECT %s, deleted='infinity' FROM %s "
+                    "WHERE equipment=%%(ip)s "
+                    "AND (deleted='infinity' OR deleted=CURRENT_TIMESTAMP::abstime)" % (
+                ", ".join(columns), table),
+                    {'ip': self.equipment.ip})
+        for row in txn.fetchall():
+            current = norm(row[:-1])
+            if row[-1]:
+                live[rowkey(current)] = current
+            else:
+                closed[rowkey(current)] = current
+
+        toclose = [k for k in live if not same(wanted.get(k), live[k])]
+        torevive = [k for k in wanted
+                    if not same(live.get(k), wanted[k]) and
+                    same(closed.get(k), wanted[k])]
+        toinsert = [wanted[k] for k in wanted
+                    if not same(live.get(k), wanted[k]) and
+                    not same(closed.get(k), wanted[k])]
+        for keys, old, new in [(toclose, "'infinity'", "CURRENT_TIMESTAMP"),
+                               (torevive, "CURRENT_TIMESTAMP::abstime", "'infinity'")]:
+            if not keys:
+                continue
+            params = {'ip': self.equipment.ip}
+            values = self._values(key, keys, params)
+            txn.execute("UPDATE %s SET deleted=%s "
+                        "FROM (%s) AS d (%s) "
+                        "WHERE %s.equipment=%%(ip)s AND %s.deleted=%s AND %s" % (
+                    table, new, values, ", ".join(key), table, table, old,
+                    " AND ".join(["%s.%s=d.%s" % (table, k, k) for k in key])),
+                        params)
+        self._insertmany(txn, table,
+                         ["equipment"] + columns,
+                         [(self.equipment.ip,) + row for row in toinsert])
+
     def _trunk(self, txn):
         """Write trunk related information into database"""
-        txn.execute("UPDATE trunk SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
-        for port in self.equipment.ports:
-            if self.equipment.ports[port].trunk is not None:
-                txn.execute("INSERT INTO trunk VALUES (%(ip)s, %(trunk)s, %(port)s)",
-                            {'ip': self.equipment.ip,
-                             'trunk': self.equipment.ports[port].trunk.parent,
-                             'port': port
-                             })
+        self._replace(txn, "trunk",
+                      ["port", "member"], ["port", "member"],
+                      [(nport.trunk.parent, port)
+                       for port, nport in self.equipment.ports.items()
+                       if nport.trunk is not None])
 
     def _sonmp(self, txn):
         """Write SONMP related information into database"""
-        txn.execute("UPDATE sonmp SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
-        for port in self.equipment.ports:
-            nport = self.equipment.ports[port]
-            if nport.sonmp is None: continue
-            txn.execute("INSERT INTO sonmp VALUES (%(ip)s, "
-                        "%(port)s, %(rip)s, %(rport)s)",
-                        {'ip': self.equipment.ip,
-                         'port': port,
-                         'rip': nport.sonmp.ip,
-                         'rport': nport.sonmp.port})
+        self._replace(txn, "sonmp",
+                      ["port"], ["port", "remoteip", "remoteport"],
+                      [(port, nport.sonmp.ip, nport.sonmp.port)
+                       for port, nport in self.equipment.ports.items()
+                       if nport.sonmp is not None])
 
     def _edp(self, txn):
         """Write EDP related information into database"""
-        txn.execute("UPDATE edp SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
-        for port in self.equipment.ports:
-            nport = self.equipment.ports[port]
-            if nport.edp is None: continue
-            txn.execute("INSERT INTO edp VALUES (%(ip)s, "
-                        "%(port)s, %(sysname)s, %(remoteslot)s, "
-                        "%(remoteport)s)",
-                        {'ip': self.equipment.ip,
-                         'port': port,
-                         'sysname': nport.edp.sysname,
-                         'remoteslot': nport.edp.slot,
-                         'remoteport': nport.edp.port})
+        self._replace(txn, "edp",
+                      ["port"], ["port", "sysname", "remoteslot", "remoteport"],
+                      [(port, nport.edp.sysname, nport.edp.slot, nport.edp.port)
+                       for port, nport in self.equipment.ports.items()
+                       if nport.edp is not None])
 
     def _cdp(self, txn):
         """Write CDP related information into database"""
-        txn.execute("UPDATE cdp SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
-        for port in self.equipment.ports:
-            nport = self.equipment.ports[port]
-            if nport.cdp is None: continue
-            txn.execute("INSERT INTO cdp VALUES (%(ip)s, "
-                        "%(port)s, %(sysname)s, %(portname)s, "
-                        "%(mgmtip)s, %(platform)s)",
-                        {'ip': self.equipment.ip,
-                         'port': port,
-                         'sysname': nport.cdp.sysname,
-                         'portname': nport.cdp.port,
-                         'platform': nport.cdp.platform,
-                         'mgmtip': nport.cdp.ip})
+        self._replace(txn, "cdp",
+                      ["port"], ["port", "sysname", "portname", "mgmtip", "platform"],
+                      [(port, nport.cdp.sysname, nport.cdp.port,
+                        nport.cdp.ip, nport.cdp.platform)
+                       for port, nport in self.equipment.ports.items()
+                       if nport.cdp is not None])
 
     def _lldp(self, txn):
         """Write LLDP related information into database"""
-        txn.execute("UPDATE lldp SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
-        for port in self.equipment.ports:
-            nport = self.equipment.ports[port]
-            if nport.lldp is None: continue
-            txn.execute("INSERT INTO lldp VALUES (%(ip)s, "
-                        "%(port)s, %(mgmtip)s, %(portdesc)s, "
-                        "%(sysname)s, %(sysdesc)s)",
-                        {'ip': self.equipment.ip,
-                         'port': port,
-                         'mgmtip': nport.lldp.ip,
-                         'portdesc': nport.lldp.portdesc,
-                         'sysname': nport.lldp.sysname,
-                         'sysdesc': nport.lldp.sysdesc})
+        self._replace(txn, "lldp",
+                      ["port"], ["port", "mgmtip", "portdesc", "sysname", "sysdesc"],
+                      [(port, nport.lldp.ip, nport.lldp.portdesc,
+                        nport.lldp.sysname, nport.lldp.sysdesc)
+                       for port, nport in self.equipment.ports.items()
+                       if nport.lldp is not None])
 
     def _vlan(self, txn):
         """Write VLAN information into database"""
-        txn.execute("UPDATE vlan SET deleted=CURRENT_TIMESTAMP "
-                    "WHERE equipment=%(ip)s AND deleted='infinity'",
-                    {'ip': self.equipment.ip})
+        rows = []
         for port in self.equipment.ports:
             for vlan in self.equipment.ports[port].vlan:
                 if ILocalVlan.providedBy(vlan):
@@ -251,11 +448,7 @@ VALUES (%(ip)s, %(port)s, %(name)s, %(alias)s, %(state)s, %(address)s,
                     type = 'remote'
                 else:
                     raise ValueError, "%r is neither a local or a remote VLAN"
-                txn.execute("INSERT INTO vlan VALUES (%(ip)s, "
-                            "%(port)s, %(vid)s, %(name)s, "
-                            "%(type)s)",
-                            {'ip': self.equipment.ip,
-                             'port': port,
-                             'vid': vlan.vid,
-                             'name': vlan.name,
-                             'type': type})
+                rows.append((port, vlan.vid, vlan.name, type))
+        self._replace(txn, "vlan",
+                      ["port", "vid", "type"], ["port", "vid", "name", "type"],
+                      rows)
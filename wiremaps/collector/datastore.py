@@ -1,4 +1,11 @@
 # Datastore for equipment related information
+#
+# Many of those objects are held in memory while exploring large
+# switches. Therefore, they use __slots__, VLAN are shared between
+# ports and FDB is stored as an array of integers.
+
+import weakref
+from array import array
 
 from zope.interface import Interface, Attribute, implements
 
@@ -8,6 +15,19 @@ def ascii(s):
         return None
     return s.decode("ascii", "replace")
 
+# array typecode able to hold a MAC address (48 bits). A double can
+# hold any integer up to 53 bits exactly.
+MAC_TYPECODE = array("L").itemsize >= 6 and "L" or "d"
+
+def mac2int(mac):
+    """Convert a MAC address (as a string) to an integer"""
+    return int(mac.replace(":", ""), 16)
+
+def int2mac(mac):
+    """Convert an integer to a MAC address (as a string)"""
+    mac = "%012x" % int(mac)
+    return ":".join([mac[i:i+2] for i in range(0, 12, 2)])
+
 class IEquipment(Interface):
     """Interface for object containing complete description of an equipment"""
 
@@ -19,9 +39,13 @@ class IEquipment(Interface):
 
     ports = Attribute('List of ports for this equipment as a mapping with index as key')
     arp = Attribute('ARP mapping (IP->MAC) for this equipment.')
+    volatile = Attribute('Only volatile information (FDB, ARP) is collected.')
+    timings = Attribute('Time spent in each collector helper as a mapping with helper name as key')
 
-class Equipment:
+class Equipment(object):
     implements(IEquipment)
+    __slots__ = ("ip", "name", "oid", "description", "location",
+                 "ports", "arp", "volatile", "timings")
 
     def __init__(self, ip, name, oid, description, location):
         self.ip = ip
@@ -31,6 +55,8 @@ class Equipment:
         self.location = ascii(location)
         self.ports = {}
         self.arp = {}
+        self.volatile = False
+        self.timings = {}
 
 class IPort(Interface):
     """Interface for object containing port information"""
@@ -43,7 +69,7 @@ class IPort(Interface):
     duplex = Attribute('Duplex of this port.')
     autoneg = Attribute('Autoneg for this port.')
 
-    fdb = Attribute('MAC on this port.')
+    fdb = Attribute('MAC on this port (as an array of integers, see L{int2mac}).')
     sonmp = Attribute('SONMP information for this port.')
     edp = Attribute('EDP information for this port.')
     cdp = Attribute('CDP information for this port.')
@@ -51,8 +77,11 @@ class IPort(Interface):
     vlan = Attribute('List of VLAN attached to this port.')
     trunk = Attribute('Trunk information for this port.')
 
-class Port:
+class Port(object):
     implements(IPort)
+    __slots__ = ("name", "state", "alias", "mac", "speed", "duplex",
+                 "autoneg", "fdb", "sonmp", "edp", "cdp", "lldp",
+                 "vlan", "trunk")
 
     def __init__(self, name, state,
                  alias=None, mac=None, speed=None, duplex=None, autoneg=None):
@@ -63,7 +92,7 @@ class Port:
         self.speed = speed
         self.duplex = duplex
         self.autoneg = autoneg
-        self.fdb = []
+        self.fdb = array(MAC_TYPECODE)
         self.sonmp = None
         self.edp = None
         self.cdp = None
@@ -77,8 +106,9 @@ class ISonmp(Interface):
     ip = Attribute('Remote IP')
     port = Attribute('Remote port')
 
-class Sonmp:
+class Sonmp(object):
     implements(ISonmp)
+    __slots__ = ("ip", "port")
 
     def __init__(self, ip, port):
         self.ip = ip
@@ -91,8 +121,9 @@ class IEdp(Interface):
     slot = Attribute('Remote slot')
     port = Attribute('Remote port')
 
-class Edp:
+class Edp(object):
     implements(IEdp)
+    __slots__ = ("sysname", "slot", "port")
 
     def __init__(self, sysname, slot, port):
         self.sysname = ascii(sysname)
@@ -107,8 +138,9 @@ class ICdp(Interface):
     ip = Attribute('Remote management IP')
     platform = Attribute('Remote platform name')
 
-class Cdp:
+class Cdp(object):
     implements(ICdp)
+    __slots__ = ("sysname", "port", "ip", "platform")
 
     def __init__(self, sysname, port, ip, platform):
         self.sysname = ascii(sysname)
@@ -124,8 +156,9 @@ class ILldp(Interface):
     portdesc = Attribute('Remote port description')
     ip = Attribute('Remote management IP')
 
-class Lldp:
+class Lldp(object):
     implements(ILldp)
+    __slots__ = ("sysname", "sysdesc", "portdesc", "ip")
 
     def __init__(self, sysname, sysdesc, portdesc, ip=None):
         self.sysname = ascii(sysname)
@@ -144,23 +177,41 @@ class ILocalVlan(IVlan):
 class IRemoteVlan(IVlan):
     """Interface for a remote VLAN"""
 
-class Vlan:
-    def __init__(self, vid, name):
-        self.vid = vid
-        self.name = ascii(name)
+class Vlan(object):
+    """A VLAN.
+
+    VLAN are immutable and shared: creating a VLAN with the same VID
+    and name than an existing one returns the existing one.
+    """
+    __slots__ = ("vid", "name", "__weakref__")
+    interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, vid, name):
+        name = ascii(name)
+        try:
+            return cls.interned[cls, vid, name]
+        except KeyError:
+            vlan = object.__new__(cls)
+            vlan.vid = vid
+            vlan.name = name
+            cls.interned[cls, vid, name] = vlan
+            return vlan
 
 class LocalVlan(Vlan):
     implements(ILocalVlan)
+    __slots__ = ()
 class RemoteVlan(Vlan):
     implements(IRemoteVlan)
+    __slots__ = ()
 
 class ITrunk(Interface):
     """Interface for an object containing information about one trunk on a port"""
 
     parent = Attribute('Parent of this port')
 
-class Trunk:
+class Trunk(object):
     implements(ITrunk)
+    __slots__ = ("parent",)
 
     def __init__(self, parent):
         self.parent = parent
@@ -9,6 +9,7 @@ from wiremaps.collector.datastore import LocalVlan
 from wiremaps.collector.helpers.port import PortCollector
 from wiremaps.collector.helpers.fdb import CommunityFdbCollector
 from wiremaps.collector.helpers.arp import ArpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class SuperStack:
     """Collector for 3Com SuperStack switches"""
@@ -38,11 +39,12 @@ class SuperStack:
         fdb = SuperStackFdbCollector(equipment, proxy, self.config)
         arp = ArpCollector(equipment, proxy, self.config)
         vlan = SuperStackVlanCollector(equipment, proxy)
-        d = ports.collectData()
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        return s.run(equipment.volatile, equipment.timings)
 
 superstack = SuperStack()
 
@@ -10,6 +10,7 @@ from wiremaps.collector.helpers.sonmp import SonmpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector
 from wiremaps.collector.helpers.vlan import VlanCollector
 from wiremaps.collector.helpers.nortel import NortelSpeedCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Nortel5510:
     """Collector for Nortel Baystack-like switchs (55xx, 425, etc.)"""
@@ -34,14 +35,15 @@ class Nortel5510:
         sonmp = SonmpCollector(equipment, proxy)
         vlan = NortelVlanCollector(equipment, proxy,
                                    normPort=lambda x: x-1)
-        d = ports.collectData()
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: sonmp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("sonmp", sonmp.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports", "lldp"])
+        return s.run(equipment.volatile, equipment.timings)
 
 n5510 = Nortel5510()
 
@@ -9,6 +9,7 @@ from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.sonmp import SonmpCollector
 from wiremaps.collector.helpers.vlan import VlanCollector
 from wiremaps.collector.helpers.speed import SpeedCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Alteon2208:
     """Collector for Nortel Alteon 2208 and related"""
@@ -46,13 +47,14 @@ class Alteon2208:
         arp = ArpCollector(equipment, proxy, self.config)
         vlan = AlteonVlanCollector(equipment, proxy, lambda x: self.normPortIndex(x-1))
         sonmp = SonmpCollector(equipment, proxy, self.normPortIndex)
-        d = ports.collectData()
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        d.addCallback(lambda x: sonmp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("sonmp", sonmp.collectData, ["ports"])
+        return s.run(equipment.volatile, equipment.timings)
 
 alteon = Alteon2208()
 
@@ -70,29 +72,29 @@ class AlteonSpeedCollector(SpeedCollector):
 
     def gotDuplex(self, results):
         """Callback handling duplex"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            if results[oid] == 3:
+        for index in results:
+            port = index[-1]
+            if results[index] == 3:
                 self.duplex[port] = "half"
-            elif results[oid] == 2:
+            elif results[index] == 2:
                 self.duplex[port] = "full"
 
     def gotSpeed(self, results):
         """Callback handling speed"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            if results[oid] == 2:
+        for index in results:
+            port = index[-1]
+            if results[index] == 2:
                 self.speed[port] = 10
-            elif results[oid] == 3:
+            elif results[index] == 3:
                 self.speed[port] = 100
-            elif results[oid] == 4:
+            elif results[index] == 4:
                 self.speed[port] = 1000
-            elif results[oid] == 6:
+            elif results[index] == 6:
                 self.speed[port] = 10000
 
     def gotAutoneg(self, results):
         """Callback handling autoneg"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            self.autoneg[port] = bool(results[oid] == 2)
+        for index in results:
+            port = index[-1]
+            self.autoneg[port] = bool(results[index] == 2)
 
@@ -4,6 +4,7 @@ from twisted.plugin import IPlugin
 from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.helpers.port import PortCollector
 from wiremaps.collector.helpers.arp import ArpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class ArrowPoint:
     """Collector for Arrowpoint Content Switch (no FDB)"""
@@ -21,8 +22,9 @@ class ArrowPoint:
     def collectData(self, equipment, proxy):
         ports = PortCollector(equipment, proxy, self.normPortName)
         arp = ArpCollector(equipment, proxy, self.config)
-        d = ports.collectData()
-        d.addCallback(lambda x: arp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        return s.run(equipment.volatile, equipment.timings)
 
 arrow = ArrowPoint()
@@ -9,6 +9,7 @@ from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.equipment.alteon import AlteonVlanCollector, AlteonSpeedCollector
 from wiremaps.collector.helpers.vlan import VlanCollector
 from wiremaps.collector.helpers.lldp import LldpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class BladeEthernetSwitch:
     """Collector for various Blade Ethernet Switch based on AlteonOS"""
@@ -39,13 +40,14 @@ class BladeEthernetSwitch:
         vlan.oidVlanNames = '%s.2.1.1.3.1.2' % self.baseoid
         vlan.oidVlanPorts = '%s.2.1.1.3.1.3' % self.baseoid
 
-        d = ports.collectData()
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports", "vlan"])
+        return s.run(equipment.volatile, equipment.timings)
 
 class NortelEthernetSwitch(BladeEthernetSwitch):
     """Collector for Nortel Ethernet Switch Module for BladeCenter"""
@@ -9,6 +9,8 @@ from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.fdb import CommunityFdbCollector
 from wiremaps.collector.helpers.cdp import CdpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
+from wiremaps.collector.helpers.bitmap import bitmap
 
 class Cisco:
     """Collector for Cisco (including Cisco CSS)"""
@@ -45,14 +47,15 @@ class Cisco:
         cdp = CdpCollector(equipment, proxy)
         lldp = LldpCollector(equipment, proxy)
         vlan = CiscoVlanCollector(equipment, proxy, ports)
-        d = trunk.collectData()
-        d.addCallback(lambda x: ports.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: cdp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("trunk", trunk.collectData)
+        s.add("ports", ports.collectData, ["trunk"])
+        s.add("arp", arp.collectData)
+        s.add("cdp", cdp.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports", "lldp"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        return s.run(equipment.volatile, equipment.timings)
 
 cisco = Cisco()
 ciscoCss = Cisco(True)
@@ -172,12 +175,7 @@ class CiscoVlanCollector:
             if port in self.trunked:
                 if port not in self.vlans:
                     self.vlans[port] = []
-                for i in range(0, len(results[oid])):
-                    if ord(results[oid][i]) == 0:
-                            continue
-                    for j in range(0, 8):
-                        if ord(results[oid][i]) & (1 << j):
-                            self.vlans[port].append(7-j + 8*i + index*1024)
+                self.vlans[port].extend(bitmap(results[oid], index*1024))
     
     def gotNativeVlan(self, results):
         """Callback handling reception of native VLAN for a port
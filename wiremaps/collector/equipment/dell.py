@@ -8,6 +8,7 @@ from wiremaps.collector.helpers.fdb import FdbCollector, QFdbCollector
 from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector, LldpSpeedCollector
 from wiremaps.collector.helpers.vlan import Rfc2674VlanCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class PowerConnect:
     """Collector for Dell Powerconnect"""
@@ -25,13 +26,14 @@ class PowerConnect:
         arp = ArpCollector(equipment, proxy, self.config)
         lldp = LldpCollector(equipment, proxy)
         vlan = Rfc2674VlanCollector(equipment, proxy)
-        d = ports.collectData()
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: fdb1.collectData())
-        d.addCallback(lambda x: fdb2.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("fdb1", fdb1.collectData, ["ports"])
+        s.add("fdb2", fdb2.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports", "lldp"])
+        return s.run(equipment.volatile, equipment.timings)
 
 pc = PowerConnect()
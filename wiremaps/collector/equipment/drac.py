@@ -5,6 +5,7 @@ from twisted.internet import defer
 from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.helpers.port import PortCollector
 from wiremaps.collector.helpers.arp import ArpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class NameCollector:
     """Get real name of DRAC"""
@@ -46,9 +47,10 @@ class DellRAC:
         name = NameCollector(equipment, proxy)
         ports = PortCollector(equipment, proxy)
         arp = ArpCollector(equipment, proxy, self.config)
-        d = name.collectData()
-        d.addCallback(lambda x: ports.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("name", name.collectData)
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        return s.run(equipment.volatile, equipment.timings)
 
 drac = DellRAC()
@@ -10,6 +10,8 @@ from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector
 from wiremaps.collector.helpers.edp import EdpCollector
 from wiremaps.collector.helpers.vlan import IfMibVlanCollector
+from wiremaps.collector.helpers.bitmap import bitmap
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class ExtremeSummit:
     """Collector for Extreme switches and routers"""
@@ -36,13 +38,14 @@ class ExtremeSummit:
         vlan = self.vlanFactory()(equipment, proxy)
         # LLDP disabled due to unstability
         # lldp = LldpCollector(equipment, proxy)
-        d = ports.collectData()
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: edp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        # d.addCallback(lambda x: lldp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("edp", edp.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports"])
+        # s.add("lldp", lldp.collectData, ["ports", "vlan"])
+        return s.run(equipment.volatile, equipment.timings)
 
 class OldExtremeSummit(ExtremeSummit):
     """Collector for old Extreme summit switches"""
@@ -74,13 +77,14 @@ class ExtremeWare:
         edp = EdpCollector(equipment, proxy)
         # LLDP disabled due to unstability
         # lldp = LldpCollector(equipment, proxy)
-        d = ports.collectData()
-        d.addCallback(lambda x: vlan.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: edp.collectData())
-        # d.addCallback(lambda x: lldp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports", "vlan"])
+        s.add("edp", edp.collectData, ["ports"])
+        # s.add("lldp", lldp.collectData, ["ports", "vlan"])
+        return s.run(equipment.volatile, equipment.timings)
 
 class ExtremeVlanCollector:
     """Collect local VLAN for Extreme switchs"""
@@ -114,15 +118,10 @@ class ExtremeVlanCollector:
             vlan = int(oid.split(".")[-2])
             ports = results[oid]
             l = self.vlanPorts.get(vlan, [])
-            for i in range(0, len(ports)):
-                if ord(ports[i]) == 0:
-                    continue
-                for j in range(0, 8):
-                    if ord(ports[i]) & (1 << j):
-                        if self.slots:
-                            l.append(8-j + 8*i + 1000*slot)
-                        else:
-                            l.append(8-j + 8*i)
+            if self.slots:
+                l.extend(bitmap(ports, 1 + 1000*slot))
+            else:
+                l.extend(bitmap(ports, 1))
             self.vlanPorts[vlan] = l
 
         # Add all this to C{self.equipment}
@@ -5,6 +5,8 @@ from twisted.internet import defer
 from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.datastore import Port, Trunk, LocalVlan
 from wiremaps.collector.helpers.arp import ArpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
+from wiremaps.collector.helpers.convert import octets2mac
 
 class F5:
     """Collector for F5.
@@ -47,9 +49,10 @@ class F5:
     def collectData(self, equipment, proxy):
         ports = F5PortCollector(equipment, proxy)
         arp = ArpCollector(equipment, proxy, self.config)
-        d = ports.collectData()
-        d.addCallback(lambda x: arp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        return s.run(equipment.volatile, equipment.timings)
 
 class F5PortCollector:
     """Collect data about ports for F5.
@@ -115,8 +118,7 @@ class F5PortCollector:
                 Port(p,
                      self.data["status"][p] == 0 and 'up' or 'down',
                      mac=(self.data["mac"].get(p, None) and \
-                              ":".join([("%02x" % ord(m))
-                                        for m in self.data["mac"][p]])),
+                              octets2mac(self.data["mac"][p])),
                      speed=self.data["speed"].get(p, None),
                      duplex={0: None,
                              1: 'half',
@@ -8,6 +8,7 @@ from wiremaps.collector.helpers.fdb import FdbCollector, QFdbCollector
 from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector, LldpSpeedCollector
 from wiremaps.collector.helpers.vlan import Rfc2674VlanCollector, IfMibVlanCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Generic:
     """Generic class for equipments not handled by another class.
@@ -40,14 +41,15 @@ class Generic:
                                      normPort=lambda x: self.normport(x, ports))
         vlan2 = IfMibVlanCollector(equipment, proxy,
                                    normPort=lambda x: self.normport(x, ports))
-        d = ports.collectData()
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: fdb2.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: vlan1.collectData())
-        d.addCallback(lambda x: vlan2.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("fdb2", fdb2.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("vlan1", vlan1.collectData, ["ports", "lldp"])
+        s.add("vlan2", vlan2.collectData, ["ports", "vlan1"])
+        return s.run(equipment.volatile, equipment.timings)
 
 generic = Generic()
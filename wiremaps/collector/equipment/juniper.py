@@ -8,6 +8,7 @@ from wiremaps.collector.helpers.port import PortCollector, TrunkCollector
 from wiremaps.collector.helpers.fdb import FdbCollector
 from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector, LldpSpeedCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Juniper:
     """Collector for Juniper devices"""
@@ -51,15 +52,16 @@ class Juniper:
                                   lambda x: self.normport(x, ports, parents, t))
         vlan = JuniperVlanCollector(equipment, proxy,
                                     lambda x: self.normport(x, ports, parents, t))
-        d = trunk.collectData()
-        d.addCallback(lambda x: parents.collectData())
-        d.addCallback(lambda x: ports.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: speed.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("trunk", trunk.collectData)
+        s.add("parents", parents.collectData)
+        s.add("ports", ports.collectData, ["trunk", "parents"])
+        s.add("arp", arp.collectData)
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports", "vlan"])
+        s.add("speed", speed.collectData, ["ports"])
+        return s.run(equipment.volatile, equipment.timings)
 
 juniper = Juniper()
 
@@ -6,6 +6,7 @@ from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.helpers.port import PortCollector
 from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector, LldpSpeedCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Linux:
     """Collector for Linux.
@@ -25,11 +26,12 @@ class Linux:
         arp = ArpCollector(equipment, proxy, self.config)
         lldp = LldpCollector(equipment, proxy)
         speed = LldpSpeedCollector(equipment, proxy)
-        d = ports.collectData()
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: lldp.cleanPorts())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("clean", lldp.cleanPorts, ["lldp", "speed"])
+        return s.run(equipment.volatile, equipment.timings)
 
 linux = Linux()
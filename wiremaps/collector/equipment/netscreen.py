@@ -4,6 +4,7 @@ from twisted.plugin import IPlugin
 from wiremaps.collector.icollector import ICollector
 from wiremaps.collector.helpers.port import PortCollector
 from wiremaps.collector.helpers.arp import ArpCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class NetscreenISG:
     """Collector for Netscreen ISG"""
@@ -19,8 +20,9 @@ class NetscreenISG:
     def collectData(self, equipment, proxy):
         ports = PortCollector(equipment, proxy)
         arp = ArpCollector(equipment, proxy, self.config)
-        d = ports.collectData()
-        d.addCallback(lambda x: arp.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        return s.run(equipment.volatile, equipment.timings)
 
 netscreen = NetscreenISG()
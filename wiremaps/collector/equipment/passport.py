@@ -9,6 +9,7 @@ from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.sonmp import SonmpCollector
 from wiremaps.collector.helpers.nortel import MltCollector, NortelSpeedCollector
 from wiremaps.collector.helpers.vlan import VlanCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class NortelPassport:
     """Collector for ERS8600 Nortel Passport routing switches"""
@@ -29,14 +30,15 @@ class NortelPassport:
         arp = ArpCollector(equipment, proxy, self.config)
         sonmp = SonmpCollector(equipment, proxy, lambda x: x+63)
         vlan = NortelVlanCollector(equipment, proxy, lambda x: x-1)
-        d = ports.collectData()
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: mlt.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: sonmp.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("ports", ports.collectData)
+        s.add("arp", arp.collectData)
+        s.add("mlt", mlt.collectData)
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("sonmp", sonmp.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports"])
+        s.add("fdb", fdb.collectData, ["ports", "mlt"])
+        return s.run(equipment.volatile, equipment.timings)
 
 passport = NortelPassport()
 
@@ -75,7 +77,9 @@ class PassportFdbCollector(CommunityFdbCollector):
                 return self.mlt.mlt[mltid][0]
         return None
 
-    def gotPortIf(self, results):
-        CommunityFdbCollector.gotPortIf(self, results)
+    def gotPortIf(self, results, portif=None):
+        if portif is None:
+            portif = self.portif
+        CommunityFdbCollector.gotPortIf(self, results, portif)
         for i in self.mlt.mltindex:
-            self.portif[i] = i
+            portif[i] = i
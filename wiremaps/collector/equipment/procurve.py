@@ -8,6 +8,7 @@ from wiremaps.collector.helpers.fdb import FdbCollector
 from wiremaps.collector.helpers.arp import ArpCollector
 from wiremaps.collector.helpers.lldp import LldpCollector, LldpSpeedCollector
 from wiremaps.collector.helpers.vlan import Rfc2674VlanCollector
+from wiremaps.collector.helpers.scheduler import HelperScheduler
 
 class Procurve:
     """Collector for HP Procurve switches"""
@@ -36,13 +37,14 @@ class Procurve:
         speed = LldpSpeedCollector(equipment, proxy)
         vlan = Rfc2674VlanCollector(equipment, proxy,
                                     normPort=lambda x: self.normport(x, ports))
-        d = trunk.collectData()
-        d.addCallback(lambda x: ports.collectData())
-        d.addCallback(lambda x: fdb.collectData())
-        d.addCallback(lambda x: arp.collectData())
-        d.addCallback(lambda x: lldp.collectData())
-        d.addCallback(lambda x: speed.collectData())
-        d.addCallback(lambda x: vlan.collectData())
-        return d
+        s = HelperScheduler()
+        s.add("trunk", trunk.collectData)
+        s.add("ports", ports.collectData, ["trunk"])
+        s.add("arp", arp.collectData)
+        s.add("fdb", fdb.collectData, ["ports"])
+        s.add("lldp", lldp.collectData, ["ports"])
+        s.add("speed", speed.collectData, ["ports"])
+        s.add("vlan", vlan.collectData, ["ports", "lldp"])
+        return s.run(equipment.volatile, equipment.timings)
 
 procurve = Procurve()
@@ -1,6 +1,8 @@
 from twisted.python import log
 from twisted.internet import defer, reactor
 
+from wiremaps.collector.helpers.convert import octets2mac, index2ip
+
 class ArpCollector:
     """Collect data using ARP"""
 
@@ -22,15 +24,15 @@ class ArpCollector:
 
         @param results: result of walking C{IP-MIB::ipNetToMediaPhysAddress}
         """
-        for oid in results:
-            ip = ".".join([m for m in oid.split(".")[-4:]])
-            mac = ":".join("%02x" % ord(m) for m in results[oid])
+        for index in results:
+            ip = index2ip(index[-4:])
+            mac = octets2mac(results[index])
             self.equipment.arp[ip] = mac
 
     def collectData(self):
         """Collect data from SNMP using ipNetToMediaPhysAddress.
         """
         print "Collecting ARP for %s" % self.proxy.ip
-        d = self.proxy.walk(self.ipNetToMediaPhysAddress)
+        d = self.proxy.walk(self.ipNetToMediaPhysAddress, indexes=True)
         d.addCallback(self.gotArp)
         return d
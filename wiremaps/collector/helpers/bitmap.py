@@ -0,0 +1,23 @@
+# Decoding of bitmaps, like PortList from Q-BRIDGE-MIB
+
+# Position of bits set in each byte, most significant bit first
+BITS = [tuple([i for i in range(8) if b & (0x80 >> i)])
+        for b in range(256)]
+
+def bitmap(octets, first=0):
+    """Decode a bitmap into the list of positions of bits set.
+
+    The most significant bit of the first octet is the first
+    position, the least significant bit of the first octet is the
+    eighth one.
+
+    @param octets: bitmap as a string
+    @param first: position of the first bit
+    @return: list of positions of bits set, in ascending order
+    """
+    positions = []
+    for i, b in enumerate(bytearray(octets)):
+        if b:
+            offset = first + 8*i
+            positions.extend([offset + j for j in BITS[b]])
+    return positions
@@ -1,5 +1,6 @@
 from wiremaps.collector import exception
 from wiremaps.collector.datastore import Cdp
+from wiremaps.collector.helpers.convert import octets2ip
 
 class CdpCollector:
     """Collect data using CDP"""
@@ -25,9 +26,9 @@ class CdpCollector:
         @param results: result of walking C{CISCO-CDP-MIB::cdpCacheXXXX}
         @param dic: dictionary where to store the result
         """
-        for oid in results:
-            port = int(oid[len(self.cdpCacheDeviceId):].split(".")[1])
-            desc = results[oid]
+        for index in results:
+            port = index[0]
+            desc = results[index]
             if desc and port is not None:
                 dic[port] = desc
 
@@ -37,7 +38,7 @@ class CdpCollector:
             if self.cdpAddressType[port] != 1:
                 ip = "0.0.0.0"
             else:
-                ip = ".".join(str(ord(i)) for i in self.cdpAddress[port])
+                ip = octets2ip(self.cdpAddress[port])
             self.equipment.ports[port].cdp = \
                 Cdp(self.cdpDeviceId[port],
                     self.cdpDevicePort[port],
@@ -52,10 +53,10 @@ class CdpCollector:
         self.cdpPlatform = {}
         self.cdpAddressType = {}
         self.cdpAddress = {}
-        d = self.proxy.walk(self.cdpCacheDeviceId)
+        d = self.proxy.walk(self.cdpCacheDeviceId, indexes=True)
         d.addCallback(self.gotCdp, self.cdpDeviceId)
         for y in ["DevicePort", "Platform", "AddressType", "Address"]:
-            d.addCallback(lambda x,z: self.proxy.walk(getattr(self, "cdpCache%s" % z)), y)
+            d.addCallback(lambda x,z: self.proxy.walk(getattr(self, "cdpCache%s" % z), indexes=True), y)
             d.addCallback(self.gotCdp, getattr(self, "cdp%s" % y))
         d.addCallback(lambda _: self.completeEquipment())
         return d
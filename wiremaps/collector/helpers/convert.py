@@ -0,0 +1,25 @@
+# Conversion of SNMP values and indexes to strings
+
+# Text representation of each byte
+HEX = ["%02x" % b for b in range(256)]
+DEC = [str(b) for b in range(256)]
+
+def octets2mac(octets):
+    """Convert an octet string to a MAC address"""
+    return ":".join([HEX[b] for b in bytearray(octets)])
+
+def index2mac(index):
+    """Convert an index (tuple of integers) to a MAC address"""
+    return ":".join([HEX[b] for b in index])
+
+def octets2ip(octets):
+    """Convert an octet string to an IPv4 address"""
+    return ".".join([DEC[b] for b in bytearray(octets)])
+
+def index2ip(index):
+    """Convert an index (tuple of integers) to an IPv4 address"""
+    return ".".join([DEC[b] for b in index])
+
+def index2string(index):
+    """Convert an index (tuple of integers) to a string"""
+    return "".join([chr(b) for b in index])
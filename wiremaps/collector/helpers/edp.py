@@ -1,5 +1,6 @@
 from wiremaps.collector import exception
 from wiremaps.collector.datastore import Edp, RemoteVlan
+from wiremaps.collector.helpers.convert import index2string
 
 class EdpCollector:
     """Collect data using EDP"""
@@ -26,11 +27,11 @@ class EdpCollector:
         @param results: result of walking C{EXTREME-EDP-MIB::extremeEdpNeighborXXXX}
         @param dic: dictionary where to store the result
         """
-        for oid in results:
-            port = int(oid[len(self.edpNeighborName):].split(".")[1])
+        for index in results:
+            port = index[0]
             if self.normport is not None:
                 port = self.normport(port)
-            desc = results[oid]
+            desc = results[index]
             if desc and port is not None:
                 dic[port] = desc
 
@@ -39,13 +40,11 @@ class EdpCollector:
 
         @param results: result of walking C{EXTREME-EDP-MIB::extremeEdpNeighborVlanId}
         """
-        for oid in results:
-            port = int(oid[len(self.edpNeighborVlanId):].split(".")[1])
+        for index in results:
+            port = index[0]
             if self.normport is not None:
                 port = self.normport(port)
-            vlan = [chr(int(x))
-                    for x in oid[len(self.edpNeighborVlanId):].split(".")[11:]]
-            self.vlan[results[oid], port] = "".join(vlan)
+            self.vlan[results[index], port] = index2string(index[10:])
 
     def completeEquipment(self):
         """Complete C{self.equipment} with data from EDP."""
@@ -67,13 +66,13 @@ class EdpCollector:
         self.edpRemoteSlot = {}
         self.edpRemotePort = {}
         self.vlan = {}
-        d = self.proxy.walk(self.edpNeighborName)
+        d = self.proxy.walk(self.edpNeighborName, indexes=True)
         d.addCallback(self.gotEdp, self.edpSysName)
-        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborSlot))
+        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborSlot, indexes=True))
         d.addCallback(self.gotEdp, self.edpRemoteSlot)
-        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborPort))
+        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborPort, indexes=True))
         d.addCallback(self.gotEdp, self.edpRemotePort)
-        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborVlanId))
+        d.addCallback(lambda x: self.proxy.walk(self.edpNeighborVlanId, indexes=True))
         d.addCallback(self.gotEdpVlan)
         d.addCallback(lambda _: self.completeEquipment())
         return d
@@ -1,5 +1,7 @@
 from twisted.internet import defer
 
+from wiremaps.collector.datastore import mac2int
+
 class FdbCollector:
     """Collect data using FDB"""
 
@@ -20,16 +22,23 @@ class FdbCollector:
         self.config = config
         self.portif = {}
 
-    def gotFdb(self, results):
+    def gotFdb(self, results, portif=None):
         """Callback handling reception of FDB
 
         @param results: result of walking C{BRIDGE-MIB::dot1dTpFdbPort}
+           with indexes
+        @param portif: port<->ifIndex translation to use instead of
+           C{self.portif}
         """
-        for oid in results:
-            mac = ":".join(["%02x" % int(m) for m in oid.split(".")[-6:]])
-            port = int(results[oid])
+        if portif is None:
+            portif = self.portif
+        for index in results:
+            mac = 0
+            for m in index[-6:]:
+                mac = mac << 8 | m
+            port = int(results[index])
             try:
-                port = self.portif[port]
+                port = portif[port]
             except KeyError:
                 continue        # Ignore the port
             if self.normport is not None:
@@ -37,18 +46,23 @@ class FdbCollector:
             if port is not None:
                 self.equipment.ports[port].fdb.append(mac)
 
-    def gotPortIf(self, results):
+    def gotPortIf(self, results, portif=None):
         """Callback handling reception of port<->ifIndex translation from FDB
 
         @param results: result of walking C{BRIDGE-MIB::dot1dBasePortIfIndex}
+           with indexes
+        @param portif: mapping to fill instead of C{self.portif}
         """
-        for oid in results:
-            self.portif[int(oid.split(".")[-1])] = int(results[oid])
+        if portif is None:
+            portif = self.portif
+        for index in results:
+            portif[index[-1]] = int(results[index])
 
     def collectFdbData(self):
-        d = self.proxy.walk(self.dot1dBasePortIfIndex)
+        d = self.proxy.walk(self.dot1dBasePortIfIndex, indexes=True)
         d.addCallback(self.gotPortIf)
-        d.addCallback(lambda x: self.proxy.walk(self.dot1dTpFdbPort))
+        d.addCallback(lambda x: self.proxy.walk(self.dot1dTpFdbPort,
+                                                indexes=True))
         d.addCallback(self.gotFdb)
         return d
 
@@ -72,38 +86,49 @@ class CommunityFdbCollector(FdbCollector):
     called CSI (Community String Indexing):
      U{http://www.cisco.com/en/US/tech/tk648/tk362/technologies_tech_note09186a00801576ff.shtml}
 
-    So, we need to change the community string of the proxy. The
-    resulting string is still valid, so we don't have concurrency
-    problem.
+    So, we need a different community string for each VLAN. The
+    community of the proxy is left untouched: each walk uses its own
+    community. This allows to walk several VLAN concurrently (up to
+    C{vlanfanout}). Each VLAN uses its own port<->ifIndex
+    translation.
     """
 
     def getFdbForVlan(self, community):
-        self.proxy.community = community
-        d = self.proxy.walk(self.dot1dBasePortIfIndex)
-        d.addCallback(self.gotPortIf)
-        d.addCallback(lambda x: self.proxy.walk(self.dot1dTpFdbPort))
+        portif = {}
+        d = self.proxy.walk(self.dot1dBasePortIfIndex, community, True)
+        d.addCallback(self.gotPortIf, portif)
+        d.addCallback(lambda x: self.proxy.walk(self.dot1dTpFdbPort,
+                                                community, True))
+        # Ignore errors while walking, not while handling the results
+        d.addCallbacks(self.gotFdb, lambda x: None,
+                       callbackArgs=(portif,))
         return d
 
+    def gotAllFdb(self, results):
+        for success, result in results:
+            if not success:
+                return result
+        return None
+
     def gotVlans(self, results):
         vlans = []
-        for oid in results:
-            vid = int(oid.split(".")[-1])
+        for index in results:
             # Some VLAN seem special
-            if results[oid] not in self.filterOut:
-                vlans.append(vid)
+            if results[index] not in self.filterOut:
+                vlans.append(index[-1])
         # We ask FDB for each VLAN
         origcommunity = self.proxy.community
-        d = defer.succeed(None)
+        fanout = defer.DeferredSemaphore(self.config.get("vlanfanout", 8))
+        dl = []
         for vlan in vlans:
-            d.addCallback(lambda x,y: self.getFdbForVlan("%s@%d" % (origcommunity,
-                                                                    y)), vlan)
-            d.addCallbacks(self.gotFdb, lambda x: None) # Ignore FDB error
-        # Reset original community when done (errors have been ignored)
-        d.addBoth(lambda x: setattr(self.proxy, "community", origcommunity))
+            dl.append(fanout.run(self.getFdbForVlan,
+                                 "%s@%d" % (origcommunity, vlan)))
+        d = defer.DeferredList(dl, consumeErrors=True)
+        d.addCallback(self.gotAllFdb)
         return d
 
     def collectFdbData(self):
-        d = self.proxy.walk(self.vlanName)
+        d = self.proxy.walk(self.vlanName, indexes=True)
         d.addCallback(self.gotVlans)
         return d
 
@@ -115,6 +140,13 @@ class ExtremeFdbCollector(FdbCollector):
 
     # It is really EXTREME-FDB-MIB::extremeFdbMacFdbMacAddress
     dot1dTpFdbPort = '.1.3.6.1.4.1.1916.1.16.1.1.3'
+    ignored = [mac2int(mac) for mac in [
+            'ff:ff:ff:ff:ff:ff', # Broadcast
+            '01:80:c2:00:00:0e', # LLDP
+            '01:80:c2:00:00:02', # Something like LLDP
+            '00:e0:2b:00:00:02', # Something Extreme
+            '00:e0:2b:00:00:00', # Again, Extreme
+            ]]
 
     def __init__(self, vlan, *args, **kwargs):
         FdbCollector.__init__(self, *args, **kwargs)
@@ -124,17 +156,12 @@ class ExtremeFdbCollector(FdbCollector):
         """Callback handling reception of FDB
 
         @param results: result of walking C{EXTREME-BASE-MIB::extremeFdb}
+           with indexes
         """
-        for oid in results:
-            vlan = int(oid.split(".")[-2])
-            mac = results[oid]
-            mac = ":".join([("%02x" % ord(m)) for m in mac])
-            if mac in ['ff:ff:ff:ff:ff:ff', # Broadcast
-                       '01:80:c2:00:00:0e', # LLDP
-                       '01:80:c2:00:00:02', # Something like LLDP
-                       '00:e0:2b:00:00:02', # Something Extreme
-                       '00:e0:2b:00:00:00', # Again, Extreme
-                       ]: continue
+        for index in results:
+            vlan = index[-2]
+            mac = int(results[index].encode("hex"), 16)
+            if mac in self.ignored: continue
             # Rather bad assumption: a vlan is a set of ports
             for port in self.vlan.vlanPorts.get(vlan, []):
                 if self.normport is not None:
@@ -1,6 +1,7 @@
 from wiremaps.collector import exception
 from wiremaps.collector.datastore import Lldp, LocalVlan, RemoteVlan
 from wiremaps.collector.helpers.speed import SpeedCollector
+from wiremaps.collector.helpers.convert import index2ip, index2string
 
 class LldpCollector:
     """Collect data using LLDP"""
@@ -32,11 +33,11 @@ class LldpCollector:
         @param results: result of walking C{LLDP-MIB::lldpRemXXXX}
         @param dic: dictionary where to store the result
         """
-        for oid in results:
-            port = int(oid.split(".")[-2])
+        for index in results:
+            port = index[-2]
             if self.normport is not None:
                 port = self.normport(port)
-            desc = results[oid]
+            desc = results[index]
             if type(desc) is str:
                 desc = desc.strip()
             if desc and port is not None:
@@ -48,21 +49,21 @@ class LldpCollector:
         @param results: result of walking C{LLDP-MIB::lldpRemManAddrIfId}
         """
         self.lldpMgmtIp = {}
-        for oid in results:
-            oid = oid[len(self.lldpRemManAddrIfId):]
-            if len(oid.split(".")) < 5:
+        for index in results:
+            # Index is time mark, local port, remote index, address
+            # subtype, address length and address
+            if len(index) < 5:
                 # Blade network has the most buggy implementation...
                 continue
-            if oid.split(".")[4] != "1":
+            if index[3] != 1:
                 continue
-            if oid.split(".")[5] == "4":
+            if index[4] == 4:
                 # Nortel is encoding the IP address in its binary form
-                ip = ".".join([m for m in oid.split(".")[-4:]])
+                ip = index2ip(index[-4:])
             else:
                 # While Extreme is using a human readable string
-                oid = "".join([chr(int(m))
-                               for m in oid.split(".")[-int(oid.split(".")[5]):]])
-            port = int(oid.split(".")[2])
+                ip = index2string(index[-index[4]:])
+            port = index[1]
             if self.normport is not None:
                 port = self.normport(port)
             if port is not None:
@@ -73,28 +74,28 @@ class LldpCollector:
 
         @param results: result of walking C{LLDP-EXT-DOT1-MIB::lldpXdot1LocVlanName}
         """
-        for oid in results:
-            vid = int(oid.split(".")[-1])
-            port = int(oid.split(".")[-2])
+        for index in results:
+            vid = index[-1]
+            port = index[-2]
             if self.normport is not None:
                 port = self.normport(port)
             if port is not None:
                 self.equipment.ports[port].vlan.append(
-                    LocalVlan(vid, results[oid]))
+                    LocalVlan(vid, results[index]))
 
     def gotLldpRemoteVlan(self, results):
         """Callback handling reception of LLDP remote vlan
 
         @param results: result of walking C{LLDP-EXT-DOT1-MIB::lldpXdot1RemVlanName}
         """
-        for oid in results:
-            vid = int(oid.split(".")[-1])
-            port = int(oid.split(".")[-3])
+        for index in results:
+            vid = index[-1]
+            port = index[-3]
             if self.normport is not None:
                 port = self.normport(port)
             if port is not None:
                 self.equipment.ports[port].vlan.append(
-                    RemoteVlan(vid, results[oid]))
+                    RemoteVlan(vid, results[index]))
 
     def gotLldpLocPort(self, results):
         """Callback handling reception of LLDP Local Port ID
@@ -105,8 +106,8 @@ class LldpCollector:
         if not results:
             print "LLDP does not seem to be running on %s" % self.equipment.ip
             return
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normport is not None:
                 port = self.normport(port)
             if port is not None:
@@ -117,7 +118,7 @@ class LldpCollector:
 
     def cleanPorts(self):
         """Clean up ports to remove data not present in LLDP"""
-        d = self.proxy.walk(self.lldpLocPortId)
+        d = self.proxy.walk(self.lldpLocPortId, indexes=True)
         d.addCallback(self.gotLldpLocPort)
         return d
 
@@ -135,27 +136,27 @@ class LldpCollector:
     def collectData(self):
         """Collect data from SNMP using LLDP"""
         print "Collecting LLDP for %s" % self.proxy.ip
-        d = self.proxy.walk(self.lldpRemManAddrIfId)
+        d = self.proxy.walk(self.lldpRemManAddrIfId, indexes=True)
         d.addCallback(self.gotLldpMgmtIP)
         self.lldpSysName = {}
         self.lldpSysDesc = {}
         self.lldpPortDesc = {}
         self.lldpPortIdSubtype = {}
         self.lldpPortId = {}
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemSysName))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemSysName, indexes=True))
         d.addCallback(self.gotLldp, self.lldpSysName)
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemSysDesc))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemSysDesc, indexes=True))
         d.addCallback(self.gotLldp, self.lldpSysDesc)
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortIdSubtype))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortIdSubtype, indexes=True))
         d.addCallback(self.gotLldp, self.lldpPortIdSubtype)
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortId))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortId, indexes=True))
         d.addCallback(self.gotLldp, self.lldpPortId)
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortDesc))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemPortDesc, indexes=True))
         d.addCallback(self.gotLldp, self.lldpPortDesc)
         d.addCallback(lambda _: self.completeEquipment())
-        d.addCallback(lambda x: self.proxy.walk(self.lldpRemVlanName))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpRemVlanName, indexes=True))
         d.addCallback(self.gotLldpRemoteVlan)
-        d.addCallback(lambda x: self.proxy.walk(self.lldpLocVlanName))
+        d.addCallback(lambda x: self.proxy.walk(self.lldpLocVlanName, indexes=True))
         d.addCallback(self.gotLldpLocalVlan)
         return d
 
@@ -214,9 +215,9 @@ class LldpSpeedCollector(SpeedCollector):
 
     def gotDuplex(self, results):
         """Got MAU type which contains speed and duplex"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            mau = results[oid]
+        for index in results:
+            port = index[-1]
+            mau = results[index]
             if mau in self.mau and port in self.equipment.ports:
                 self.equipment.ports[port].speed = self.mau[mau][0]
                 if self.mau[mau][1]:
@@ -224,7 +225,7 @@ class LldpSpeedCollector(SpeedCollector):
 
     def gotAutoneg(self, results):
         """Callback handling autoneg"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if port in self.equipment.ports:
-                self.equipment.ports[port].autoneg = bool(results[oid] == 1)
+                self.equipment.ports[port].autoneg = bool(results[index] == 1)
@@ -1,6 +1,7 @@
 from twisted.internet import defer
 
 from wiremaps.collector.helpers.speed import SpeedCollector
+from wiremaps.collector.helpers.bitmap import bitmap
 
 class MltCollector:
     """Collect data using MLT.
@@ -27,46 +28,34 @@ class MltCollector:
 
         @param results: result of walking C{RC-MLT-MIB::rcMltPortMembers}
         """
-        for oid in results:
-            mlt = int(oid.split(".")[-1])
-            ports = results[oid]
-            l = []
-            for i in range(0, len(ports)):
-                if ord(ports[i]) == 0:
-                    continue
-                for j in range(0, 8):
-                    if ord(ports[i]) & (1 << j):
-                        # What port is bit j? See this from RAPID-CITY MIB:
-
-                        # "The string is 88 octets long, for a total
-                        # of 704 bits. Each bit corresponds to a port,
-                        # as represented by its ifIndex value . When a
-                        # bit has the value one(1), the corresponding
-                        # port is a member of the set. When a bit has
-                        # the value zero(0), the corresponding port is
-                        # not a member of the set. The encoding is
-                        # such that the most significant bit of octet
-                        # #1 corresponds to ifIndex 0, while the least
-                        # significant bit of octet #88 corresponds to
-                        # ifIndex 703."
-
-                        l.append(7-j + 8*i)
-            self.mlt[mlt] = l
+        for index in results:
+            mlt = index[-1]
+            # What port is each bit? See this from RAPID-CITY MIB:
+
+            # "The string is 88 octets long, for a total of 704
+            # bits. Each bit corresponds to a port, as represented
+            # by its ifIndex value . When a bit has the value one(1),
+            # the corresponding port is a member of the set. When a
+            # bit has the value zero(0), the corresponding port is
+            # not a member of the set. The encoding is such that the
+            # most significant bit of octet #1 corresponds to ifIndex
+            # 0, while the least significant bit of octet #88
+            # corresponds to ifIndex 703."
+            self.mlt[mlt] = bitmap(results[index], 0)
 
     def gotIfIndex(self, results):
-        for oid in results:
-            mlt = int(oid.split(".")[-1])
-            index = results[oid]
-            self.mltindex[index] = mlt
+        for index in results:
+            mlt = index[-1]
+            self.mltindex[results[index]] = mlt
 
     def collectData(self, write=True):
         """Collect data from SNMP using rcMltPortMembers
         """
     
         print "Collecting MLT for %s" % self.proxy.ip
-        d = self.proxy.walk(self.rcMltPortMembers)
+        d = self.proxy.walk(self.rcMltPortMembers, indexes=True)
         d.addCallback(self.gotMlt)
-        d.addCallback(lambda _: self.proxy.walk(self.rcMltIfIndex))
+        d.addCallback(lambda _: self.proxy.walk(self.rcMltIfIndex, indexes=True))
         d.addCallback(self.gotIfIndex)
         return d
 
@@ -78,22 +67,22 @@ class NortelSpeedCollector(SpeedCollector):
 
     def gotDuplex(self, results):
         """Callback handling duplex"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            if results[oid] == 1:
+        for index in results:
+            port = index[-1]
+            if results[index] == 1:
                 self.duplex[port] = "half"
-            elif results[oid] == 2:
+            elif results[index] == 2:
                 self.duplex[port] = "full"
 
     def gotSpeed(self, results):
         """Callback handling speed"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            if results[oid]:
-                self.speed[port] = results[oid]
+        for index in results:
+            port = index[-1]
+            if results[index]:
+                self.speed[port] = results[index]
 
     def gotAutoneg(self, results):
         """Callback handling autoneg"""
-        for oid in results:
-            port = int(oid.split(".")[-1])
-            self.autoneg[port] = bool(results[oid] == 1)
+        for index in results:
+            port = index[-1]
+            self.autoneg[port] = bool(results[index] == 1)
@@ -1,5 +1,6 @@
 from twisted.internet import defer
 from wiremaps.collector.datastore import Port, Trunk
+from wiremaps.collector.helpers.convert import octets2mac
 
 class PortCollector:
     """Collect data about ports"""
@@ -44,8 +45,8 @@ class PortCollector:
         @param result: result of walking on C{IF-MIB::ifType}
         """
         self.ports = []
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
                 if port is None:
@@ -53,7 +54,7 @@ class PortCollector:
             if self.filter is not None and self.filter(port) is None:
                 continue
             # Ethernet (ethernetCsmacd or some obsolote values) ?
-            if results[oid] in [6,    # ethernetCsmacd
+            if results[index] in [6,    # ethernetCsmacd
                                 62,   # fastEther
                                 69,   # fastEtherFX
                                 117,  # gigabitEthernet
@@ -66,13 +67,13 @@ class PortCollector:
         @param result: result of walking on C{IF-MIB::ifDescr}
         """
         self.portNames = {}
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            descr = str(results[oid]).strip()
+            descr = str(results[index]).strip()
             if self.normName is not None:
                 descr = self.normName(descr).strip()
             self.portNames[port] = descr
@@ -83,13 +84,13 @@ class PortCollector:
         @param result: result of walking on C{IF-MIB::ifName}
         """
         self.portAliases = {}
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            name = str(results[oid]).strip()
+            name = str(results[index]).strip()
             if name:
                 self.portAliases[port] = name
 
@@ -99,15 +100,15 @@ class PortCollector:
         @param result: result of walking on C{IF-MIB::ifPhysAddress}
         """
         self.portAddress = {}
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            address = [ "%x" % ord(a) for a in str(results[oid])]
-            if address and len(address) == 6:
-                self.portAddress[port] = ":".join(address)
+            address = str(results[index])
+            if len(address) == 6:
+                self.portAddress[port] = octets2mac(address)
 
     def gotOperStatus(self, results):
         """Callback handling retrieving of interface status.
@@ -115,13 +116,13 @@ class PortCollector:
         @param result: result of walking C{IF-MIB::ifOperStatus}
         """
         self.portStatus = {}
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            if results[oid] == 1:
+            if results[index] == 1:
                 self.portStatus[port] = 'up'
             else:
                 self.portStatus[port] = 'down'
@@ -132,13 +133,13 @@ class PortCollector:
         @param result: result of walking C{IF-MIB::ifSpeed}
         """
         self.speed = {}
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            s = results[oid]
+            s = results[index]
             if s == 2**32 - 1:
                 # Overflow, let's say that it is 10G
                 s = 10000
@@ -152,13 +153,13 @@ class PortCollector:
 
         @param result: result of walking C{IF-MIB::ifHighSpeed}
         """
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if self.normPort is not None:
                 port = self.normPort(port)
             if port not in self.ports:
                 continue
-            s = results[oid]
+            s = results[index]
             if s:
                 self.speed[port] = s
 
@@ -190,19 +191,19 @@ class PortCollector:
         - Using IF-MIB::ifOperStatus for port status
         """
         print "Collecting port information for %s" % self.proxy.ip
-        d = self.proxy.walk(self.ifType)
+        d = self.proxy.walk(self.ifType, indexes=True)
         d.addCallback(self.gotIfTypes)
-        d.addCallback(lambda x: self.proxy.walk(getattr(self,self.descrs)))
+        d.addCallback(lambda x: self.proxy.walk(getattr(self,self.descrs), indexes=True))
         d.addCallback(self.gotIfDescrs)
-        d.addCallback(lambda x: self.proxy.walk(getattr(self,self.names)))
+        d.addCallback(lambda x: self.proxy.walk(getattr(self,self.names), indexes=True))
         d.addCallback(self.gotIfNames)
-        d.addCallback(lambda x: self.proxy.walk(self.ifOperStatus))
+        d.addCallback(lambda x: self.proxy.walk(self.ifOperStatus, indexes=True))
         d.addCallback(self.gotOperStatus)
-        d.addCallback(lambda x: self.proxy.walk(self.ifPhysAddress))
+        d.addCallback(lambda x: self.proxy.walk(self.ifPhysAddress, indexes=True))
         d.addCallback(self.gotPhysAddress)
-        d.addCallback(lambda x: self.proxy.walk(self.ifSpeed))
+        d.addCallback(lambda x: self.proxy.walk(self.ifSpeed, indexes=True))
         d.addCallback(self.gotSpeed)
-        d.addCallback(lambda x: self.proxy.walk(self.ifHighSpeed))
+        d.addCallback(lambda x: self.proxy.walk(self.ifHighSpeed, indexes=True))
         d.addCallback(self.gotHighSpeed)
         d.addCallback(lambda _: self.completeEquipment())
         return d
@@ -227,9 +228,9 @@ class TrunkCollector:
 
         @param results: C{IF-MIB::ifType}
         """
-        for oid in results:
-            if results[oid] == 54 or results[oid] == 161:
-                port = int(oid.split(".")[-1])
+        for index in results:
+            if results[index] == 54 or results[index] == 161:
+                port = index[-1]
                 self.trunk[port] = []
 
     def gotStatus(self, results):
@@ -237,9 +238,9 @@ class TrunkCollector:
 
         @param results: C{IF-MIB::ifStackStatus}
         """
-        for oid in results:
-            physport = int(oid.split(".")[-1])
-            trunkport = int(oid.split(".")[-2])
+        for index in results:
+            physport = index[-1]
+            trunkport = index[-2]
             if physport == 0: continue
             if trunkport in self.trunk:
                 self.trunk[trunkport].append(physport)
@@ -253,9 +254,9 @@ class TrunkCollector:
     def collectData(self):
         """Collect link aggregation information"""
         print "Collecting trunk information for %s" % self.proxy.ip
-        d = self.proxy.walk(self.ifType)
+        d = self.proxy.walk(self.ifType, indexes=True)
         d.addCallback(self.gotType)
-        d.addCallback(lambda x: self.proxy.walk(self.ifStackStatus))
+        d.addCallback(lambda x: self.proxy.walk(self.ifStackStatus, indexes=True))
         d.addCallback(self.gotStatus)
         return d
 
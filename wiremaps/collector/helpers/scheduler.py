@@ -0,0 +1,111 @@
+import time
+
+from twisted.internet import defer
+
+class HelperScheduler:
+    """Run collector helpers, concurrently when possible.
+
+    Each helper is registered with the name of the helpers it
+    requires. A helper is started as soon as all its requirements are
+    done. Helpers without any pending requirement run concurrently on
+    the same proxy (the proxy limits the number of walks in flight).
+
+    If a helper fails, no other helper is started. Once running
+    helpers are done, the first failure is returned.
+
+    When only volatile information is wanted, only the helpers
+    listed in C{volatile} and the helpers they require are run.
+    """
+
+    volatile = ["arp", "fdb", "fdb1", "fdb2"]
+
+    def __init__(self):
+        self.helpers = {}
+        self.order = []
+
+    def add(self, name, collect, requires=[]):
+        """Register a new helper.
+
+        @param name: name of the helper
+        @param collect: function to call to run the helper, should
+           return a deferred
+        @param requires: list of helpers that should be run before
+           this one; they should have been registered already
+        """
+        for r in requires:
+            if r not in self.helpers:
+                raise ValueError("%s requires unknown helper %s" % (name, r))
+        self.helpers[name] = (collect, requires)
+        self.order.append(name)
+
+    def run(self, volatile=False, timings=None):
+        """Run registered helpers.
+
+        @param volatile: if C{True}, only run helpers collecting
+           volatile information
+        @param timings: if not C{None}, mapping to fill with the time
+           spent in each helper
+        @return: a deferred firing when all helpers are done
+        """
+        self.timings = timings
+        self.done = []
+        self.running = []
+        self.failure = None
+        self.wanted = None
+        if volatile:
+            self.wanted = []
+            todo = [name for name in self.volatile if name in self.helpers]
+            while todo:
+                name = todo.pop()
+                if name not in self.wanted:
+                    self.wanted.append(name)
+                    todo.extend(self.helpers[name][1])
+        self.defer = defer.Deferred()
+        self.schedule()
+        return self.defer
+
+    def schedule(self):
+        """Start helpers whose requirements are met."""
+        if self.defer is None:
+            return
+        if self.failure is None:
+            for name in self.order:
+                # A helper failing synchronously calls us back: stop
+                # starting helpers once a failure happened or once the
+                # result has been delivered
+                if self.failure is not None or self.defer is None:
+                    break
+                if name in self.done or name in self.running:
+                    continue
+                if self.wanted is not None and name not in self.wanted:
+                    continue
+                if [r for r in self.helpers[name][1] if r not in self.done]:
+                    continue
+                self.running.append(name)
+                d = defer.maybeDeferred(self.helpers[name][0])
+                d.addCallbacks(self.helperDone, self.helperFailed,
+                               callbackArgs=(name, time.time()),
+                               errbackArgs=(name, time.time()))
+        if not self.running and self.defer is not None:
+            d, self.defer = self.defer, None
+            if self.failure is not None:
+                d.errback(self.failure)
+            else:
+                d.callback(None)
+
+    def timed(self, name, start):
+        if self.timings is not None:
+            self.timings[name] = time.time() - start
+
+    def helperDone(self, ignored, name, start):
+        self.timed(name, start)
+        self.running.remove(name)
+        self.done.append(name)
+        self.schedule()
+
+    def helperFailed(self, failure, name, start):
+        self.timed(name, start)
+        self.running.remove(name)
+        if self.failure is None:
+            self.failure = failure
+        self.schedule()
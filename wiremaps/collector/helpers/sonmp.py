@@ -1,4 +1,5 @@
 from wiremaps.collector.datastore import Sonmp
+from wiremaps.collector.helpers.convert import index2ip
 
 class SonmpCollector:
     """Collect data using SONMP"""
@@ -20,15 +21,15 @@ class SonmpCollector:
 
         @param results: result of walking C{S5-ETH-MULTISEG-TOPOLOGY-MIB::s5EnMsTopNmmSegId}
         """
-        for oid in results:
-            ip = ".".join([m for m in oid.split(".")[-5:-1]])
-            segid = int(oid.split(".")[-1])
+        for index in results:
+            ip = index2ip(index[-5:-1])
+            segid = index[-1]
             if segid > 0x10000:
                 # Don't want to handle this case
                 continue
             if segid > 0x100:
                 segid = segid / 256 * 64 + segid % 256 - 64
-            port = int(oid.split(".")[-6]) + (int(oid.split(".")[-7]) - 1)*64
+            port = index[-6] + (index[-7] - 1)*64
             if self.normport:
                 port = self.normport(port)
             if port is not None and port > 0:
@@ -37,6 +38,6 @@ class SonmpCollector:
     def collectData(self):
         """Collect data from SNMP using s5EnMsTopNmmSegId"""
         print "Collecting SONMP for %s" % self.proxy.ip
-        d = self.proxy.walk(self.s5EnMsTopNmmSegId)
+        d = self.proxy.walk(self.s5EnMsTopNmmSegId, indexes=True)
         d.addCallback(self.gotSonmp)
         return d
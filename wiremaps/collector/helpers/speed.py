@@ -34,13 +34,13 @@ class SpeedCollector:
         self.speed = {}
         self.duplex = {}
         self.autoneg = {}
-        d = self.proxy.walk(self.oidDuplex)
+        d = self.proxy.walk(self.oidDuplex, indexes=True)
         d.addCallback(self.gotDuplex)
         if hasattr(self, "oidSpeed"):
             # Sometimes, speed comes with duplex
-            d.addCallback(lambda x: self.proxy.walk(self.oidSpeed))
+            d.addCallback(lambda x: self.proxy.walk(self.oidSpeed, indexes=True))
             d.addCallback(self.gotSpeed)
-        d.addCallback(lambda x: self.proxy.walk(self.oidAutoneg))
+        d.addCallback(lambda x: self.proxy.walk(self.oidAutoneg, indexes=True))
         d.addCallback(self.gotAutoneg)
         d.addCallback(lambda _: self.completeEquipment())
         return d
@@ -1,4 +1,5 @@
 from wiremaps.collector.datastore import LocalVlan
+from wiremaps.collector.helpers.bitmap import bitmap
 
 class VlanCollector:
     """Collect VLAN information.
@@ -22,34 +23,29 @@ class VlanCollector:
         @param results: vlan names or ports
         @param dic: where to store the results
         """
-        for oid in results:
-            vid = int(oid.split(".")[-1])
-            dic[vid] = results[oid]
+        for index in results:
+            vid = index[-1]
+            dic[vid] = results[index]
 
     def completeEquipment(self):
         """Complete C{self.equipment} with collected data"""
         for vid in self.vlanNames:
             if vid in self.vlanPorts:
-                for i in range(0, len(self.vlanPorts[vid])):
-                    if ord(self.vlanPorts[vid][i]) == 0:
-                        continue
-                    for j in range(0, 8):
-                        if ord(self.vlanPorts[vid][i]) & (1 << j):
-                            port = 8-j + 8*i
-                            if self.normPort is not None:
-                                port = self.normPort(port)
-                            if port is not None:
-                                self.equipment.ports[port].vlan.append(
-                                    LocalVlan(vid, self.vlanNames[vid] or "VLAN %d" % vid))
+                vlan = LocalVlan(vid, self.vlanNames[vid] or "VLAN %d" % vid)
+                for port in bitmap(self.vlanPorts[vid], 1):
+                    if self.normPort is not None:
+                        port = self.normPort(port)
+                    if port is not None:
+                        self.equipment.ports[port].vlan.append(vlan)
 
     def collectData(self):
         """Collect VLAN data from SNMP"""
         print "Collecting VLAN information for %s" % self.proxy.ip
         self.vlanNames = {}
         self.vlanPorts = {}
-        d = self.proxy.walk(self.oidVlanNames)
+        d = self.proxy.walk(self.oidVlanNames, indexes=True)
         d.addCallback(self.gotVlan, self.vlanNames)
-        d.addCallback(lambda x: self.proxy.walk(self.oidVlanPorts))
+        d.addCallback(lambda x: self.proxy.walk(self.oidVlanPorts, indexes=True))
         d.addCallback(self.gotVlan, self.vlanPorts)
         d.addCallback(lambda _: self.completeEquipment())
         return d
@@ -89,19 +85,19 @@ class IfMibVlanCollector:
 
         @param results: walking C{IF-MIB::ifType}
         """
-        for oid in results:
-            if results[oid] == 135:
-                self.vlans[int(oid.split(".")[-1])] = []
+        for index in results:
+            if results[index] == 135:
+                self.vlans[index[-1]] = []
 
     def gotIfDescr(self, results):
         """Callback handling reception of interface descriptions
 
         @param results: walking C{IF-MIB::ifDescr}
         """
-        for oid in results:
-            port = int(oid.split(".")[-1])
+        for index in results:
+            port = index[-1]
             if port in self.vlans:
-                tag = results[oid].split(" ")[-1]
+                tag = results[index].split(" ")[-1]
                 try:
                     self.vids[port] = int(tag)
                 except ValueError:
@@ -112,11 +108,11 @@ class IfMibVlanCollector:
 
         @param results: walking C{IF-MIB::ifStackStatus}
         """
-        for oid in results:
-            physport = int(oid.split(".")[-1])
+        for index in results:
+            physport = index[-1]
             if physport == 0:
                 continue
-            vlanport = int(oid.split(".")[-2])
+            vlanport = index[-2]
             if vlanport in self.vlans:
                 self.vlans[vlanport].append(physport)
 
@@ -137,11 +133,11 @@ class IfMibVlanCollector:
         print "Collecting VLAN information for %s" % self.proxy.ip
         self.vids = {}
         self.vlans = {}
-        d = self.proxy.walk(self.ifType)
+        d = self.proxy.walk(self.ifType, indexes=True)
         d.addCallback(self.gotIfType)
-        d.addCallback(lambda x: self.proxy.walk(self.ifDescr))
+        d.addCallback(lambda x: self.proxy.walk(self.ifDescr, indexes=True))
         d.addCallback(self.gotIfDescr)
-        d.addCallback(lambda x: self.proxy.walk(self.ifStackStatus))
+        d.addCallback(lambda x: self.proxy.walk(self.ifStackStatus, indexes=True))
         d.addCallback(self.gotIfStackStatus)
         d.addCallback(lambda _: self.completeEquipment())
         return d
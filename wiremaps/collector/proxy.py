@@ -1,89 +1,139 @@
+import time
+
 import snmp
 from snmp import AgentProxy as original_AgentProxy
 from twisted.internet import defer
 
-def translateOid(oid):
-    return [int(x) for x in oid.split(".") if x]
+from wiremaps.collector.replay import Fixture, fixtureKey
 
 class AgentProxy(original_AgentProxy):
-    """Act like AgentProxy but handles walking itself"""
+    """Act like AgentProxy but limits and tunes walks"""
 
     use_getbulk = True
+    max_walks = 4               # Maximum number of walks in flight
+    max_repetitions = 50        # Upper bound for GETBULK max-repetitions
+    repetitions = {}            # Learned max-repetitions for each IP
+    record = None               # Directory where answers are recorded
+
+    def __init__(self, *args, **kwargs):
+        original_AgentProxy.__init__(self, *args, **kwargs)
+        self.walks = defer.DeferredSemaphore(self.max_walks)
+        self.maxrepetitions, self.ceiling = self.repetitions.get(self.ip,
+                                                                 (10, None))
+        self.retries_bulk = 0   # Number of GETBULK sent again
+        self.walkstats = {}     # OID -> [walks, duration, rows]
+        self.fixture = None
+        if self.record is not None:
+            self.fixture = Fixture(self.ip, self.community, self.version)
 
-    def getbulk(self, oid, *args):
-        if self.use_getbulk and self.version == 2:
-            return original_AgentProxy.getbulk(self, oid, *args)
-        d = self.getnext(oid)
-        d.addErrback(lambda x: x.trap(snmp.SNMPEndOfMibView,
-                                      snmp.SNMPNoSuchName) and {})
+    def recording(self, d, operation, args, kwargs):
+        """Record the answer to a request when recording is enabled."""
+        if self.fixture is not None:
+            d.addBoth(self.fixture.record,
+                      fixtureKey(operation, args, kwargs))
         return d
 
-    def walk(self, oid):
+    def save(self):
+        """Save recorded answers in C{record} directory."""
+        if self.fixture is not None:
+            self.fixture.save(self.record)
+
+    def get(self, *args, **kwargs):
+        return self.recording(original_AgentProxy.get(self, *args, **kwargs),
+                              "get", args, kwargs)
+
+    def getnext(self, *args, **kwargs):
+        return self.recording(original_AgentProxy.getnext(self,
+                                                          *args, **kwargs),
+                              "getnext", args, kwargs)
+
+    def usesBulk(self):
+        return self.use_getbulk and self.version == 2
+
+    def getbulk(self, oid, *args, **kwargs):
+        key = ((oid,) + args, kwargs.copy())
+        if self.usesBulk():
+            d = original_AgentProxy.getbulk(self, oid, *args, **kwargs)
+        else:
+            kwargs.pop("maxrepetitions", None)
+            kwargs.pop("norepeaters", None)
+            d = original_AgentProxy.getnext(self, oid, **kwargs)
+            d.addErrback(lambda x: x.trap(snmp.SNMPEndOfMibView,
+                                          snmp.SNMPNoSuchName) and {})
+        return self.recording(d, "getbulk", *key)
+
+    def setRepetitions(self, repetitions):
+        self.maxrepetitions = max(1, min(repetitions, self.max_repetitions))
+        self.repetitions[self.ip] = (self.maxrepetitions, self.ceiling)
+
+    def bulkSucceeded(self, asked, received):
+        """Adapt max-repetitions after a successful GETBULK.
+
+        @param asked: max-repetitions used for the request
+        @param received: number of varbinds received in the table
+        """
+        if received < asked:
+            # The agent has truncated its answer to fit in a PDU
+            self.setRepetitions(received)
+        elif asked >= self.maxrepetitions:
+            repetitions = asked*2
+            if self.ceiling is not None:
+                repetitions = min(repetitions, self.ceiling - 1)
+            self.setRepetitions(max(repetitions, self.maxrepetitions))
+
+    def bulkFailed(self, asked, toobig):
+        """Adapt max-repetitions after a tooBig error or a timeout.
+
+        A walk only reports a timeout if the agent already answered
+        during this walk and only once per walk. Therefore, a dead
+        agent does not wait for additional timeouts.
+
+        @param asked: max-repetitions used for the failed request
+        @param toobig: C{True} if the agent answered with a tooBig error
+        @return: C{True} if the request should be retried
+        """
+        if asked <= 1:
+            return False
+        if toobig and (self.ceiling is None or asked < self.ceiling):
+            # Never try this size again
+            self.ceiling = asked
+        self.setRepetitions(min(self.maxrepetitions, asked/2))
+        self.retries_bulk += 1
+        return True
+
+    def walk(self, oid, community=None, indexes=False):
         """Real walking.
         
-        Return the list of oid retrieved
+        Return the list of oid retrieved. Only C{max_walks} walks
+        are run at the same time, the others are queued.
+
+        @param community: if not C{None}, use this community instead
+           of the one of the proxy for this walk only
+        @param indexes: if C{True}, the keys of the returned
+           dictionary are tuples with the index of each entry
+           (the OID without C{oid}) instead of the full OID
         """
-        return Walker(self, oid)()
-        
-class Walker(object):
-    """SNMP walker class"""
-
-    def __init__(self, proxy, baseoid):
-        self.baseoid = baseoid
-        self.lastoid = baseoid
-        self.proxy = proxy
-        self.results = {}
-        self.defer = defer.Deferred()
-
-    def __call__(self):
-        d = self.proxy.getbulk(self.baseoid)
-        d.addErrback(lambda x: x.trap(snmp.SNMPEndOfMibView,
-                                      snmp.SNMPNoSuchName) and {})
-        d.addCallback(self.getMore)
-        d.addErrback(self.fireError)
-        return self.defer
-
-    def getMore(self, x):
-        stop = False
-        lastoid = None
-        dups = 0
-        for o in x:
-            if o in self.results:
-                # Loop?
-                dups = dups + 1
-                continue
-            if translateOid(o)[:len(translateOid(self.baseoid))] != \
-                    translateOid(self.baseoid):
-                # End of table
-                stop = True
-                continue
-            self.results[o] = x[o]
-            # Buggy implementation may have a not increasing OID. We
-            # consider only the biggest OID from the set of returned
-            # OID to be the one that we should use. This means if the
-            # order is incorrect, we may end up querying the same OID
-            # several time, but this will converge.
-            if lastoid is None:
-                lastoid = o
-            elif translateOid(lastoid) < translateOid(o):
-                lastoid = o
-        if dups == len(x):
-            # We get only duplicates, stop here
-            stop = True
-        if stop:
-            self.defer.callback(self.results)
-            self.defer = None
-            return
-        self.lastoid = lastoid
-        d = self.proxy.getbulk(self.lastoid)
-        d.addErrback(lambda x: x.trap(snmp.SNMPEndOfMibView,
-                                      snmp.SNMPNoSuchName) and {})
-        d.addCallback(self.getMore)
-        d.addErrback(self.fireError)
-        return None
-
-    def fireError(self, error):
-        self.defer.errback(error)
-        self.defer = None
+        kwargs = {'bulk': self.usesBulk(),
+                  'indexes': indexes}
+        if community is not None:
+            kwargs['community'] = community
+        d = self.walks.run(self.timedWalk, oid, kwargs)
+        kwargs = kwargs.copy()
+        del kwargs['bulk']
+        return self.recording(d, "walk", (oid,), kwargs)
 
-        
+    def timedWalk(self, oid, kwargs):
+        """Walk and record time spent and number of rows in C{walkstats}."""
+        start = time.time()
+        d = original_AgentProxy.walk(self, oid,
+                                     maxrepetitions=self.maxrepetitions,
+                                     **kwargs)
+        d.addCallback(self.walked, oid, start)
+        return d
+
+    def walked(self, results, oid, start):
+        stats = self.walkstats.setdefault(oid, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += time.time() - start
+        stats[2] += len(results)
+        return results
@@ -0,0 +1,175 @@
+import os
+import zlib
+import random
+import cPickle
+
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+import snmp
+
+def fixtureKey(operation, args, kwargs):
+    """Build the key used to store an answer in a fixture.
+
+    @param operation: name of the SNMP operation (get, walk, ...)
+    @param args: positional arguments of the operation
+    @param kwargs: keyword arguments of the operation
+    @return: hashable key
+    """
+    def freeze(arg):
+        if type(arg) in [list, tuple]:
+            return tuple(arg)
+        return arg
+    return (operation,
+            tuple([freeze(arg) for arg in args]),
+            tuple(sorted([(k, freeze(v)) for k, v in kwargs.items()])))
+
+class Fixture:
+    """Answers of an equipment to SNMP requests.
+
+    Answers are kept in a mapping whose keys are built with
+    L{fixtureKey}. Errors are kept as the name of the exception and
+    its arguments. A fixture is stored in a compressed pickle named
+    after the IP of the equipment.
+    """
+
+    timeout = (False, ("SNMPException", ("Timeout",)))
+
+    def __init__(self, ip, community, version):
+        self.ip = ip
+        self.community = community
+        self.version = version
+        self.answers = {}
+
+    def record(self, result, key):
+        """Record the result of a request and return it unchanged."""
+        if isinstance(result, Failure):
+            self.answers[key] = (False, (result.type.__name__,
+                                         result.value.args))
+        else:
+            self.answers[key] = (True, result)
+        return result
+
+    def answer(self, key):
+        """Return the recorded answer for a request.
+
+        An unknown request is handled like a request without
+        answer.
+        """
+        if key not in self.answers:
+            raise snmp.SNMPException("Timeout")
+        success, result = self.answers[key]
+        if success:
+            return result
+        name, args = result
+        raise getattr(snmp, name, snmp.SNMPException)(*args)
+
+    def save(self, directory):
+        """Save the fixture in a directory.
+
+        Answers are merged into the fixture already saved for the
+        equipment, so that a volatile exploration does not drop the
+        answers of a complete one. A request without answer does not
+        replace a previous answer. The saved fixture is replaced if
+        it was recorded with another community or version.
+
+        @param directory: directory where fixtures are stored
+        """
+        answers = self.answers
+        previous = self.load(directory, self.ip)
+        if previous is not None and \
+                (previous.community, previous.version) == (self.community,
+                                                           self.version):
+            answers = previous.answers
+            for key, answer in self.answers.items():
+                if key in answers and answer == self.timeout:
+                    continue
+                answers[key] = answer
+        data = zlib.compress(cPickle.dumps((self.community, self.version,
+                                            answers),
+                                           cPickle.HIGHEST_PROTOCOL))
+        path = os.path.join(directory, self.ip)
+        with open("%s.tmp" % path, "wb") as output:
+            output.write(data)
+        os.rename("%s.tmp" % path, path)
+
+    def load(cls, directory, ip):
+        """Load the fixture of an equipment.
+
+        @return: the fixture or C{None} if there is none
+        """
+        try:
+            with open(os.path.join(directory, ip), "rb") as input:
+                data = input.read()
+        except IOError:
+            return None
+        fixture = cls(ip, None, None)
+        fixture.community, fixture.version, fixture.answers = \
+            cPickle.loads(zlib.decompress(data))
+        return fixture
+    load = classmethod(load)
+
+class ReplayAgentProxy:
+    """Act like AgentProxy but answer from a recorded fixture.
+
+    Each answer is delayed by C{latency} seconds and C{loss} is the
+    probability for an answer to be lost, in which case the request
+    fails like a request without answer after C{timeout}
+    milliseconds. A proxy created with another community or version
+    than the recorded one never gets any answer. Plugins switching
+    the version of a proxy which answered keep their answers.
+    """
+
+    latency = 0
+    loss = 0
+
+    def __init__(self, fixture, ip, community, version):
+        self.fixture = fixture
+        self.ip = ip
+        self.community = community
+        self.version = version
+        self.retries = 3
+        self.timeout = 1000
+        self.requests = 0
+        self.timeouts = 0
+        self.retries_bulk = 0
+        self.walkstats = {}
+        self.answering = fixture is not None and \
+            (community, version) == (fixture.community, fixture.version)
+
+    def answer(self, operation, args, kwargs):
+        self.requests += 1
+        d = defer.Deferred()
+        if not self.answering or random.random() < self.loss:
+            self.timeouts += 1
+            reactor.callLater(self.timeout/1000.*(self.retries + 1),
+                              d.errback, snmp.SNMPException("Timeout"))
+            return d
+        try:
+            result = self.fixture.answer(fixtureKey(operation, args, kwargs))
+        except snmp.SNMPException, e:
+            reactor.callLater(self.latency, d.errback, e)
+        else:
+            reactor.callLater(self.latency, d.callback, result)
+        return d
+
+    def get(self, *args, **kwargs):
+        return self.answer("get", args, kwargs)
+
+    def getnext(self, *args, **kwargs):
+        return self.answer("getnext", args, kwargs)
+
+    def getbulk(self, *args, **kwargs):
+        return self.answer("getbulk", args, kwargs)
+
+    def walk(self, oid, community=None, indexes=False):
+        kwargs = {'indexes': indexes}
+        if community is not None:
+            kwargs['community'] = community
+        return self.answer("walk", (oid,), kwargs)
+
+    def save(self):
+        pass
+
+    def close(self):
+        pass
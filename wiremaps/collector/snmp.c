@@ -16,8 +16,11 @@
  */
 
 #include <Python.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
 #include <net-snmp/net-snmp-config.h>
 #include <net-snmp/net-snmp-includes.h>
+#include <net-snmp/library/snmpUDPDomain.h>
 
 /* Exceptions */
 struct ErrorException {
@@ -54,133 +57,158 @@ static struct ErrorException SnmpErrorToException[] = {
 static PyObject *DeferModule;
 static PyObject *FailureModule;
 static PyObject *reactor;
-static PyObject *SnmpFds;
 static PyObject *timeoutId;
 static PyObject *timeoutFunction;
 
+/* Granularity of retransmissions and timeouts, in seconds */
+#define SNMP_TICK 0.1
+
 /* Types */
+
+/* Shared sockets. Once enabled with share(), new sessions send their
+ * requests through one of them instead of opening their own socket.
+ * Answers are dispatched to the right session with the request ID.
+ * net-snmp checks the version of an answer against the receiving
+ * session: there is one set of shared sockets for each version, the
+ * first SnmpSharedCount ones for SNMPv2c, the next ones for SNMPv1. */
 typedef struct {
+	void *sessp;
+	struct snmp_session *ss;
+	PyObject *reader;
+} SnmpSharedSocket;
+static SnmpSharedSocket *SnmpShared = NULL;
+static int SnmpSharedCount = 0, SnmpSharedNext = 0;
+
+typedef struct _SnmpObject {
 	PyObject_HEAD
+	void *sessp;		/* Single session handle, if not shared */
 	struct snmp_session *ss;
 	PyObject *defers;
+	PyObject *retried;	/* Request ID -> retries, if shared */
+	PyObject *reader;	/* Reader registered in the reactor */
+	SnmpSharedSocket *shared; /* Shared socket to use */
+	struct sockaddr_in peer; /* Address of the agent, if shared */
+	struct _SnmpObject *prev, *next; /* List of active sessions */
+	int active;
+	int closed;		/* No more requests can be sent */
+	unsigned long requests;	/* Number of requests sent */
+	unsigned long timeouts;	/* Number of requests without answer */
 } SnmpObject;
 
 typedef struct {
 	PyObject_HEAD
 	int fd;
+	void *sessp;
+	SnmpObject *session;	/* Borrowed, cleared when session is freed */
 } SnmpReaderObject;
 static PyTypeObject SnmpReaderType;
 
+/* Each session registers its own socket into the reactor. Sessions
+ * with pending requests are linked together. A single timer runs while
+ * this list is not empty to handle retransmissions and timeouts. */
+static SnmpObject *SnmpActive = NULL;
+
 static int
-Snmp_updatereactor(void)
+Snmp_schedule(void)
 {
-	int maxfd = 0, block = 0, fd, result, i;
-	PyObject *keys, *key, *tmp;
-	SnmpReaderObject *reader;
-	fd_set fdset;
-	struct timeval timeout;
-	double to;
-
-	FD_ZERO(&fdset);
-	block = 1;		/* This means we don't have a timeout
-				   planned. block will be reset to 0
-				   if we need to setup a timeout. */
-	snmp_select_info(&maxfd, &fdset, &timeout, &block);
-	for (fd = 0; fd < maxfd; fd++) {
-		if (FD_ISSET(fd, &fdset)) {
-			result = PyDict_Contains(SnmpFds, PyInt_FromLong(fd));
-			if (result == -1)
-				return -1;
-			if (!result) {
-				/* Add this fd to the reactor */
-				if ((reader = (SnmpReaderObject *)
-					PyObject_CallObject((PyObject *)&SnmpReaderType,
-					    NULL)) == NULL)
-					return -1;
-				reader->fd = fd;
-				if ((key =
-					PyInt_FromLong(fd)) == NULL) {
-					Py_DECREF(reader);
-					return -1;
-				}
-				if (PyDict_SetItem(SnmpFds, key, (PyObject*)reader) != 0) {
-					Py_DECREF(reader);
-					Py_DECREF(key);
-					return -1;
-				}
-				Py_DECREF(key);
-				if ((tmp = PyObject_CallMethod(reactor,
-					    "addReader", "O", (PyObject*)reader)) ==
-				    NULL) {
-					Py_DECREF(reader);
-					return -1;
-				}
-				Py_DECREF(tmp);
-				Py_DECREF(reader);
-			}
-		}
-	}
-	if ((keys = PyDict_Keys(SnmpFds)) == NULL)
+	if (timeoutId || !SnmpActive)
+		return 0;
+	if ((timeoutId = PyObject_CallMethod(reactor, "callLater", "dO",
+		    SNMP_TICK, timeoutFunction)) == NULL)
 		return -1;
-	for (i = 0; i < PyList_Size(keys); i++) {
-		if ((key = PyList_GetItem(keys, i)) == NULL) {
-			Py_DECREF(keys);
-			return -1;
-		}
-		fd = PyInt_AsLong(key);
-		if (PyErr_Occurred()) {
-			Py_DECREF(keys);
-			return -1;
-		}
-		if ((fd >= maxfd) || (!FD_ISSET(fd, &fdset))) {
-			/* Delete this fd from the reactor */
-			if ((reader = (SnmpReaderObject*)PyDict_GetItem(SnmpFds,
-				    key)) == NULL) {
-				Py_DECREF(keys);
-				return -1;
-			}
-			if ((tmp = PyObject_CallMethod(reactor,
-				    "removeReader", "O", (PyObject*)reader)) == NULL) {
-				Py_DECREF(keys);
-				return -1;
-			}
-			Py_DECREF(tmp);
-			if (PyDict_DelItem(SnmpFds, key) == -1) {
-				Py_DECREF(keys);
-				return -1;
-			}
-		}
+	return 0;
+}
+
+static int
+Snmp_activate(SnmpObject *self)
+{
+	if (!self->active) {
+		self->prev = NULL;
+		self->next = SnmpActive;
+		if (SnmpActive)
+			SnmpActive->prev = self;
+		SnmpActive = self;
+		self->active = 1;
 	}
-	Py_DECREF(keys);
-	/* Setup timeout */
-	if (timeoutId) {
-		if ((tmp = PyObject_CallMethod(timeoutId, "cancel", NULL)) == NULL) {
-			/* Don't really know what to do. It seems better to
-			 * raise an exception at this point. */
-			Py_CLEAR(timeoutId);
-			return -1;
-		}
-		Py_DECREF(tmp);
-		Py_CLEAR(timeoutId);
+	return Snmp_schedule();
+}
+
+static void
+Snmp_deactivate(SnmpObject *self)
+{
+	if (!self->active)
+		return;
+	if (self->prev)
+		self->prev->next = self->next;
+	else
+		SnmpActive = self->next;
+	if (self->next)
+		self->next->prev = self->prev;
+	self->prev = self->next = NULL;
+	self->active = 0;
+}
+
+static PyObject*
+Snmp_newreader(void *sessp, SnmpObject *session)
+{
+	netsnmp_transport *transport;
+	SnmpReaderObject *reader;
+	PyObject *tmp;
+
+	if ((transport = snmp_sess_transport(sessp)) == NULL) {
+		PyErr_SetString(SnmpException, "no transport for this session");
+		return NULL;
 	}
-	if (!block) {
-		to = (double)timeout.tv_sec +
-		    (double)timeout.tv_usec/(double)1000000;
-		if ((timeoutId = PyObject_CallMethod(reactor, "callLater", "dO",
-			    to, timeoutFunction)) == NULL) {
-			return -1;
-		}
+	if ((reader = (SnmpReaderObject *)
+		PyObject_CallObject((PyObject *)&SnmpReaderType, NULL)) == NULL)
+		return NULL;
+	reader->fd = transport->sock;
+	reader->sessp = sessp;
+	reader->session = session;
+	if ((tmp = PyObject_CallMethod(reactor,
+		    "addReader", "O", (PyObject*)reader)) == NULL) {
+		reader->sessp = NULL;
+		reader->session = NULL;
+		Py_DECREF(reader);
+		return NULL;
 	}
-	return 0;
+	Py_DECREF(tmp);
+	return (PyObject *)reader;
+}
+
+static void
+Snmp_removereader(PyObject *reader)
+{
+	PyObject *tmp;
+
+	((SnmpReaderObject *)reader)->sessp = NULL;
+	((SnmpReaderObject *)reader)->session = NULL;
+	if ((tmp = PyObject_CallMethod(reactor,
+		    "removeReader", "O", reader)) == NULL)
+		PyErr_Clear();
+	else
+		Py_DECREF(tmp);
+	Py_DECREF(reader);
 }
 
 static void
 Snmp_dealloc(SnmpObject* self)
 {
-	if (self->ss)
-		snmp_close(self->ss);
-	Snmp_updatereactor();
+	Snmp_deactivate(self);
+	if (self->reader) {
+		Snmp_removereader(self->reader);
+		self->reader = NULL;
+	}
+	if (self->sessp)
+		snmp_sess_close(self->sessp);
+	else if (self->ss) {
+		/* Settings of a session using a shared socket */
+		free(self->ss->community);
+		free(self->ss->peername);
+		free(self->ss);
+	}
 	Py_XDECREF(self->defers);
+	Py_XDECREF(self->retried);
 	self->ob_type->tp_free((PyObject*)self);
 }
 
@@ -191,8 +219,16 @@ Snmp_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 
 	self = (SnmpObject *)type->tp_alloc(type, 0);
 	if (self != NULL) {
+		self->sessp = NULL;
 		self->ss = NULL;
 		self->defers = NULL;
+		self->retried = NULL;
+		self->reader = NULL;
+		self->shared = NULL;
+		self->prev = self->next = NULL;
+		self->active = 0;
+		self->closed = 0;
+		self->requests = self->timeouts = 0;
 	}
 	return (PyObject *)self;
 }
@@ -207,6 +243,48 @@ Snmp_raise_error(struct snmp_session *session)
 	free(err);
 }
 
+static void
+Snmp_raise_sesserror(void *sessp)
+{
+	int liberr, snmperr;
+	char *err;
+	snmp_sess_error(sessp, &liberr, &snmperr, &err);
+	PyErr_Format(SnmpException, "%s", err);
+	free(err);
+}
+
+/* Parse "a.b.c.d" or "a.b.c.d:port" as an IPv4 address. Any other
+ * peer (hostname, transport specifier, IPv6) cannot use a shared
+ * socket and -1 is returned. */
+static int
+Snmp_parsepeer(const char *host, struct sockaddr_in *peer)
+{
+	char ip[INET_ADDRSTRLEN];
+	const char *colon;
+	char *end;
+	long port = 161;
+	size_t len;
+
+	memset(peer, 0, sizeof(struct sockaddr_in));
+	if ((colon = strchr(host, ':')) != NULL) {
+		port = strtol(colon + 1, &end, 10);
+		if (end == colon + 1 || *end != '\0' ||
+		    port <= 0 || port > 65535)
+			return -1;
+		len = colon - host;
+	} else
+		len = strlen(host);
+	if (len >= sizeof(ip))
+		return -1;
+	memcpy(ip, host, len);
+	ip[len] = '\0';
+	if (inet_pton(AF_INET, ip, &peer->sin_addr) != 1)
+		return -1;
+	peer->sin_family = AF_INET;
+	peer->sin_port = htons(port);
+	return 0;
+}
+
 static int
 Snmp_init(SnmpObject *self, PyObject *args, PyObject *kwds)
 {
@@ -249,18 +327,34 @@ Snmp_init(SnmpObject *self, PyObject *args, PyObject *kwds)
 		PyErr_NoMemory();
 		return -1;
 	}
-	if ((self->ss = snmp_open(&session)) == NULL) {
-		Snmp_raise_error(&session);
-		free(session.community);
-		free(session.peername);
-		return -1;
+	if (SnmpSharedCount && Snmp_parsepeer(chost, &self->peer) == 0) {
+		/* Use a shared socket, the session only keeps settings */
+		self->shared = &SnmpShared[SnmpSharedNext++ % SnmpSharedCount +
+		    ((session.version == SNMP_VERSION_1)?SnmpSharedCount:0)];
+		if ((self->ss = malloc(sizeof(struct snmp_session))) == NULL) {
+			free(session.community);
+			free(session.peername);
+			PyErr_NoMemory();
+			return -1;
+		}
+		memcpy(self->ss, &session, sizeof(struct snmp_session));
+		if ((self->retried = PyDict_New()) == NULL)
+			return -1;
+	} else {
+		if ((self->sessp = snmp_sess_open(&session)) == NULL) {
+			Snmp_raise_error(&session);
+			free(session.community);
+			free(session.peername);
+			return -1;
+		}
+		self->ss = snmp_sess_session(self->sessp);
+		if ((self->reader = Snmp_newreader(self->sessp, self)) == NULL)
+			return -1;
 	}
 	if (retries >= 0) self->ss->retries = retries;
 	if (timeout >= 0) self->ss->timeout = timeout / 1000;
 	if ((self->defers = PyDict_New()) == NULL)
 		return -1;
-	if (Snmp_updatereactor() == -1)
-		return -1;
 	return 0;
 }
 
@@ -296,54 +390,42 @@ reprerror:
 }
 
 static PyObject*
-Snmp_oid2string(PyObject *resultvalue)
+Snmp_oid2string(oid *name, size_t len)
 {
-	PyObject *dot, *tmp, *tmp2, *list;
-	int i;
-	if ((list = PyTuple_New(PyTuple_Size(resultvalue))) == NULL)
-		return NULL;
-	for (i = 0; i < PyTuple_Size(resultvalue); i++) {
-		if ((tmp = PyTuple_GetItem(resultvalue, i)) == NULL) {
-			Py_DECREF(list);
-			return NULL;
-		}
-		if ((tmp2 = PyObject_Str(tmp)) == NULL) {
-			Py_DECREF(list);
-			return NULL;
+	char buffer[MAX_OID_LEN * 21 + 1];
+	size_t i, pos = 0;
+
+	for (i = 0; i < len && pos < sizeof(buffer); i++)
+		pos += snprintf(buffer + pos, sizeof(buffer) - pos,
+		    ".%lu", (unsigned long)name[i]);
+	if (pos > sizeof(buffer) - 1)
+		pos = sizeof(buffer) - 1;
+	return PyString_FromStringAndSize(buffer, pos);
+}
+
+static int
+Snmp_parseoid(char *aoid, oid *poid, size_t *len)
+{
+	char *next;
+
+	*len = 0;
+	while (aoid && (*aoid != '\0')) {
+		if (aoid[0] == '.')
+			aoid++;
+		if (*len >= MAX_OID_LEN) {
+			PyErr_SetString(PyExc_ValueError,
+			    "OID is too large");
+			return -1;
 		}
-		PyTuple_SetItem(list, i, tmp2);
-		if (PyErr_Occurred()) {
-			Py_DECREF(tmp2);
-			Py_DECREF(list);
-			return NULL;
+		poid[(*len)++] = strtoull(aoid, &next, 10);
+		if (aoid == next) {
+			PyErr_Format(PyExc_TypeError,
+			    "not a valid OID: %s", aoid);
+			return -1;
 		}
+		aoid = next;
 	}
-	Py_DECREF(resultvalue);
-	resultvalue = list;
-	if ((dot = PyString_FromString(".")) == NULL)
-		return NULL;
-	if ((tmp = PyObject_CallMethod(dot,
-		    "join", "(O)", resultvalue)) == NULL) {
-		Py_DECREF(dot);
-		return NULL;
-	}
-	Py_DECREF(resultvalue);
-	Py_DECREF(dot);
-	resultvalue = tmp;
-	if ((tmp = PyTuple_Pack(1, resultvalue)) == NULL)
-		return NULL;
-	Py_DECREF(resultvalue);
-	resultvalue = tmp;
-	if ((tmp2 = PyString_FromString(".%s")) == NULL)
-		return NULL;
-	if ((tmp = PyString_Format(tmp2,
-		    resultvalue)) == NULL) {
-		Py_DECREF(tmp2);
-		return NULL;
-	}
-	Py_DECREF(tmp2);
-	Py_DECREF(resultvalue);
-	return tmp;
+	return 0;
 }
 
 static void
@@ -371,16 +453,148 @@ Snmp_invokeerrback(PyObject *defer)
 	Py_XDECREF(traceback);
 }
 
+static int
+Snmp_seterror(int operation, netsnmp_pdu *response)
+{
+	struct ErrorException *e;
+
+	if (operation != NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE) {
+		PyErr_SetString(SnmpException, "Timeout");
+		return -1;
+	}
+	if (response->errstat == SNMP_ERR_NOERROR)
+		return 0;
+	for (e = SnmpErrorToException; e->name; e++) {
+		if (e->error == response->errstat) {
+			PyErr_SetString(e->exception, snmp_errstring(e->error));
+			return -1;
+		}
+	}
+	PyErr_Format(SnmpException, "unknown error %ld", response->errstat);
+	return -1;
+}
+
+static PyObject*
+Snmp_value(struct variable_list *vars)
+{
+	long long counter64;
+
+	switch (vars->type) {
+	case SNMP_NOSUCHOBJECT:
+		PyErr_SetString(SnmpNoSuchObject, "No such object was found");
+		return NULL;
+	case SNMP_NOSUCHINSTANCE:
+		PyErr_SetString(SnmpNoSuchInstance, "No such instance exists");
+		return NULL;
+	case ASN_INTEGER:
+		return PyLong_FromLong(*vars->val.integer);
+	case ASN_UINTEGER:
+	case ASN_TIMETICKS:
+	case ASN_GAUGE:
+	case ASN_COUNTER:
+		return PyLong_FromUnsignedLong(
+			(unsigned long)*vars->val.integer);
+	case ASN_OCTET_STR:
+		return PyString_FromStringAndSize(
+			(char*)vars->val.string, vars->val_len);
+	case ASN_BIT_STR:
+		return PyString_FromStringAndSize(
+			(char*)vars->val.bitstring, vars->val_len);
+	case ASN_OBJECT_ID:
+		return Snmp_oid2string(vars->val.objid,
+		    vars->val_len/sizeof(oid));
+	case ASN_IPADDRESS:
+		if (vars->val_len < 4) {
+			PyErr_Format(SnmpException, "IP address is too short (%zd < 4)",
+			    vars->val_len);
+			return NULL;
+		}
+		return PyString_FromFormat("%d.%d.%d.%d",
+		    vars->val.string[0],
+		    vars->val.string[1],
+		    vars->val.string[2],
+		    vars->val.string[3]);
+	case ASN_COUNTER64:
+#ifdef NETSNMP_WITH_OPAQUE_SPECIAL_TYPES
+	case ASN_OPAQUE_U64:
+	case ASN_OPAQUE_I64:
+	case ASN_OPAQUE_COUNTER64:
+#endif                          /* NETSNMP_WITH_OPAQUE_SPECIAL_TYPES */
+		counter64 = ((unsigned long long)(vars->val.counter64->high) << 32) +
+		    (unsigned long long)(vars->val.counter64->low);
+		return PyLong_FromUnsignedLongLong(counter64);
+#ifdef NETSNMP_WITH_OPAQUE_SPECIAL_TYPES
+	case ASN_OPAQUE_FLOAT:
+		return PyFloat_FromDouble(*vars->val.floatVal);
+	case ASN_OPAQUE_DOUBLE:
+		return PyFloat_FromDouble(*vars->val.doubleVal);
+#endif                          /* NETSNMP_WITH_OPAQUE_SPECIAL_TYPES */
+	}
+	PyErr_Format(SnmpException, "unknown type returned (%d)",
+	    vars->type);
+	return NULL;
+}
+
+static void Snmp_walkhandle(SnmpObject *, PyObject *, int, netsnmp_pdu *);
+static int Snmp_handle(int, netsnmp_session *, int, netsnmp_pdu *, void *);
+
+/* Shared sessions do not retry: the number of retries is read from
+ * the session when a request times out and each proxy using the
+ * shared session may have its own. Instead, a request without answer
+ * is sent again here, up to the number of retries of the proxy.
+ * Return 1 if the request has been sent again. */
+static int
+Snmp_resend(SnmpObject *self, PyObject *key, PyObject *defer,
+    netsnmp_pdu *pdu)
+{
+	PyObject *tmp, *newkey = NULL, *attempts = NULL;
+	netsnmp_pdu *copy;
+	long retried = 0;
+	int reqid;
+
+	if (self->closed)
+		return 0;
+	if ((tmp = PyDict_GetItem(self->retried, key)) != NULL)
+		retried = PyInt_AsLong(tmp);
+	if (retried >= self->ss->retries)
+		return 0;
+	if ((copy = snmp_clone_pdu(pdu)) == NULL)
+		return 0;
+	self->shared->ss->timeout = self->ss->timeout;
+	if ((reqid = snmp_sess_async_send(self->shared->sessp, copy,
+		    Snmp_handle, self)) == 0) {
+		snmp_free_pdu(copy);
+		return 0;
+	}
+	/* The request ID is usually kept, but we don't rely on it */
+	if ((newkey = PyInt_FromLong(reqid)) == NULL ||
+	    (attempts = PyInt_FromLong(retried + 1)) == NULL)
+		goto resenderror;
+	if (PyDict_DelItem(self->defers, key) != 0)
+		PyErr_Clear();
+	if (PyDict_SetItem(self->defers, newkey, defer) != 0 ||
+	    PyDict_SetItem(self->retried, newkey, attempts) != 0)
+		goto resenderror;
+	Py_DECREF(newkey);
+	Py_DECREF(attempts);
+	return 1;
+
+resenderror:
+	/* The request is on its way but we won't be able to match
+	 * the answer: the deferred is fired by the caller */
+	PyErr_Clear();
+	Py_XDECREF(newkey);
+	Py_XDECREF(attempts);
+	return 0;
+}
+
 static int
 Snmp_handle(int operation, netsnmp_session *session, int reqid,
     netsnmp_pdu *response, void *magic)
 {
 	PyObject *key, *defer, *results = NULL, *resultvalue = NULL,
 	    *resultoid = NULL, *tmp;
-	struct ErrorException *e;
 	struct variable_list *vars;
-	int i;
-	long long counter64;
 	SnmpObject *self;
 
 	if ((key = PyInt_FromLong(reqid)) == NULL)
@@ -389,122 +603,48 @@ Snmp_handle(int operation, netsnmp_session *session, int reqid,
 	self = (SnmpObject *)magic;
 	if ((defer = PyDict_GetItem(self->defers, key)) == NULL)
 		return 1;
+	if (operation == NETSNMP_CALLBACK_OP_TIMED_OUT && self->shared &&
+	    Snmp_resend(self, key, defer, response)) {
+		Py_DECREF(key);
+		return 1;
+	}
+	if (operation != NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE)
+		self->timeouts++;
 	Py_INCREF(defer);
 	PyDict_DelItem(self->defers, key);
+	if (self->retried && PyDict_DelItem(self->retried, key) != 0)
+		PyErr_Clear();
 	Py_DECREF(key);
+	if (PyCapsule_CheckExact(defer)) {
+		/* This request is part of a walk */
+		Snmp_walkhandle(self, defer, operation, response);
+		Py_DECREF(defer);
+		Py_DECREF(self);
+		return 1;
+	}
 	/* We have our deferred object. We will be able to trigger callbacks and
 	 * errbacks */
-	if (operation == NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE) {
-		if (response->errstat != SNMP_ERR_NOERROR) {
-			for (e = SnmpErrorToException; e->name; e++) {
-				if (e->error == response->errstat) {
-					PyErr_SetString(e->exception, snmp_errstring(e->error));
-					goto fireexception;
-				}
-			}
-			PyErr_Format(SnmpException, "unknown error %ld", response->errstat);
-			goto fireexception;
-		}
-	} else {
-		PyErr_SetString(SnmpException, "Timeout");
+	if (Snmp_seterror(operation, response) == -1)
 		goto fireexception;
-	}
 	if ((results = PyDict_New()) == NULL)
 		goto fireexception;
 	for (vars = response->variables; vars;
 	     vars = vars->next_variable) {
-	/* Let's handle the value */
-		switch (vars->type) {
-		case SNMP_NOSUCHOBJECT:
-			PyErr_SetString(SnmpNoSuchObject, "No such object was found");
-			goto fireexception;
-		case SNMP_NOSUCHINSTANCE:
-			PyErr_SetString(SnmpNoSuchInstance, "No such instance exists");
-			goto fireexception;
-		case SNMP_ENDOFMIBVIEW:
+		/* Let's handle the value */
+		if (vars->type == SNMP_ENDOFMIBVIEW) {
 			if (PyDict_Size(results) == 0) {
 				PyErr_SetString(SnmpEndOfMibView,
 				    "End of MIB was reached");
 				goto fireexception;
 			} else
 				continue;
-		case ASN_INTEGER:
-			resultvalue = PyLong_FromLong(*vars->val.integer);
-			break;
-		case ASN_UINTEGER:
-		case ASN_TIMETICKS:
-		case ASN_GAUGE:
-		case ASN_COUNTER:
-			resultvalue = PyLong_FromUnsignedLong(
-				(unsigned long)*vars->val.integer);
-			break;
-		case ASN_OCTET_STR:
-			resultvalue = PyString_FromStringAndSize(
-				(char*)vars->val.string, vars->val_len);
-			break;
-		case ASN_BIT_STR:
-			resultvalue = PyString_FromStringAndSize(
-				(char*)vars->val.bitstring, vars->val_len);
-			break;
-		case ASN_OBJECT_ID:
-			if ((resultvalue = PyTuple_New(
-					vars->val_len/sizeof(oid))) == NULL)
-				goto fireexception;
-			for (i = 0; i < vars->val_len/sizeof(oid); i++) {
-				if ((tmp = PyLong_FromLong(
-						vars->val.objid[i])) == NULL)
-					goto fireexception;
-				PyTuple_SetItem(resultvalue, i, tmp);
-			}
-			if ((resultvalue = Snmp_oid2string(resultvalue)) == NULL)
-				goto fireexception;
-			break;
-		case ASN_IPADDRESS:
-			if (vars->val_len < 4) {
-				PyErr_Format(SnmpException, "IP address is too short (%zd < 4)",
-				    vars->val_len);
-				goto fireexception;
-			}
-			resultvalue = PyString_FromFormat("%d.%d.%d.%d",
-			    vars->val.string[0],
-			    vars->val.string[1],
-			    vars->val.string[2],
-			    vars->val.string[3]);
-			break;
-		case ASN_COUNTER64:
-#ifdef NETSNMP_WITH_OPAQUE_SPECIAL_TYPES
-		case ASN_OPAQUE_U64:
-		case ASN_OPAQUE_I64:
-		case ASN_OPAQUE_COUNTER64:
-#endif                          /* NETSNMP_WITH_OPAQUE_SPECIAL_TYPES */
-			counter64 = ((unsigned long long)(vars->val.counter64->high) << 32) +
-			    (unsigned long long)(vars->val.counter64->low);
-			resultvalue = PyLong_FromUnsignedLongLong(counter64);
-			break;
-#ifdef NETSNMP_WITH_OPAQUE_SPECIAL_TYPES
-		case ASN_OPAQUE_FLOAT:
-			resultvalue = PyFloat_FromDouble(*vars->val.floatVal);
-			break;
-		case ASN_OPAQUE_DOUBLE:
-			resultvalue = PyFloat_FromDouble(*vars->val.doubleVal);
-			break;
-#endif                          /* NETSNMP_WITH_OPAQUE_SPECIAL_TYPES */
-		default:
-			PyErr_Format(SnmpException, "unknown type returned (%d)",
-			    vars->type);
-			goto fireexception;
 		}
-		if (resultvalue == NULL) goto fireexception;
+		if ((resultvalue = Snmp_value(vars)) == NULL)
+			goto fireexception;
 
 		/* And now, the OID */
-		if ((resultoid = PyTuple_New(vars->name_length)) == NULL)
-			goto fireexception;
-		for (i = 0; i < vars->name_length; i++) {
-			if ((tmp = PyLong_FromLong(vars->name[i])) == NULL)
-				goto fireexception;
-			PyTuple_SetItem(resultoid, i, tmp);
-		}
-		if ((resultoid = Snmp_oid2string(resultoid)) == NULL)
+		if ((resultoid = Snmp_oid2string(vars->name,
+			    vars->name_length)) == NULL)
 			goto fireexception;
 
 		/* Put into dictionary */
@@ -531,23 +671,85 @@ fireexception:
 	return 1;
 }
 
+/* Send a PDU, return the request ID or 0 on error. The PDU is not
+ * freed on error. */
+static int
+Snmp_send(SnmpObject *self, struct snmp_pdu *pdu)
+{
+	netsnmp_indexed_addr_pair *to;
+	int reqid;
+
+	if (self->closed) {
+		PyErr_SetString(SnmpException, "session is closed");
+		return 0;
+	}
+	if (!self->shared) {
+		if ((reqid = snmp_sess_async_send(self->sessp, pdu,
+			    Snmp_handle, self)) == 0)
+			Snmp_raise_sesserror(self->sessp);
+		else
+			self->requests++;
+		return reqid;
+	}
+
+	/* The PDU should carry everything the shared session does not
+	 * know about: version, community and destination. */
+	pdu->version = self->ss->version;
+	if (!pdu->community) {
+		if ((pdu->community = (u_char*)malloc(
+			    self->ss->community_len + 1)) == NULL) {
+			PyErr_NoMemory();
+			return 0;
+		}
+		memcpy(pdu->community, self->ss->community,
+		    self->ss->community_len + 1);
+		pdu->community_len = self->ss->community_len;
+	}
+	/* The UDP transport expects an address pair, an empty local
+	 * address lets the kernel choose. */
+	if ((to = calloc(1, sizeof(netsnmp_indexed_addr_pair))) == NULL) {
+		PyErr_NoMemory();
+		return 0;
+	}
+	memcpy(&to->remote_addr.sin, &self->peer, sizeof(struct sockaddr_in));
+	free(pdu->transport_data);
+	pdu->transport_data = to;
+	pdu->transport_data_length = sizeof(netsnmp_indexed_addr_pair);
+	/* The timeout of a request is computed when it is sent.
+	 * Retries are handled in Snmp_handle(). */
+	self->shared->ss->timeout = self->ss->timeout;
+	if ((reqid = snmp_sess_async_send(self->shared->sessp, pdu,
+		    Snmp_handle, self)) == 0)
+		Snmp_raise_sesserror(self->shared->sessp);
+	else
+		self->requests++;
+	return reqid;
+}
+
 static PyObject*
-Snmp_op(SnmpObject *self, PyObject *args, int op)
+Snmp_op(SnmpObject *self, PyObject *args, PyObject *kwds, int op)
 {
 	PyObject *roid, *oids, *item, *deferred = NULL, *req = NULL;
-	char *aoid, *next;
+	char *community = NULL;
 	oid poid[MAX_OID_LEN];
 	struct snmp_pdu *pdu=NULL;
 	int maxrepetitions = 10, norepeaters = 0;
-	int i, oidlen, reqid;
-	size_t arglen;
+	int i, reqid;
+	size_t arglen, oidlen;
+	int communitylen = 0;
+
+	static char *kwlist[] = {"oids", "community", NULL};
+	static char *kwlistbulk[] = {"oids", "maxrepetitions", "norepeaters",
+				     "community", NULL};
 
 	if (op == SNMP_MSG_GETBULK) {
-		if (!PyArg_ParseTuple(args, "O|ii",
-			&roid, &maxrepetitions, &norepeaters))
+		if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|iiz#", kwlistbulk,
+			&roid, &maxrepetitions, &norepeaters,
+			&community, &communitylen))
 			return NULL;
 	} else {
-		if (!PyArg_ParseTuple(args, "O", &roid))
+		if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|z#", kwlist,
+			&roid, &community, &communitylen))
 			return NULL;
 	}
 
@@ -575,6 +777,16 @@ Snmp_op(SnmpObject *self, PyObject *args, int op)
 		pdu->max_repetitions = maxrepetitions;
 		pdu->non_repeaters = norepeaters;
 	}
+	if (community) {
+		/* Override session community for this request only. The
+		 * community will be freed with the PDU. */
+		if ((pdu->community = (u_char*)malloc(communitylen + 1)) == NULL) {
+			PyErr_NoMemory();
+			goto operror;
+		}
+		memcpy(pdu->community, community, communitylen + 1);
+		pdu->community_len = communitylen;
+	}
 	for (i = 0; i < arglen; i++) {
 		if ((item = PyTuple_GetItem(oids, i)) == NULL)
 			goto operror;
@@ -583,33 +795,14 @@ Snmp_op(SnmpObject *self, PyObject *args, int op)
 			    "element %d should be a string", i);
 			goto operror;
 		}
-		aoid = PyString_AsString(item);
-		oidlen = 0;
-		while (aoid && (*aoid != '\0')) {
-			if (aoid[0] == '.')
-				aoid++;
-			if (oidlen >= MAX_OID_LEN) {
-				PyErr_Format(PyExc_ValueError,
-				    "element %d is too large for OID", i);
-				goto operror;
-			}
-			poid[oidlen++] = strtoull(aoid, &next, 10);
-			if (aoid == next) {
-				PyErr_Format(PyExc_TypeError,
-				    "element %d is not a valid OID: %s", i, aoid);
-				goto operror;
-			}
-			aoid = next;
-		}
+		if (Snmp_parseoid(PyString_AsString(item), poid, &oidlen) == -1)
+			goto operror;
 		snmp_add_null_var(pdu, poid, oidlen);
 	}
-	self->ss->callback = Snmp_handle;
-	self->ss->callback_magic = self;
 	if ((deferred = PyObject_CallMethod(DeferModule,
 		    "Deferred", NULL)) == NULL)
 		goto operror;
-	if (!snmp_send(self->ss, pdu)) {
-		Snmp_raise_error(self->ss);
+	if ((reqid = Snmp_send(self, pdu)) == 0) {
 		/* Instead of raising, we will fire errback */
 		Snmp_invokeerrback(deferred);
 		Py_DECREF(self);
@@ -617,11 +810,10 @@ Snmp_op(SnmpObject *self, PyObject *args, int op)
 		snmp_free_pdu(pdu);
 		return deferred;
 	}
-	reqid = pdu->reqid;
 	pdu = NULL;		/* Avoid to free it when future errors occurs */
 
 	/* We create a Deferred object and put it in a dictionary using
-	 * pdu->reqid to be able to call its callbacks later. */
+	 * the request ID to be able to call its callbacks later. */
 	if ((req = PyInt_FromLong(reqid)) == NULL)
 		goto operror;
 	if (PyDict_SetItem(self->defers, req, deferred) != 0) {
@@ -629,7 +821,7 @@ Snmp_op(SnmpObject *self, PyObject *args, int op)
 		goto operror;
 	}
 	Py_DECREF(req);
-	if (Snmp_updatereactor() == -1)
+	if (Snmp_activate(self) == -1)
 		goto operror;
 	Py_DECREF(oids);
 	return deferred;
@@ -642,22 +834,404 @@ operror:
 	return NULL;
 }
 
+/* Walks are handled entirely here: OID are kept as arrays of integers and
+ * the deferred is only fired once with the whole table. While a request
+ * of the walk is in flight, its state is stored in the dictionary of
+ * deferreds inside a capsule. */
+#define SNMP_WALK_CAPSULE "snmp.walk"
+struct SnmpWalk {
+	PyObject *defer;	/* Deferred fired at the end of the walk */
+	PyObject *results;	/* Results of the walk */
+	oid base[MAX_OID_LEN];	/* OID to walk */
+	size_t baselen;
+	oid last[MAX_OID_LEN];	/* Next OID to query */
+	size_t lastlen;
+	int maxrepetitions;
+	int bulk;		/* Use GETBULK instead of GETNEXT */
+	int indexes;		/* Use index tuples as keys */
+	int answered;		/* The agent answered during this walk */
+	int timeoutretry;	/* A timeout already triggered a retry */
+	char *community;	/* Community to use instead of the session one */
+	int communitylen;
+};
+
+static void
+Snmp_walkfree(PyObject *capsule)
+{
+	struct SnmpWalk *walk;
+
+	if ((walk = PyCapsule_GetPointer(capsule, SNMP_WALK_CAPSULE)) == NULL)
+		return;
+	Py_XDECREF(walk->defer);
+	Py_XDECREF(walk->results);
+	free(walk->community);
+	free(walk);
+}
+
+static int
+Snmp_walksend(SnmpObject *self, PyObject *capsule)
+{
+	struct SnmpWalk *walk;
+	struct snmp_pdu *pdu;
+	PyObject *req;
+	int reqid;
+
+	if ((walk = PyCapsule_GetPointer(capsule, SNMP_WALK_CAPSULE)) == NULL)
+		return -1;
+	if (walk->bulk) {
+		pdu = snmp_pdu_create(SNMP_MSG_GETBULK);
+		pdu->max_repetitions = walk->maxrepetitions;
+		pdu->non_repeaters = 0;
+	} else
+		pdu = snmp_pdu_create(SNMP_MSG_GETNEXT);
+	if (walk->community) {
+		if ((pdu->community = (u_char*)malloc(walk->communitylen + 1)) == NULL) {
+			snmp_free_pdu(pdu);
+			PyErr_NoMemory();
+			return -1;
+		}
+		memcpy(pdu->community, walk->community, walk->communitylen + 1);
+		pdu->community_len = walk->communitylen;
+	}
+	snmp_add_null_var(pdu, walk->last, walk->lastlen);
+	if ((reqid = Snmp_send(self, pdu)) == 0) {
+		snmp_free_pdu(pdu);
+		return -1;
+	}
+	if ((req = PyInt_FromLong(reqid)) == NULL)
+		return -1;
+	if (PyDict_SetItem(self->defers, req, capsule) != 0) {
+		Py_DECREF(req);
+		return -1;
+	}
+	Py_DECREF(req);
+	Py_INCREF(self);	/* Released in Snmp_handle */
+	return Snmp_activate(self);
+}
+
+/* The proxy may adapt max-repetitions with bulkSucceeded() and
+ * bulkFailed() methods. The new value is then read from its
+ * maxrepetitions attribute. */
+static int
+Snmp_walkrepetitions(SnmpObject *self, struct SnmpWalk *walk)
+{
+	PyObject *tmp;
+	long repetitions;
+
+	if ((tmp = PyObject_GetAttrString((PyObject*)self,
+		    "maxrepetitions")) == NULL) {
+		PyErr_Clear();
+		return 0;
+	}
+	repetitions = PyInt_AsLong(tmp);
+	Py_DECREF(tmp);
+	if (repetitions == -1 && PyErr_Occurred())
+		return -1;
+	if (repetitions >= 1)
+		walk->maxrepetitions = repetitions;
+	return 0;
+}
+
+static int
+Snmp_walksucceeded(SnmpObject *self, struct SnmpWalk *walk, int received)
+{
+	PyObject *tmp;
+
+	if (!PyObject_HasAttrString((PyObject*)self, "bulkSucceeded"))
+		return 0;
+	if ((tmp = PyObject_CallMethod((PyObject*)self, "bulkSucceeded", "ii",
+		    walk->maxrepetitions, received)) == NULL)
+		return -1;
+	Py_DECREF(tmp);
+	return Snmp_walkrepetitions(self, walk);
+}
+
+/* Return 1 if the request should be sent again */
+static int
+Snmp_walkfailed(SnmpObject *self, struct SnmpWalk *walk, int toobig)
+{
+	PyObject *tmp;
+	int retry;
+
+	if (walk->maxrepetitions <= 1)
+		return 0;
+	if (!PyObject_HasAttrString((PyObject*)self, "bulkFailed")) {
+		if (!toobig)
+			return 0;
+		walk->maxrepetitions /= 2;
+		return 1;
+	}
+	if ((tmp = PyObject_CallMethod((PyObject*)self, "bulkFailed", "iO",
+		    walk->maxrepetitions, toobig?Py_True:Py_False)) == NULL)
+		return -1;
+	retry = PyObject_IsTrue(tmp);
+	Py_DECREF(tmp);
+	if (retry <= 0)
+		return retry;
+	if (Snmp_walkrepetitions(self, walk) == -1)
+		return -1;
+	return 1;
+}
+
+static void
+Snmp_walkhandle(SnmpObject *self, PyObject *capsule, int operation,
+    netsnmp_pdu *response)
+{
+	struct SnmpWalk *walk;
+	struct variable_list *vars;
+	PyObject *key = NULL, *value = NULL, *tmp;
+	oid next[MAX_OID_LEN];
+	size_t nextlen = 0, i;
+	int received = 0, added = 0, stop = 0, retry, toobig;
+
+	if ((walk = PyCapsule_GetPointer(capsule, SNMP_WALK_CAPSULE)) == NULL)
+		return;
+	toobig = (operation == NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE &&
+	    response->errstat == SNMP_ERR_TOOBIG);
+	if (operation == NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE)
+		walk->answered = 1;
+	/* A timeout may be due to an answer too large to get through.
+	 * However, a dead agent should not wait for several timeouts:
+	 * only retry once and only if the agent already answered. */
+	if (walk->bulk &&
+	    (toobig || (operation != NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE &&
+		walk->answered && !walk->timeoutretry))) {
+		if (!toobig)
+			walk->timeoutretry = 1;
+		/* Try again with a smaller max-repetitions */
+		if ((retry = Snmp_walkfailed(self, walk, toobig)) == -1)
+			goto walkerror;
+		if (retry) {
+			if (Snmp_walksend(self, capsule) == -1)
+				goto walkerror;
+			return;
+		}
+	}
+	if (operation == NETSNMP_CALLBACK_OP_RECEIVED_MESSAGE &&
+	    response->errstat == SNMP_ERR_NOSUCHNAME)
+		/* End of MIB for SNMPv1 */
+		stop = 1;
+	else if (Snmp_seterror(operation, response) == -1)
+		goto walkerror;
+	else for (vars = response->variables; vars;
+		  vars = vars->next_variable) {
+		if (vars->type == SNMP_ENDOFMIBVIEW) {
+			stop = 1;
+			continue;
+		}
+		received++;
+		if (vars->name_length <= walk->baselen ||
+		    snmp_oid_compare(vars->name, walk->baselen,
+			walk->base, walk->baselen) != 0) {
+			/* End of table */
+			stop = 1;
+			continue;
+		}
+		if (walk->indexes) {
+			if ((key = PyTuple_New(vars->name_length -
+				    walk->baselen)) == NULL)
+				goto walkerror;
+			for (i = walk->baselen; i < vars->name_length; i++) {
+				if ((tmp = PyInt_FromLong(vars->name[i])) == NULL)
+					goto walkerror;
+				PyTuple_SET_ITEM(key, i - walk->baselen, tmp);
+			}
+		} else if ((key = Snmp_oid2string(vars->name,
+			    vars->name_length)) == NULL)
+			goto walkerror;
+		switch (PyDict_Contains(walk->results, key)) {
+		case -1:
+			goto walkerror;
+		case 1:
+			/* Loop? */
+			Py_CLEAR(key);
+			continue;
+		}
+		if ((value = Snmp_value(vars)) == NULL)
+			goto walkerror;
+		if (PyDict_SetItem(walk->results, key, value) != 0)
+			goto walkerror;
+		Py_CLEAR(key);
+		Py_CLEAR(value);
+		added++;
+		/* Buggy implementation may have a not increasing OID. We
+		 * only use the biggest one to continue. */
+		if (nextlen == 0 || snmp_oid_compare(vars->name,
+			vars->name_length, next, nextlen) > 0) {
+			memcpy(next, vars->name, vars->name_length * sizeof(oid));
+			nextlen = vars->name_length;
+		}
+	}
+	if (!added)
+		/* We get only duplicates, stop here */
+		stop = 1;
+	if (stop) {
+		if ((tmp = PyObject_GetAttrString(walk->defer,
+			    "callback")) == NULL)
+			goto walkerror;
+		Py_XDECREF(PyObject_CallMethod(reactor, "callLater", "iOO",
+			0, tmp, walk->results));
+		Py_DECREF(tmp);
+		return;
+	}
+	if (walk->bulk && Snmp_walksucceeded(self, walk, received) == -1)
+		goto walkerror;
+	memcpy(walk->last, next, nextlen * sizeof(oid));
+	walk->lastlen = nextlen;
+	if (Snmp_walksend(self, capsule) == -1)
+		goto walkerror;
+	return;
+
+walkerror:
+	Py_XDECREF(key);
+	Py_XDECREF(value);
+	Snmp_invokeerrback(walk->defer);
+}
+
 static PyObject*
-Snmp_get(PyObject *self, PyObject *args)
+Snmp_walk(SnmpObject *self, PyObject *args, PyObject *kwds)
 {
-	return Snmp_op((SnmpObject*)self, args, SNMP_MSG_GET);
+	PyObject *capsule, *deferred;
+	struct SnmpWalk *walk;
+	char *aoid, *community = NULL;
+	int communitylen = 0, maxrepetitions = 10, bulk = -1, indexes = 0;
+
+	static char *kwlist[] = {"oid", "maxrepetitions", "community",
+				 "bulk", "indexes", NULL};
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|iz#ii", kwlist,
+		&aoid, &maxrepetitions, &community, &communitylen,
+		&bulk, &indexes))
+		return NULL;
+
+	if ((walk = calloc(1, sizeof(struct SnmpWalk))) == NULL)
+		return PyErr_NoMemory();
+	if ((capsule = PyCapsule_New(walk, SNMP_WALK_CAPSULE,
+		    Snmp_walkfree)) == NULL) {
+		free(walk);
+		return NULL;
+	}
+	if (Snmp_parseoid(aoid, walk->base, &walk->baselen) == -1)
+		goto walkerror;
+	memcpy(walk->last, walk->base, walk->baselen * sizeof(oid));
+	walk->lastlen = walk->baselen;
+	walk->maxrepetitions = (maxrepetitions > 0)?maxrepetitions:1;
+	walk->bulk = (bulk == -1)?(self->ss->version != SNMP_VERSION_1):bulk;
+	walk->indexes = indexes;
+	if (community) {
+		if ((walk->community = malloc(communitylen + 1)) == NULL) {
+			PyErr_NoMemory();
+			goto walkerror;
+		}
+		memcpy(walk->community, community, communitylen + 1);
+		walk->communitylen = communitylen;
+	}
+	if ((walk->results = PyDict_New()) == NULL)
+		goto walkerror;
+	if ((deferred = PyObject_CallMethod(DeferModule,
+		    "Deferred", NULL)) == NULL)
+		goto walkerror;
+	Py_INCREF(deferred);
+	walk->defer = deferred;
+	if (Snmp_walksend(self, capsule) == -1)
+		/* Instead of raising, we will fire errback */
+		Snmp_invokeerrback(deferred);
+	Py_DECREF(capsule);
+	return deferred;
+
+walkerror:
+	Py_DECREF(capsule);
+	return NULL;
 }
 
+/* Close the session. A session with its own socket closes it at once:
+ * requests in flight fail. A session using a shared socket does not
+ * own anything worth closing: requests in flight are left to the
+ * shared socket and fail when they time out. In both cases, no more
+ * requests can be sent. */
 static PyObject*
-Snmp_getnext(PyObject *self, PyObject *args)
+Snmp_close(SnmpObject *self)
 {
-	return Snmp_op((SnmpObject*)self, args, SNMP_MSG_GETNEXT);
+	struct snmp_session *settings;
+	PyObject *key, *defer, *defers;
+	struct SnmpWalk *walk;
+	void *sessp;
+	Py_ssize_t pos = 0;
+
+	self->closed = 1;
+	if (!self->sessp) {
+		Py_INCREF(Py_None);
+		return Py_None;
+	}
+	/* Keep the settings around, they are freed with the session */
+	if ((settings = malloc(sizeof(struct snmp_session))) == NULL)
+		return PyErr_NoMemory();
+	memcpy(settings, self->ss, sizeof(struct snmp_session));
+	settings->community = NULL;
+	if ((settings->peername = strdup(self->ss->peername)) == NULL ||
+	    (settings->community = malloc(self->ss->community_len + 1)) == NULL) {
+		free(settings->peername);
+		free(settings);
+		return PyErr_NoMemory();
+	}
+	memcpy(settings->community, self->ss->community,
+	    self->ss->community_len);
+	settings->community[self->ss->community_len] = '\0';
+
+	Py_INCREF(self);
+	if (self->reader) {
+		Snmp_removereader(self->reader);
+		self->reader = NULL;
+	}
+	Snmp_deactivate(self);
+	sessp = self->sessp;
+	self->sessp = NULL;
+	self->ss = settings;
+	/* Pending requests may be handled as timeouts here */
+	snmp_sess_close(sessp);
+
+	/* Fail the requests net-snmp did not tell us about */
+	defers = self->defers;
+	if ((self->defers = PyDict_New()) == NULL) {
+		self->defers = defers;
+		Py_DECREF(self);
+		return NULL;
+	}
+	while (PyDict_Next(defers, &pos, &key, &defer)) {
+		if (PyCapsule_CheckExact(defer)) {
+			if ((walk = PyCapsule_GetPointer(defer,
+				    SNMP_WALK_CAPSULE)) == NULL) {
+				PyErr_Clear();
+				continue;
+			}
+			defer = walk->defer;
+		}
+		PyErr_SetString(SnmpException, "session is closed");
+		Snmp_invokeerrback(defer);
+		Py_DECREF(self);	/* Taken when the request was sent */
+	}
+	Py_DECREF(defers);
+	Py_DECREF(self);
+	Py_INCREF(Py_None);
+	return Py_None;
 }
 
 static PyObject*
-Snmp_getbulk(PyObject *self, PyObject *args)
+Snmp_get(PyObject *self, PyObject *args, PyObject *kwds)
 {
-	return Snmp_op((SnmpObject*)self, args, SNMP_MSG_GETBULK);
+	return Snmp_op((SnmpObject*)self, args, kwds, SNMP_MSG_GET);
+}
+
+static PyObject*
+Snmp_getnext(PyObject *self, PyObject *args, PyObject *kwds)
+{
+	return Snmp_op((SnmpObject*)self, args, kwds, SNMP_MSG_GETNEXT);
+}
+
+static PyObject*
+Snmp_getbulk(PyObject *self, PyObject *args, PyObject *kwds)
+{
+	return Snmp_op((SnmpObject*)self, args, kwds, SNMP_MSG_GETBULK);
 }
 
 static PyObject*
@@ -801,6 +1375,18 @@ Snmp_settimeout(SnmpObject *self, PyObject *value, void *closure)
 	return 0;
 }
 
+static PyObject*
+Snmp_getrequests(SnmpObject *self, void *closure)
+{
+	return PyLong_FromUnsignedLong(self->requests);
+}
+
+static PyObject*
+Snmp_gettimeouts(SnmpObject *self, void *closure)
+{
+	return PyLong_FromUnsignedLong(self->timeouts);
+}
+
 static PyObject*
 SnmpReader_repr(SnmpReaderObject *self)
 {
@@ -810,10 +1396,23 @@ SnmpReader_repr(SnmpReaderObject *self)
 static PyObject*
 SnmpReader_doRead(SnmpReaderObject *self)
 {
-	fd_set fdset;
-	FD_ZERO(&fdset);
-	FD_SET(self->fd, &fdset);
-	snmp_read(&fdset);
+	netsnmp_large_fd_set fdset;
+	SnmpObject *session = self->session;
+
+	if (self->sessp) {
+		/* Answers may release the last reference to the session. For
+		 * shared sockets, sessions are deactivated by the timer. */
+		Py_XINCREF(session);
+		netsnmp_large_fd_set_init(&fdset, self->fd + 1);
+		netsnmp_large_fd_setfd(self->fd, &fdset);
+		snmp_sess_read2(self->sessp, &fdset);
+		netsnmp_large_fd_set_cleanup(&fdset);
+		if (session) {
+			if (PyDict_Size(session->defers) == 0)
+				Snmp_deactivate(session);
+			Py_DECREF(session);
+		}
+	}
 	Py_INCREF(Py_None);
 	return Py_None;
 }
@@ -827,14 +1426,6 @@ SnmpReader_fileno(SnmpReaderObject *self)
 static PyObject*
 SnmpReader_connectionLost(PyObject *self, PyObject *args)
 {
-	PyObject *fd;
-	if ((fd = PyInt_FromLong(((SnmpReaderObject*)self)->fd)) == NULL)
-		return NULL;
-	if (PyDict_DelItem(SnmpFds, fd) == -1) {
-		Py_DECREF(fd);
-		return NULL;
-	}
-	Py_DECREF(fd);
 	Py_INCREF(Py_None);
 	return Py_None;
 }
@@ -848,27 +1439,99 @@ SnmpReader_logPrefix(SnmpReaderObject *self)
 static PyObject*
 SnmpModule_timeout(PyObject *self)
 {
+	SnmpObject *session, *next;
+	int i;
+
 	Py_CLEAR(timeoutId);
-	snmp_timeout();
-	if (Snmp_updatereactor() == -1)
+	for (i = 0; i < 2*SnmpSharedCount; i++)
+		snmp_sess_timeout(SnmpShared[i].sessp);
+	for (session = SnmpActive; session; session = next) {
+		Py_INCREF(session);
+		if (session->sessp)
+			snmp_sess_timeout(session->sessp);
+		next = session->next;
+		if (PyDict_Size(session->defers) == 0)
+			Snmp_deactivate(session);
+		Py_DECREF(session);
+	}
+	if (Snmp_schedule() == -1)
+		return NULL;
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+static PyObject*
+SnmpModule_share(PyObject *self, PyObject *args)
+{
+	struct snmp_session session;
+	int count, i;
+
+	if (!PyArg_ParseTuple(args, "i", &count))
+		return NULL;
+	if (SnmpSharedCount && count != SnmpSharedCount) {
+		PyErr_SetString(PyExc_ValueError,
+		    "shared sockets are already set up");
 		return NULL;
+	}
+	if (SnmpSharedCount || count <= 0) {
+		Py_INCREF(Py_None);
+		return Py_None;
+	}
+	if ((SnmpShared = calloc(2*count, sizeof(SnmpSharedSocket))) == NULL)
+		return PyErr_NoMemory();
+	for (i = 0; i < 2*count; i++) {
+		/* The peer is only a placeholder, each PDU has its own
+		 * destination. */
+		snmp_sess_init(&session);
+		session.version = (i < count)?SNMP_VERSION_2c:SNMP_VERSION_1;
+		session.retries = 0;
+		session.peername = "127.0.0.1";
+		session.community = (u_char*)"public";
+		session.community_len = strlen("public");
+		if ((SnmpShared[i].sessp = snmp_sess_open(&session)) == NULL) {
+			Snmp_raise_error(&session);
+			goto shareerror;
+		}
+		SnmpShared[i].ss = snmp_sess_session(SnmpShared[i].sessp);
+		if ((SnmpShared[i].reader =
+			Snmp_newreader(SnmpShared[i].sessp, NULL)) == NULL)
+			goto shareerror;
+	}
+	SnmpSharedCount = count;
 	Py_INCREF(Py_None);
 	return Py_None;
+
+shareerror:
+	for (i = 0; i < 2*count; i++) {
+		if (SnmpShared[i].reader)
+			Snmp_removereader(SnmpShared[i].reader);
+		if (SnmpShared[i].sessp)
+			snmp_sess_close(SnmpShared[i].sessp);
+	}
+	free(SnmpShared);
+	SnmpShared = NULL;
+	return NULL;
 }
 
 static PyMethodDef SnmpModule_methods[] = {
 	{"timeout", (PyCFunction)SnmpModule_timeout,
 	 METH_NOARGS, "Handle SNMP timeout"},
+	{"share", (PyCFunction)SnmpModule_share,
+	 METH_VARARGS, "Send requests of new sessions through shared sockets"},
 	{NULL}
 };
 
 static PyMethodDef Snmp_methods[] = {
-	{"get", Snmp_get,
-	 METH_VARARGS, "Retrieve an OID value using GET"},
-	{"getnext", Snmp_getnext,
-	 METH_VARARGS, "Retrieve an OID value using GETNEXT"},
-	{"getbulk", Snmp_getbulk,
-	 METH_VARARGS, "Retrieve an OID value using GETBULK"},
+	{"get", (PyCFunction)Snmp_get,
+	 METH_VARARGS | METH_KEYWORDS, "Retrieve an OID value using GET"},
+	{"getnext", (PyCFunction)Snmp_getnext,
+	 METH_VARARGS | METH_KEYWORDS, "Retrieve an OID value using GETNEXT"},
+	{"getbulk", (PyCFunction)Snmp_getbulk,
+	 METH_VARARGS | METH_KEYWORDS, "Retrieve an OID value using GETBULK"},
+	{"walk", (PyCFunction)Snmp_walk,
+	 METH_VARARGS | METH_KEYWORDS, "Retrieve a table using GETBULK or GETNEXT"},
+	{"close", (PyCFunction)Snmp_close,
+	 METH_NOARGS, "Close the session, pending requests fail"},
 	{NULL}  /* Sentinel */
 };
 
@@ -886,6 +1549,10 @@ static PyGetSetDef Snmp_getseters[] = {
     {"timeout",
      (getter)Snmp_gettimeout, (setter)Snmp_settimeout,
      "timeout", NULL},
+    {"requests", (getter)Snmp_getrequests, NULL,
+     "number of requests sent", NULL},
+    {"timeouts", (getter)Snmp_gettimeouts, NULL,
+     "number of requests without answer", NULL},
     {NULL}  /* Sentinel */
 };
 
@@ -1039,9 +1706,6 @@ initsnmp(void)
 		if ((reactor =
 			PyImport_ImportModule("twisted.internet.reactor")) == NULL)
 			return;
-	if (SnmpFds == NULL)
-		if ((SnmpFds = PyDict_New()) == NULL)
-			return;
 	if (timeoutFunction == NULL)
 		if ((timeoutFunction = Py_FindMethod(SnmpModule_methods,
 			    m, "timeout")) == NULL)
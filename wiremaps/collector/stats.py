@@ -0,0 +1,92 @@
+import time
+
+from twisted.python.failure import Failure
+
+def text(s):
+    """Convert a string to unicode, whatever its encoding"""
+    if isinstance(s, unicode):
+        return s
+    return str(s).decode("utf-8", "replace")
+
+class CollectorStats:
+    """Keep metrics about the last explorations.
+
+    For each equipment, the last exploration is kept: time spent in
+    each helper and in each walk, number of SNMP requests, timeouts
+    and GETBULK retries, number of rows collected, time spent waiting
+    for a database write slot and time spent writing to the
+    database. Those metrics are also aggregated by
+    plugin and by OID to spot slow equipments.
+    """
+
+    def __init__(self):
+        self.devices = {}       # IP -> last exploration
+        self.plugins = {}       # Plugin -> [explorations, duration]
+        self.oids = {}          # OID -> [explorations, duration]
+        self.explorations = 0
+
+    def explored(self, result, proxy, equipment, plugins, started, collected):
+        """Record the exploration of an equipment.
+
+        @param result: result of the exploration (may be a failure)
+        @param proxy: proxy used to explore the equipment
+        @param equipment: explored equipment
+        @param plugins: list of plugins used to collect data
+        @param started: time at which exploration started
+        @param collected: list whose first item is the time at which
+           data collection ended and whose second item is the time at
+           which the write to the database started (C{None} if it did
+           not happen)
+        @return: C{result}
+        """
+        now = time.time()
+        duration = now - started
+        self.explorations += 1
+        queue = write = None
+        if collected[0] is not None and collected[1] is not None:
+            queue = collected[1] - collected[0]
+            write = now - collected[1]
+        plugins = [unicode(plugin.__class__.__name__) for plugin in plugins]
+        self.devices[unicode(proxy.ip)] = {
+            u"name": text(equipment.name),
+            u"oid": unicode(equipment.oid),
+            u"plugins": plugins,
+            u"volatile": equipment.volatile,
+            u"started": started,
+            u"duration": duration,
+            u"queue": queue,
+            u"write": write,
+            u"helpers": dict([(unicode(name), t)
+                              for name, t in equipment.timings.items()]),
+            u"walks": dict([(unicode(oid), {u"walks": s[0],
+                                            u"duration": s[1],
+                                            u"rows": s[2]})
+                            for oid, s in proxy.walkstats.items()]),
+            u"requests": proxy.requests,
+            u"timeouts": proxy.timeouts,
+            u"retries": proxy.retries_bulk,
+            u"rows": {u"ports": len(equipment.ports),
+                      u"fdb": sum([len(p.fdb)
+                                   for p in equipment.ports.values()]),
+                      u"arp": len(equipment.arp),
+                      u"vlan": sum([len(p.vlan)
+                                    for p in equipment.ports.values()])},
+            u"error": isinstance(result, Failure) and \
+                text(result.getErrorMessage()) or None,
+            }
+        for key, aggregate in [(u",".join(plugins), self.plugins),
+                               (unicode(equipment.oid), self.oids)]:
+            stats = aggregate.setdefault(key, [0, 0])
+            stats[0] += 1
+            stats[1] += duration
+        return result
+
+    def summary(self):
+        """Return metrics as a mapping suitable for JSON."""
+        return {u"devices": self.devices,
+                u"plugins": dict([(k, {u"explorations": v[0],
+                                       u"duration": v[1]})
+                                  for k, v in self.plugins.items()]),
+                u"oids": dict([(k, {u"explorations": v[0],
+                                    u"duration": v[1]})
+                               for k, v in self.oids.items()])}
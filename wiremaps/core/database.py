@@ -10,8 +10,32 @@ from twisted.enterprise import adbapi
 
 
 class Database:
+    """Connection to the database.
+
+    Two pools of connections are available: C{pool} is used for
+    interactive queries (web interface) while C{writepool} is used by
+    the collector to write what it collected. Large writes therefore
+    do not starve interactive queries.
+    """
 
     def __init__(self, config):
+        database = config['database']
+        self.pool = self.connect(config,
+                                 database.get('poolmin', 3),
+                                 database.get('poolmax', 5))
+        self.writepool = self.connect(config,
+                                      database.get('writepoolmin', 1),
+                                      database.get('writepoolmax', 2))
+        reactor.callLater(0, self.checkDatabase)
+
+    def connect(self, config, minimum, maximum):
+        """Create a new pool of connections to the database.
+
+        @param config: configuration
+        @param minimum: minimum number of connections
+        @param maximum: maximum number of connections
+        @return: a pool of connections
+        """
         pghost = config['database'].get('host', os.environ.get('PGHOST', 'localhost'))
         pgport = int(config['database'].get('port', os.environ.get('PGPORT', 5432)))
         try:
@@ -29,7 +53,7 @@ class Database:
                     config['database']['database'],
                     config['database']['username'],
                     config['database']['password']),
-                    cp_reconnect=True)
+                    cp_reconnect=True, cp_min=minimum, cp_max=maximum)
         else:
             p = adbapi.ConnectionPool("psycopg2",
                                       "host=%s port=%d dbname=%s "
@@ -38,9 +62,8 @@ class Database:
                     config['database']['database'],
                     config['database']['username'],
                     config['database']['password']),
-                    cp_reconnect=True)
-        self.pool = p
-        reactor.callLater(0, self.checkDatabase)
+                    cp_reconnect=True, cp_min=minimum, cp_max=maximum)
+        return p
 
     def checkDatabase(self):
         """Check if the database is running. Otherwise, stop the reactor.
@@ -281,3 +304,116 @@ DO ALSO
         d.addCallbacks(lambda _: None,
                        lambda _: self.pool.runInteraction(addsyslocation))
         return d
+
+    def upgradeDatabase_07(self):
+        """add indexes on columns used for lookups"""
+
+        # Live tables only need to index current entries while _past
+        # tables are looked up with a date.
+        def addindex(txn):
+            txn.execute("CREATE INDEX equipment_name ON equipment (name) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX port_mac ON port (mac) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX fdb_mac ON fdb (mac) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX fdb_equipment_port ON fdb (equipment, port) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX arp_mac ON arp (mac) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX arp_ip ON arp (ip) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX sonmp_remoteip ON sonmp (remoteip) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX edp_sysname ON edp (sysname) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX cdp_mgmtip ON cdp (mgmtip) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX cdp_sysname ON cdp (sysname) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX lldp_mgmtip ON lldp (mgmtip) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX lldp_sysname ON lldp (sysname) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX vlan_vid_type ON vlan (vid, type) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX trunk_equipment_member ON trunk (equipment, member) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX equipment_past_name ON equipment_past (name, deleted)")
+            txn.execute("CREATE INDEX port_past_mac ON port_past (mac, deleted)")
+            txn.execute("CREATE INDEX fdb_past_mac ON fdb_past (mac, deleted)")
+            txn.execute("CREATE INDEX fdb_past_equipment_port ON fdb_past (equipment, port, deleted)")
+            txn.execute("CREATE INDEX arp_past_mac ON arp_past (mac, deleted)")
+            txn.execute("CREATE INDEX arp_past_ip ON arp_past (ip, deleted)")
+            txn.execute("CREATE INDEX sonmp_past_remoteip ON sonmp_past (remoteip, deleted)")
+            txn.execute("CREATE INDEX edp_past_sysname ON edp_past (sysname, deleted)")
+            txn.execute("CREATE INDEX cdp_past_mgmtip ON cdp_past (mgmtip, deleted)")
+            txn.execute("CREATE INDEX cdp_past_sysname ON cdp_past (sysname, deleted)")
+            txn.execute("CREATE INDEX lldp_past_mgmtip ON lldp_past (mgmtip, deleted)")
+            txn.execute("CREATE INDEX lldp_past_sysname ON lldp_past (sysname, deleted)")
+            txn.execute("CREATE INDEX vlan_past_vid_type ON vlan_past (vid, type, deleted)")
+            txn.execute("CREATE INDEX trunk_past_equipment_member ON trunk_past (equipment, member, deleted)")
+
+        d = self.pool.runQuery("SELECT 1 FROM pg_indexes WHERE indexname='fdb_mac'")
+        d.addCallback(lambda result: not result and \
+                          self.pool.runInteraction(addindex) or None)
+        return d
+
+    def upgradeDatabase_08(self):
+        """use UNION ALL for _full views"""
+
+        # Rows are either in the table or in the past table, there is
+        # no need to remove duplicates. The constraint allows to
+        # exclude past tables for current rows.
+        def unionall(txn):
+            for table in ["equipment", "port", "fdb", "arp", "sonmp", "edp", "cdp", "lldp",
+                          "vlan", "trunk"]:
+                txn.execute("CREATE OR REPLACE VIEW %s_full AS "
+                            "(SELECT * FROM %s UNION ALL SELECT * FROM %s_past)" % ((table,)*3))
+                txn.execute("ALTER TABLE %s_past ADD CONSTRAINT %s_past_deleted_check "
+                            "CHECK (deleted <> 'infinity')" % ((table,)*2))
+
+        d = self.pool.runQuery("SELECT 1 FROM pg_constraint "
+                               "WHERE conname='fdb_past_deleted_check'")
+        d.addCallback(lambda result: not result and \
+                          self.pool.runInteraction(unionall) or None)
+        return d
+
+    def upgradeDatabase_09(self):
+        """add indexes for case insensitive prefix searches on names"""
+
+        # Prefix searches are written lower(x) LIKE lower(y)||'%'.
+        # text_pattern_ops allows LIKE to use the index whatever the
+        # locale is.
+        def addindex(txn):
+            txn.execute("CREATE INDEX equipment_name_lower ON equipment "
+                        "(lower(name) text_pattern_ops) WHERE deleted='infinity'")
+            txn.execute("CREATE INDEX equipment_past_name_lower ON equipment_past "
+                        "(lower(name) text_pattern_ops, deleted)")
+            for table in ["edp", "cdp", "lldp"]:
+                txn.execute("CREATE INDEX %s_sysname_lower ON %s "
+                            "(lower(sysname) text_pattern_ops) "
+                            "WHERE deleted='infinity'" % ((table,)*2))
+                txn.execute("CREATE INDEX %s_past_sysname_lower ON %s_past "
+                            "(lower(sysname) text_pattern_ops, deleted)" % ((table,)*2))
+
+        d = self.pool.runQuery("SELECT 1 FROM pg_indexes WHERE indexname='equipment_name_lower'")
+        d.addCallback(lambda result: not result and \
+                          self.pool.runInteraction(addindex) or None)
+        return d
+
+    # Substring searches on equipment names (name ILIKE '%'||x||'%')
+    # can only use trigram indexes.
+    trigramIndexes = [
+        "CREATE INDEX equipment_name_trgm ON equipment "
+        "USING gin (name gin_trgm_ops) WHERE deleted='infinity'",
+        "CREATE INDEX equipment_past_name_trgm ON equipment_past "
+        "USING gin (name gin_trgm_ops)"]
+
+    def upgradeDatabase_10(self):
+        """add trigram indexes for substring searches on names"""
+
+        # pg_trgm needs PostgreSQL 9.1 or more recent and the contrib
+        # modules. Without it, those searches scan the tables.
+        def addindex(txn):
+            txn.execute("SAVEPOINT wiremaps_trgm")
+            try:
+                txn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except Exception, e:
+                txn.execute("ROLLBACK TO SAVEPOINT wiremaps_trgm")
+                log.msg("pg_trgm is not available, substring searches "
+                        "on names won't use an index: %s" % e)
+                return
+            for index in self.trigramIndexes:
+                txn.execute(index)
+
+        d = self.pool.runQuery("SELECT 1 FROM pg_indexes WHERE indexname='equipment_name_trgm'")
+        d.addCallback(lambda result: not result and \
+                          self.pool.runInteraction(addindex) or None)
+        return d
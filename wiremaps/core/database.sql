@@ -1,6 +1,13 @@
 -- Database schema for Wire Maps. PostgreSQL.
 
--- This schema still needs some work to create appropriate indexes.
+-- Columns used for lookups by the web interface are indexed. On live
+-- tables, those indexes only cover current entries
+-- (deleted='infinity'). On _past tables, they include `deleted'.
+-- Case insensitive prefix searches on names are written as
+-- lower(name) LIKE lower(prefix)||'%' and use indexes on lower(name)
+-- with text_pattern_ops. Substring searches on equipment names need
+-- trigram indexes from pg_trgm (PostgreSQL 9.1 or more recent): they
+-- are added by the application when pg_trgm is available.
 
 -- We use ON DELETE CASCADE to be able to simply delete equipment or
 -- port without cleaning the other tables. We also heavily rely on ON
@@ -41,7 +48,10 @@
 
 -- Each table have a _past counterpart that has the same schema but
 -- where deleted != 'infinity'. Each table has also a view _full which
--- is the join of the table and the past table. To maintain PostgreSQL
+-- is the join of the table and the past table. Since a row is either
+-- in the table or in the past table, the join is a UNION ALL. A CHECK
+-- constraint on `deleted' in past tables allows the planner to skip
+-- them when only current rows are requested. To maintain PostgreSQL
 -- 8.1 compatibility, we need to copy indexes by hand (instead of
 -- using INCLUDING INDEXES). We don't include DEFAULTS because there
 -- is not direct insertion into past tables.
@@ -118,7 +128,12 @@ CREATE INDEX equipment_deleted ON equipment (deleted);
 CREATE TABLE equipment_past (LIKE equipment);
 ALTER TABLE equipment_past ADD PRIMARY KEY (ip, deleted);
 CREATE INDEX equipment_past_deleted ON equipment_past (deleted);
-CREATE VIEW equipment_full AS (SELECT * FROM equipment UNION SELECT * FROM equipment_past);
+CREATE INDEX equipment_name ON equipment (name) WHERE deleted='infinity';
+CREATE INDEX equipment_past_name ON equipment_past (name, deleted);
+CREATE INDEX equipment_name_lower ON equipment (lower(name) text_pattern_ops) WHERE deleted='infinity';
+CREATE INDEX equipment_past_name_lower ON equipment_past (lower(name) text_pattern_ops, deleted);
+ALTER TABLE equipment_past ADD CONSTRAINT equipment_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW equipment_full AS (SELECT * FROM equipment UNION ALL SELECT * FROM equipment_past);
 
 CREATE TABLE port (
   equipment inet	      NOT NULL,
@@ -142,7 +157,10 @@ CREATE INDEX port_deleted ON port (deleted);
 CREATE TABLE port_past (LIKE port);
 ALTER TABLE port_past ADD PRIMARY KEY (equipment, index, deleted);
 CREATE INDEX port_past_deleted ON port_past (deleted);
-CREATE VIEW port_full AS (SELECT * FROM port UNION SELECT * FROM port_past);
+CREATE INDEX port_mac ON port (mac) WHERE deleted='infinity';
+CREATE INDEX port_past_mac ON port_past (mac, deleted);
+ALTER TABLE port_past ADD CONSTRAINT port_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW port_full AS (SELECT * FROM port UNION ALL SELECT * FROM port_past);
 
 -- Just a dump of FDB for a given port
 CREATE TABLE fdb (
@@ -165,7 +183,12 @@ AND deleted='infinity';
 CREATE TABLE fdb_past (LIKE fdb);
 ALTER TABLE fdb_past ADD PRIMARY KEY (equipment, port, mac, deleted);
 CREATE INDEX fdb_past_deleted ON fdb_past (deleted);
-CREATE VIEW fdb_full AS (SELECT * FROM fdb UNION SELECT * FROM fdb_past);
+CREATE INDEX fdb_mac ON fdb (mac) WHERE deleted='infinity';
+CREATE INDEX fdb_equipment_port ON fdb (equipment, port) WHERE deleted='infinity';
+CREATE INDEX fdb_past_mac ON fdb_past (mac, deleted);
+CREATE INDEX fdb_past_equipment_port ON fdb_past (equipment, port, deleted);
+ALTER TABLE fdb_past ADD CONSTRAINT fdb_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW fdb_full AS (SELECT * FROM fdb UNION ALL SELECT * FROM fdb_past);
 
 -- Just a dump of ARP for a given port
 CREATE TABLE arp (
@@ -188,7 +211,12 @@ AND deleted='infinity';
 CREATE TABLE arp_past (LIKE arp);
 ALTER TABLE arp_past ADD PRIMARY KEY (equipment, mac, ip, deleted);
 CREATE INDEX arp_past_deleted ON arp_past (deleted);
-CREATE VIEW arp_full AS (SELECT * FROM arp UNION SELECT * FROM arp_past);
+CREATE INDEX arp_mac ON arp (mac) WHERE deleted='infinity';
+CREATE INDEX arp_ip ON arp (ip) WHERE deleted='infinity';
+CREATE INDEX arp_past_mac ON arp_past (mac, deleted);
+CREATE INDEX arp_past_ip ON arp_past (ip, deleted);
+ALTER TABLE arp_past ADD CONSTRAINT arp_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW arp_full AS (SELECT * FROM arp UNION ALL SELECT * FROM arp_past);
 
 -- Just a dump of SONMP for a given port
 CREATE TABLE sonmp (
@@ -213,7 +241,10 @@ AND deleted=CURRENT_TIMESTAMP::abstime;
 CREATE TABLE sonmp_past (LIKE sonmp);
 ALTER TABLE sonmp_past ADD PRIMARY KEY (equipment, port, deleted);
 CREATE INDEX sonmp_past_deleted ON sonmp_past (deleted);
-CREATE VIEW sonmp_full AS (SELECT * FROM sonmp UNION SELECT * FROM sonmp_past);
+CREATE INDEX sonmp_remoteip ON sonmp (remoteip) WHERE deleted='infinity';
+CREATE INDEX sonmp_past_remoteip ON sonmp_past (remoteip, deleted);
+ALTER TABLE sonmp_past ADD CONSTRAINT sonmp_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW sonmp_full AS (SELECT * FROM sonmp UNION ALL SELECT * FROM sonmp_past);
 
 -- Just a dump of EDP for a given port
 CREATE TABLE edp (
@@ -241,7 +272,12 @@ AND deleted=CURRENT_TIMESTAMP::abstime;
 CREATE TABLE edp_past (LIKE edp);
 ALTER TABLE edp_past ADD PRIMARY KEY (equipment, port, deleted);
 CREATE INDEX edp_past_deleted ON edp_past (deleted);
-CREATE VIEW edp_full AS (SELECT * FROM edp UNION SELECT * FROM edp_past);
+CREATE INDEX edp_sysname ON edp (sysname) WHERE deleted='infinity';
+CREATE INDEX edp_past_sysname ON edp_past (sysname, deleted);
+CREATE INDEX edp_sysname_lower ON edp (lower(sysname) text_pattern_ops) WHERE deleted='infinity';
+CREATE INDEX edp_past_sysname_lower ON edp_past (lower(sysname) text_pattern_ops, deleted);
+ALTER TABLE edp_past ADD CONSTRAINT edp_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW edp_full AS (SELECT * FROM edp UNION ALL SELECT * FROM edp_past);
 
 -- Just a dump of CDP for a given port
 CREATE TABLE cdp (
@@ -270,7 +306,14 @@ AND deleted=CURRENT_TIMESTAMP::abstime;
 CREATE TABLE cdp_past (LIKE cdp);
 ALTER TABLE cdp_past ADD PRIMARY KEY (equipment, port, deleted);
 CREATE INDEX cdp_past_deleted ON cdp_past (deleted);
-CREATE VIEW cdp_full AS (SELECT * FROM cdp UNION SELECT * FROM cdp_past);
+CREATE INDEX cdp_mgmtip ON cdp (mgmtip) WHERE deleted='infinity';
+CREATE INDEX cdp_sysname ON cdp (sysname) WHERE deleted='infinity';
+CREATE INDEX cdp_past_mgmtip ON cdp_past (mgmtip, deleted);
+CREATE INDEX cdp_past_sysname ON cdp_past (sysname, deleted);
+CREATE INDEX cdp_sysname_lower ON cdp (lower(sysname) text_pattern_ops) WHERE deleted='infinity';
+CREATE INDEX cdp_past_sysname_lower ON cdp_past (lower(sysname) text_pattern_ops, deleted);
+ALTER TABLE cdp_past ADD CONSTRAINT cdp_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW cdp_full AS (SELECT * FROM cdp UNION ALL SELECT * FROM cdp_past);
 
 -- Synthesis of info from LLDP for a given port. Not very detailed.
 CREATE TABLE lldp (
@@ -299,7 +342,14 @@ AND deleted=CURRENT_TIMESTAMP::abstime;
 CREATE TABLE lldp_past (LIKE lldp);
 ALTER TABLE lldp_past ADD PRIMARY KEY (equipment, port, deleted);
 CREATE INDEX lldp_past_deleted ON lldp_past (deleted);
-CREATE VIEW lldp_full AS (SELECT * FROM lldp UNION SELECT * FROM lldp_past);
+CREATE INDEX lldp_mgmtip ON lldp (mgmtip) WHERE deleted='infinity';
+CREATE INDEX lldp_sysname ON lldp (sysname) WHERE deleted='infinity';
+CREATE INDEX lldp_past_mgmtip ON lldp_past (mgmtip, deleted);
+CREATE INDEX lldp_past_sysname ON lldp_past (sysname, deleted);
+CREATE INDEX lldp_sysname_lower ON lldp (lower(sysname) text_pattern_ops) WHERE deleted='infinity';
+CREATE INDEX lldp_past_sysname_lower ON lldp_past (lower(sysname) text_pattern_ops, deleted);
+ALTER TABLE lldp_past ADD CONSTRAINT lldp_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW lldp_full AS (SELECT * FROM lldp UNION ALL SELECT * FROM lldp_past);
 
 -- Info about vlan
 CREATE TABLE vlan (
@@ -330,7 +380,10 @@ WHERE EXISTS (SELECT 1 FROM vlan
 DO INSTEAD NOTHING;
 CREATE TABLE vlan_past (LIKE vlan);
 ALTER TABLE vlan_past ADD PRIMARY KEY (equipment, port, vid, type, deleted);
-CREATE VIEW vlan_full AS (SELECT * FROM vlan UNION SELECT * FROM vlan_past);
+CREATE INDEX vlan_vid_type ON vlan (vid, type) WHERE deleted='infinity';
+CREATE INDEX vlan_past_vid_type ON vlan_past (vid, type, deleted);
+ALTER TABLE vlan_past ADD CONSTRAINT vlan_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW vlan_full AS (SELECT * FROM vlan UNION ALL SELECT * FROM vlan_past);
 
 -- Info about trunk
 CREATE TABLE trunk (
@@ -352,7 +405,10 @@ AND member=new.member
 AND deleted=CURRENT_TIMESTAMP::abstime;
 CREATE TABLE trunk_past (LIKE trunk);
 ALTER TABLE trunk_past ADD PRIMARY KEY (equipment, port, member, deleted);
-CREATE VIEW trunk_full AS (SELECT * FROM trunk UNION SELECT * FROM trunk_past);
+CREATE INDEX trunk_equipment_member ON trunk (equipment, member) WHERE deleted='infinity';
+CREATE INDEX trunk_past_equipment_member ON trunk_past (equipment, member, deleted);
+ALTER TABLE trunk_past ADD CONSTRAINT trunk_past_deleted_check CHECK (deleted <> 'infinity');
+CREATE VIEW trunk_full AS (SELECT * FROM trunk UNION ALL SELECT * FROM trunk_past);
 
 -- Special rule to propagate updates. These rules should work when
 -- port or equipment `deleted' column is set from infinity to
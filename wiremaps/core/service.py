@@ -6,8 +6,10 @@ from twisted.application import service, internet
 from nevow import appserver
 
 from wiremaps.collector.core import CollectorService
+from wiremaps.collector.database import DatabaseWriter
 from database import Database
 from wiremaps.web.site import MainPage
+from wiremaps.web.cache import equipments
 
 def makeService(config):
 
@@ -21,10 +23,12 @@ def makeService(config):
     # configuration file
     configfile = yaml.load(file(config['config'], 'rb').read())
     # database
-    dbpool = Database(configfile).pool
+    database = Database(configfile)
+    dbpool = database.pool
     application = service.MultiService()
 
-    collector = CollectorService(configfile, dbpool)
+    collector = CollectorService(configfile, database.writepool)
+    DatabaseWriter.observers.append(equipments.invalidate)
     collector.setServiceParent(application)
 
     web = internet.TCPServer(int(config['port']),
@@ -4,6 +4,7 @@ from wiremaps.web.images import ImageResource
 from wiremaps.web.equipment import EquipmentResource
 from wiremaps.web.search import SearchResource
 from wiremaps.web.complete import CompleteResource
+from wiremaps.web.collector import CollectorResource
 from wiremaps.web.timetravel import PastResource, IPastDate, PastConnectionPool
 from wiremaps.web.common import IApiVersion
 
@@ -53,6 +54,11 @@ class ApiVersionedResource(rend.Page):
     def child_complete(self, ctx):
         return CompleteResource(self.dbpool)
 
+    def child_collector(self, ctx):
+        if IApiVersion(ctx) < (1, 1):
+            return None
+        return CollectorResource(self.collector)
+
     def child_past(self, ctx):
         try:
             # Check if we already got a date
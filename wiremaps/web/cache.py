@@ -0,0 +1,116 @@
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from wiremaps.web.timetravel import IPastDate
+
+class EquipmentSnapshot:
+    """Equipments known at a given date.
+
+    Each equipment is a triple C{ip, name, oid}.
+    """
+
+    def __init__(self, rows):
+        self.ips = {}           # IP -> equipment
+        self.names = {}         # Lowercase name -> list of equipments
+        for ip, name, oid in rows:
+            self.ips[ip] = (ip, name, oid)
+            if name is not None:
+                self.names.setdefault(name.lower(), []).append((ip, name, oid))
+
+    def ip(self, ip):
+        """Get the equipment with the given IP.
+
+        @return: the equipment or C{None}
+        """
+        return self.ips.get(str(ip))
+
+    def name(self, name):
+        """Get equipments with the given name, ignoring case."""
+        return self.names.get(name.lower(), [])
+
+    def hostname(self, name):
+        """Get equipments with the given name, with or without domain.
+
+        Equipments whose name matches exactly come first.
+        """
+        name = name.lower()
+        prefix = "%s." % name
+        result = list(self.names.get(name, []))
+        for n, equipments in self.names.items():
+            if n.startswith(prefix):
+                result.extend(equipments)
+        return result
+
+class EquipmentCache:
+    """Process-wide cache of the equipment table.
+
+    A snapshot of the equipments is loaded on first use for the
+    present and for each requested date in the past. Only the
+    C{past} most recently loaded past snapshots are kept. All
+    snapshots are dropped when the collector changes the equipment
+    table (see L{invalidate}).
+    """
+
+    past = 10
+
+    def __init__(self):
+        self.snapshots = {}     # Date -> snapshot or list of waiters
+        self.dates = []         # Past dates, oldest first
+        self.generation = 0
+
+    def get(self, ctx, dbpool):
+        """Get the snapshot of equipments at the date of the context.
+
+        @param ctx: web context, used to find the date
+        @param dbpool: pool to use to load the snapshot
+        @return: a deferred firing with an L{EquipmentSnapshot}
+        """
+        try:
+            date = ctx.locate(IPastDate)
+        except KeyError:
+            date = None
+        snapshot = self.snapshots.get(date)
+        if isinstance(snapshot, EquipmentSnapshot):
+            return defer.succeed(snapshot)
+        d = defer.Deferred()
+        if snapshot is None:
+            waiters = self.snapshots[date] = [d]
+            load = dbpool.runQueryInPast(ctx,
+                                         "SELECT ip, name, oid FROM equipment_full "
+                                         "WHERE deleted='infinity'")
+            load.addBoth(self.loaded, date, waiters, self.generation)
+        else:
+            snapshot.append(d)
+        return d
+
+    def loaded(self, result, date, waiters, generation):
+        if self.snapshots.get(date) is waiters:
+            del self.snapshots[date]
+        if not isinstance(result, Failure):
+            result = EquipmentSnapshot(result)
+            if generation == self.generation:
+                # Still valid, keep it
+                self.snapshots[date] = result
+                if date is not None:
+                    self.dates.append(date)
+                    while len(self.dates) > self.past:
+                        self.snapshots.pop(self.dates.pop(0), None)
+        for d in waiters:
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    def invalidate(self, ip=None):
+        """Drop all snapshots.
+
+        Snapshots being loaded are still given to those waiting for
+        them but are not kept.
+
+        @param ip: IP of the modified equipment (unused)
+        """
+        self.generation += 1
+        self.snapshots = {}
+        self.dates = []
+
+equipments = EquipmentCache()
@@ -0,0 +1,26 @@
+from nevow import rend, tags as T, loaders
+
+from wiremaps.web.json import JsonPage
+
+class CollectorResource(rend.Page):
+    """Information about the collector itself"""
+
+    addSlash = True
+    docFactory = loaders.stan(T.html [ T.body [ T.p [ "Nothing here" ] ] ])
+
+    def __init__(self, collector):
+        self.collector = collector
+        rend.Page.__init__(self)
+
+    def child_stats(self, ctx):
+        return CollectorStatsResource(self.collector)
+
+class CollectorStatsResource(JsonPage):
+    """Give metrics about the last explorations"""
+
+    def __init__(self, collector):
+        self.collector = collector
+        JsonPage.__init__(self)
+
+    def data_json(self, ctx, data):
+        return self.collector.stats.summary()
@@ -1,16 +1,159 @@
 import re
 
+from twisted.internet import defer, reactor
 from twisted.names import client
+from twisted.python.failure import Failure
 from zope.interface import Interface
 
-from nevow import rend
+from nevow import rend, inevow
 from nevow import tags as T, entities as E
-from nevow.stan import Entity
+from nevow.stan import Entity, Tag, directive
+
+from wiremaps.web.cache import equipments
 
 class IApiVersion(Interface):
     """Remember the version used for API"""
     pass
 
+class IResolver(Interface):
+    """Resolve IP and hostnames rendered while handling a request"""
+    pass
+
+class Resolver:
+    """Resolve IP and hostnames rendered while handling a request.
+
+    For each IP, we want to know if it belongs to a known equipment
+    and its reverse DNS name. For each hostname, we want to know if
+    it is the name of a known equipment. Requests are queued and
+    resolved together: IP and hostnames with one lookup in the
+    equipment cache and all DNS lookups at once.
+
+    Use L{prefetch} on a stan tree to queue everything it will
+    render before the first render needs an answer.
+    """
+
+    def __init__(self, dbpool, ctx):
+        self.dbpool = dbpool
+        self.ctx = ctx
+        self.ips = {}           # IP -> known equipment or list of waiters
+        self.names = {}         # Name -> known equipment or list of waiters
+        self.ptrs = {}          # IP -> DNS answer or list of waiters
+        self.queued = {'ips': [], 'names': [], 'ptrs': []}
+        self.pending = None
+
+    def get(cls, ctx, dbpool):
+        """Get the resolver attached to the current request."""
+        request = inevow.IRequest(ctx)
+        resolver = request.getComponent(IResolver)
+        if resolver is None:
+            resolver = cls(dbpool, ctx)
+            request.setComponent(IResolver, resolver)
+        return resolver
+    get = classmethod(get)
+
+    def want(self, kind, key):
+        cache = getattr(self, kind)
+        if key not in cache:
+            cache[key] = []
+            self.queued[kind].append(key)
+            if self.pending is None:
+                self.pending = reactor.callLater(0, self.flush)
+        return cache[key]
+
+    def lookup(self, kind, key):
+        result = self.want(kind, key)
+        if not isinstance(result, list):
+            return defer.succeed(result)
+        d = defer.Deferred()
+        result.append(d)
+        return d
+
+    def resolved(self, value, kind, key):
+        cache = getattr(self, kind)
+        waiters, cache[key] = cache[key], value
+        for d in waiters:
+            d.callback(value)
+
+    def failed(self, failure, queued):
+        for kind in ['ips', 'names']:
+            cache = getattr(self, kind)
+            for key in queued.get(kind, []):
+                waiters = cache.pop(key)
+                for d in waiters:
+                    d.errback(failure)
+
+    def found(self, snapshot, queued):
+        # An invalid value only fails its own renders
+        for kind, check in [('ips', lambda ip: snapshot.ip(ip) is not None),
+                            ('names', lambda name: len(snapshot.name(name)) > 0)]:
+            for key in queued[kind]:
+                try:
+                    value = check(key)
+                except Exception:
+                    self.failed(Failure(), {kind: [key]})
+                else:
+                    self.resolved(value, kind, key)
+
+    def flush(self):
+        """Resolve all queued requests."""
+        self.pending = None
+        queued, self.queued = self.queued, {'ips': [], 'names': [], 'ptrs': []}
+        if queued['ips'] or queued['names']:
+            d = equipments.get(self.ctx, self.dbpool)
+            d.addCallbacks(self.found, self.failed,
+                           callbackArgs=(queued,), errbackArgs=(queued,))
+        for ip in queued['ptrs']:
+            ptr = '.'.join(ip.split('.')[::-1]) + '.in-addr.arpa'
+            d = client.lookupPointer(ptr)
+            d.addErrback(lambda x: None)
+            d.addCallback(self.resolved, 'ptrs', ip)
+
+    def ip(self, ip):
+        """Tell if the given IP belongs to a known equipment.
+
+        @return: a deferred firing with C{True} or C{False}
+        """
+        return self.lookup('ips', str(ip))
+
+    def hostname(self, name):
+        """Tell if the given name is the name of a known equipment.
+
+        @return: a deferred firing with C{True} or C{False}
+        """
+        return self.lookup('names', name)
+
+    def ptr(self, ip):
+        """Get the reverse DNS answer for the given IP.
+
+        @return: a deferred firing with the DNS answer or C{None}
+        """
+        return self.lookup('ptrs', str(ip))
+
+    def prefetch(self, stan):
+        """Queue IP and hostnames rendered by the given stan tree.
+
+        @return: C{stan}
+        """
+        todo = [stan]
+        while todo:
+            node = todo.pop()
+            if type(node) in [list, tuple]:
+                todo.extend(node)
+                continue
+            if not isinstance(node, Tag):
+                continue
+            if isinstance(node.render, directive) and \
+                    isinstance(node.data, basestring):
+                if node.render.name == "ip":
+                    self.want('ips', str(node.data))
+                    self.want('ptrs', str(node.data))
+                elif node.render.name == "hostname":
+                    self.want('names', node.data)
+            if isinstance(node.data, Tag):
+                todo.append(node.data)
+            todo.extend(node.children)
+        return stan
+
 class RenderMixIn:
     """Helper class that provide some builtin fragments"""
 
@@ -18,11 +161,15 @@ class RenderMixIn:
         return ctx.tag(href= "api/%s/%s" % (".".join([str(x) for x in IApiVersion(ctx)]),
                                             ctx.tag.attributes["href"]))
 
+    def prefetch(self, ctx, stan):
+        """Queue IP and hostnames rendered by the given stan tree.
+
+        @return: C{stan}
+        """
+        return Resolver.get(ctx, self.dbpool).prefetch(stan)
+
     def render_ip(self, ctx, ip):
-        d = self.dbpool.runQueryInPast(ctx,
-                                 "SELECT ip FROM equipment_full WHERE ip=%(ip)s "
-                                 "AND deleted='infinity'",
-                                 {'ip': ip})
+        d = Resolver.get(ctx, self.dbpool).ip(ip)
         d.addCallback(lambda x: T.invisible[
                 x and
                 T.a(href="equipment/%s/" % ip, render=self.render_apiurl) [ ip ] or
@@ -32,10 +179,7 @@ class RenderMixIn:
         return d
 
     def data_solvedip(self, ctx, ip):
-        ptr = '.'.join(ip.split('.')[::-1]) + '.in-addr.arpa'
-        d = client.lookupPointer(ptr)
-        d.addErrback(lambda x: None)
-        return d
+        return Resolver.get(ctx, self.dbpool).ptr(ip)
 
     def render_zwsp(self, name):
         return T.span(_class="wrap")[name]
@@ -52,11 +196,7 @@ class RenderMixIn:
         return T.a(href="search/%s/" % mac, render=self.render_apiurl) [ mac ]
 
     def render_hostname(self, ctx, name):
-        d = self.dbpool.runQueryInPast(ctx,
-                                 "SELECT name FROM equipment_full "
-                                 "WHERE lower(name)=lower(%(name)s) "
-                                 "AND deleted='infinity'",
-                                 {'name': name})
+        d = Resolver.get(ctx, self.dbpool).hostname(name)
         d.addCallback(lambda x: x and
                       T.a(href="equipment/%s/" % name,
                           render=self.render_apiurl) [ self.render_zwsp(name) ] or
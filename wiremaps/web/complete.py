@@ -3,6 +3,7 @@ import re
 from nevow import rend, tags as T, loaders
 
 from wiremaps.web.json import JsonPage
+from wiremaps.web.timetravel import Query
 
 COMPLETE_LIMIT = 10
 
@@ -117,22 +118,27 @@ class CompleteEquipmentResource(JsonPage):
      - lldp.sysname
     """
 
+    # We favour equipment.name. Prefixes are matched with lower() to
+    # use the indexes on lower(name) and lower(sysname).
+    query = Query("""SELECT name FROM
+((SELECT DISTINCT name FROM equipment_full WHERE deleted='infinity'
+AND lower(name) LIKE lower(%(name)s)||'%%'
+ORDER BY name LIMIT %(l)s) UNION
+(SELECT DISTINCT sysname FROM
+ ((SELECT sysname FROM lldp_full WHERE deleted='infinity') UNION
+  (SELECT sysname FROM edp_full WHERE deleted='infinity') UNION
+  (SELECT sysname FROM cdp_full WHERE deleted='infinity')) AS foo
+ WHERE lower(sysname) LIKE lower(%(name)s)||'%%' ORDER BY sysname LIMIT %(l)s))
+AS bar ORDER BY name""")
+
     def __init__(self, dbpool, name):
         self.name = name
         self.dbpool = dbpool
         JsonPage.__init__(self)
 
     def data_json(self, ctx, data):
-        # We favour equipment.name
-        d = self.dbpool.runQueryInPast(ctx,
-                                 """SELECT name FROM
-((SELECT DISTINCT name FROM equipment_full WHERE deleted='infinity' AND name ILIKE %(name)s||'%%'
-ORDER BY name LIMIT %(l)s) UNION
-(SELECT DISTINCT sysname FROM
- ((SELECT sysname FROM lldp_full WHERE deleted='infinity') UNION
-  (SELECT sysname FROM edp_full WHERE deleted='infinity') UNION
-  (SELECT sysname FROM cdp_full WHERE deleted='infinity')) AS foo WHERE sysname ILIKE %(name)s||'%%' ORDER BY sysname LIMIT %(l)s))
-AS bar ORDER BY name""", {'name': self.name,
-                   'l': COMPLETE_LIMIT})
+        d = self.dbpool.runQueryInPast(ctx, self.query,
+                                       {'name': self.name,
+                                        'l': COMPLETE_LIMIT})
         d.addCallback(lambda x: [y[0] for y in x])
         return d
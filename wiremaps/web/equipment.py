@@ -1,6 +1,7 @@
 from nevow import rend, loaders, tags as T
 from wiremaps.web.common import RenderMixIn, IApiVersion
 from wiremaps.web.json import JsonPage
+from wiremaps.web.cache import equipments
 from wiremaps.web import ports
 
 class EquipmentResource(JsonPage):
@@ -138,9 +139,7 @@ class RefreshEquipmentResource(JsonPage):
         return d
 
     def data_json(self, ctx, data):
-        d = self.dbpool.runQueryInPast(ctx,
-                                 "SELECT ip FROM equipment_full "
-                                 "WHERE ip=%(ip)s AND deleted='infinity'",
-                                 {'ip': str(self.ip)})
+        d = equipments.get(ctx, self.dbpool)
+        d.addCallback(lambda snapshot: snapshot.ip(self.ip))
         d.addCallback(self.gotEquipment)
         return d
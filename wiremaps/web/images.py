@@ -10,6 +10,8 @@ from nevow import rend, appserver, static, inevow
 from nevow.url import URLRedirectAdapter
 from IPy import IP
 
+from wiremaps.web.cache import equipments
+
 class ImageResource(rend.Page):
 
     image_dir = resource_filename(__name__, "images")
@@ -31,20 +33,14 @@ class ImageResource(rend.Page):
         # Is it an IP?
         try:
             ip = IP(oid)
-            d = self.dbpool.runQueryInPast(ctx,
-                                     "SELECT oid FROM equipment_full "
-                                     "WHERE ip=%(ip)s AND deleted='infinity'",
-                                     {'ip': str(ip)})
+            d = equipments.get(ctx, self.dbpool)
+            d.addCallback(lambda snapshot: snapshot.ip(ip))
         except ValueError:
             # Is it an hostname or an OID?
             if not re.match(r"[0-9\.]+", oid):
                 # This should be an hostname
-                d = self.dbpool.runQueryInPast(ctx,
-                                         "SELECT oid FROM equipment_full "
-                                         "WHERE deleted='infinity' "
-                                         "AND (name=%(name)s "
-                                         "OR name ILIKE %(name)s||'.%%')",
-                                         {'name': oid})
+                d = equipments.get(ctx, self.dbpool)
+                d.addCallback(lambda snapshot: snapshot.hostname(oid)[:1])
             else:
                 # It's an OID!
                 if oid.startswith("."):
@@ -62,12 +58,14 @@ class ImageResource(rend.Page):
         """
         Return a redirect to the appropriate file
 
-        @param oid: OID to use to locate image (can be C{[[oid],...]})
+        @param oid: equipment whose OID should be used to locate
+           image (can be C{[equipment,...]})
         @return: C{static.File} of the corresponding image
         """
         if oid:
             if type(oid) == list:
-                oid = oid[0][0]
+                oid = oid[0]
+            oid = oid[2]
             request = inevow.IRequest(ctx)
             print request.URLPath().child(oid)
             return URLRedirectAdapter(request.URLPath().child(oid)), ()
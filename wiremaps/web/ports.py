@@ -3,7 +3,8 @@ from nevow import loaders, rend
 from nevow import tags as T
 
 from wiremaps.web.json import JsonPage
-from wiremaps.web.common import FragmentMixIn
+from wiremaps.web.common import FragmentMixIn, Resolver
+from wiremaps.web.timetravel import Query
 
 class PortDetailsResource(JsonPage):
     """Give some details on the port.
@@ -59,8 +60,16 @@ class PortDetailsResource(JsonPage):
             l.append(detail.collectDetails())
         d = defer.DeferredList(l, consumeErrors=True)
         d.addCallback(self.flattenList)
+        d.addCallback(self.prefetch, ctx)
         return d
 
+    def prefetch(self, data, ctx):
+        """Queue IP and hostnames of all details to resolve them at once."""
+        resolver = Resolver.get(ctx, self.dbpool)
+        for detail in data:
+            resolver.prefetch(detail[1].docFactory.stan)
+        return data
+
 class PortRelatedDetails:
     """Return a list of port related details.
 
@@ -101,7 +110,7 @@ class PortRelatedDetails:
 
 class PortDetailsRemoteLldp(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT DISTINCT re.name, rp.name
 FROM lldp_full l, equipment_full re, equipment_full le, port_full lp, port_full rp
 WHERE (l.mgmtip=le.ip OR l.sysname=le.name)
@@ -113,7 +122,7 @@ AND l.port=rp.index AND rp.equipment=re.ip
 AND l.deleted='infinity' AND re.deleted='infinity'
 AND le.deleted='infinity' AND lp.deleted='infinity'
 AND rp.deleted='infinity'
-"""
+""")
 
     def render(self, data):
         return [
@@ -128,7 +137,7 @@ AND rp.deleted='infinity'
 class PortDetailsVlan(PortRelatedDetails):
 
     
-    query = """
+    query = Query("""
 SELECT COALESCE(l.vid, r.vid) as vvid, l.name, r.name
 FROM
 (SELECT * FROM vlan_full
@@ -138,7 +147,7 @@ FULL OUTER JOIN
  WHERE deleted='infinity' AND equipment=%(ip)s AND port=%(port)s AND type='remote') r
 ON l.vid = r.vid
 ORDER BY vvid
-"""
+""")
 
     def render(self, data):
         r = []
@@ -175,7 +184,7 @@ ORDER BY vvid
 
 class PortDetailsFdb(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT DISTINCT f.mac, MIN(a.ip::text)::inet AS minip
 FROM fdb_full f LEFT OUTER JOIN arp_full a
 ON a.mac = f.mac AND a.deleted='infinity'
@@ -185,7 +194,7 @@ AND f.deleted='infinity'
 GROUP BY f.mac
 ORDER BY minip ASC, f.mac
 LIMIT 20
-"""
+""")
 
     def render(self, data):
         r = []
@@ -217,12 +226,12 @@ LIMIT 20
 
 class PortDetailsSpeed(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT p.speed, p.duplex, p.autoneg
 FROM port_full p
 WHERE p.equipment=%(ip)s AND p.index=%(port)s
 AND p.deleted='infinity'
-"""
+""")
 
     def render(self, data):
         result = []
@@ -248,13 +257,13 @@ AND p.deleted='infinity'
 
 class PortDetailsMac(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT mac
 FROM port_full
 WHERE equipment=%(ip)s AND index=%(port)s
 AND mac IS NOT NULL
 AND deleted='infinity'
-"""
+""")
 
     def render(self, data):
         return [("MAC", T.invisible(data=data[0][0],
@@ -263,7 +272,7 @@ AND deleted='infinity'
 
 class PortDetailsTrunkComponents(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT p.name
 FROM trunk_full t, port_full p
 WHERE t.equipment=%(ip)s AND t.port=%(port)s
@@ -272,7 +281,7 @@ AND p.index=t.member
 AND t.deleted='infinity'
 AND p.deleted='infinity'
 ORDER BY p.index
-"""
+""")
 
     def render(self, data):
         return [("Trunk / Ports",
@@ -281,7 +290,7 @@ ORDER BY p.index
 
 class PortDetailsTrunkMember(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT p.name
 FROM trunk_full t, port_full p
 WHERE t.equipment=%(ip)s AND t.member=%(port)s
@@ -290,7 +299,7 @@ AND p.index=t.port
 AND p.deleted='infinity'
 AND t.deleted='infinity'
 LIMIT 1
-"""
+""")
 
     def render(self, data):
         return [("Trunk / Member of",
@@ -298,12 +307,12 @@ LIMIT 1
 
 class PortDetailsSonmp(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT DISTINCT remoteip, remoteport
 FROM sonmp_full WHERE equipment=%(ip)s
 AND port=%(port)s
 AND deleted='infinity'
-"""
+""")
 
     def render(self, data):
         return [("SONMP / IP",
@@ -315,12 +324,12 @@ AND deleted='infinity'
 
 class PortDetailsEdp(PortRelatedDetails):
 
-    query = """
+    query = Query("""
 SELECT DISTINCT sysname, remoteslot, remoteport
 FROM edp_full WHERE equipment=%(ip)s
 AND port=%(port)s
 And deleted='infinity'
-"""
+""")
 
     def render(self, data):
         return [("EDP / Host",
@@ -350,19 +359,19 @@ class PortDetailsDiscovery(PortRelatedDetails):
 class PortDetailsLldp(PortDetailsDiscovery):
 
     discovery_name = "LLDP"
-    query = """
+    query = Query("""
 SELECT DISTINCT mgmtip, sysdesc, sysname, portdesc
 FROM lldp_full WHERE equipment=%(ip)s
 AND port=%(port)s
 AND deleted='infinity'
-"""
+""")
 
 class PortDetailsCdp(PortDetailsDiscovery):
     
     discovery_name = "CDP"
-    query = """
+    query = Query("""
 SELECT DISTINCT mgmtip, platform, sysname, portname
 FROM cdp_full WHERE equipment=%(ip)s
 AND port=%(port)s
 AND deleted='infinity'
-"""
+""")
@@ -8,6 +8,8 @@ from nevow import tags as T
 
 from wiremaps.web.common import FragmentMixIn, RenderMixIn
 from wiremaps.web.json import JsonPage
+from wiremaps.web.cache import equipments
+from wiremaps.web.timetravel import Query
 
 class SearchResource(rend.Page):
 
@@ -117,7 +119,7 @@ class SearchVlan(rend.Fragment, RenderMixIn):
                 ports[equip] = []
             if port not in ports[equip]:
                 ports[equip].append(port)
-        return ctx.tag["This VLAN can be found %sly on:" % self.type,
+        return self.prefetch(ctx, ctx.tag["This VLAN can be found %sly on:" % self.type,
                        T.ul [
                 [ T.li[
                         T.invisible(data=equip,
@@ -127,7 +129,7 @@ class SearchVlan(rend.Fragment, RenderMixIn):
                                             render=T.directive("ports")),
                                 ")"]
                         ] for equip in ports ]
-                ] ]
+                ] ])
 
 class SearchLocalVlan(SearchVlan):
 
@@ -215,19 +217,21 @@ class SearchIPResource(JsonPage, RenderMixIn):
 
 class SearchHostnameResource(JsonPage, RenderMixIn):
 
+    # Without pg_trgm, the substring search scans the table
+    query = Query("SELECT DISTINCT name, ip FROM equipment_full "
+                  "WHERE deleted='infinity' "
+                  "AND (name=%(name)s "
+                  "OR name ILIKE '%%'||%(name)s||'%%') "
+                  "ORDER BY name")
+
     def __init__(self, dbpool, name):
         self.name = name
         self.dbpool = dbpool
         JsonPage.__init__(self)
 
     def data_json(self, ctx, data):
-        d = self.dbpool.runQueryInPast(ctx,
-                                 "SELECT DISTINCT name, ip FROM equipment_full "
-                                 "WHERE deleted='infinity' "
-                                 "AND (name=%(name)s "
-                                 "OR name ILIKE '%%'||%(name)s||'%%') "
-                                 "ORDER BY name",
-                                 {'name': self.name})
+        d = self.dbpool.runQueryInPast(ctx, self.query,
+                                       {'name': self.name})
         d.addCallback(self.gotIP)
         return d
 
@@ -289,13 +293,13 @@ class SearchInDescription(rend.Fragment, RenderMixIn):
     def render_description(self, ctx, data):
         if not data:
             return ctx.tag["Nothing was found in descriptions"]
-        return ctx.tag["The following descriptions match the request:",
+        return self.prefetch(ctx, ctx.tag["The following descriptions match the request:",
                        T.ul[ [ T.li [
                     T.span(_class="data") [d[1]],
                     " from ",
                     T.span(data=d[0],
                            render=T.directive("hostname")), "." ]
-                               for d in data ] ] ]
+                               for d in data ] ] ])
 
 class SearchIPInDNS(rend.Fragment, RenderMixIn):
 
@@ -332,36 +336,41 @@ class SearchHostnameWithDiscovery(rend.Fragment, RenderMixIn):
         self.dbpool = dbpool
         rend.Fragment.__init__(self)
 
+    def discoveryQuery(table):
+        """Build the query searching a hostname in a discovery table."""
+        return Query("SELECT e.name, p.name "
+                     "FROM equipment_full e, port_full p, " + table + " l "
+                     "WHERE (l.sysname=%(name)s "
+                     "OR lower(l.sysname) LIKE lower(%(name)s) || '%%') "
+                     "AND l.port=p.index AND p.equipment=e.ip "
+                     "AND l.equipment=e.ip "
+                     "AND e.deleted='infinity' AND p.deleted='infinity' "
+                     "AND l.deleted='infinity' "
+                     "ORDER BY e.name")
+    discoveryQuery = staticmethod(discoveryQuery)
+
     def data_discovery(self, ctx, data):
-        return self.dbpool.runQueryInPast(ctx,
-                                    "SELECT e.name, p.name "
-                                    "FROM equipment_full e, port_full p, " + self.table + " l "
-                                    "WHERE (l.sysname=%(name)s OR l.sysname ILIKE %(name)s || '%%') "
-                                    "AND l.port=p.index AND p.equipment=e.ip "
-                                    "AND l.equipment=e.ip "
-                                    "AND e.deleted='infinity' AND p.deleted='infinity' "
-                                    "AND l.deleted='infinity' "
-                                    "ORDER BY e.name", {'name': self.name})
+        return self.dbpool.runQueryInPast(ctx, self.query, {'name': self.name})
 
     def render_discovery(self, ctx, data):
         if not data:
             return ctx.tag["This hostname has not been seen with %s." % self.protocolname]
-        return ctx.tag["This hostname has been seen with %s: " % self.protocolname,
+        return self.prefetch(ctx, ctx.tag["This hostname has been seen with %s: " % self.protocolname,
                        T.ul[ [ T.li [
                     "from port ",
                     T.span(_class="data") [d[1]],
                     " of ",
                     T.span(data=d[0],
-                           render=T.directive("hostname")) ]  for d in data ] ] ]
+                           render=T.directive("hostname")) ]  for d in data ] ] ])
 
 class SearchHostnameInLldp(SearchHostnameWithDiscovery):
-    table = "lldp_full"
+    query = SearchHostnameWithDiscovery.discoveryQuery("lldp_full")
     protocolname = "LLDP"
 class SearchHostnameInCdp(SearchHostnameWithDiscovery):
-    table = "cdp_full"
+    query = SearchHostnameWithDiscovery.discoveryQuery("cdp_full")
     protocolname = "CDP"
 class SearchHostnameInEdp(SearchHostnameWithDiscovery):
-    table = "edp_full"
+    query = SearchHostnameWithDiscovery.discoveryQuery("edp_full")
     protocolname = "EDP"
 
 class SearchMacInFdb(rend.Fragment, RenderMixIn):
@@ -395,7 +404,7 @@ ORDER BY c, e.name, p.index
     def render_macfdb(self, ctx, data):
         if not data:
             return ctx.tag["I did not find this MAC on any FDB entry."]
-        return ctx.tag["This MAC was found in FDB of the following equipments: ",
+        return self.prefetch(ctx, ctx.tag["This MAC was found in FDB of the following equipments: ",
                        T.ul [ [ T.li[
                     T.invisible(data=l[0],
                                 render=T.directive("hostname")),
@@ -403,7 +412,7 @@ ORDER BY c, e.name, p.index
                                       render=T.directive("ip")), ") "
                     "on port ", T.span(_class="data") [ l[2] ],
                     " (out of %d MAC address%s)" % (l[4], l[4]>1 and "es" or "") ]
-                         for l in data] ] ]
+                         for l in data] ] ])
 
 class SearchMacInInterfaces(rend.Fragment, RenderMixIn):
 
@@ -429,14 +438,14 @@ class SearchMacInInterfaces(rend.Fragment, RenderMixIn):
     def render_macif(self, ctx, data):
         if not data:
             return ctx.tag["I did not find this MAC on any interface."]
-        return ctx.tag["This MAC was found on the following interfaces: ",
+        return self.prefetch(ctx, ctx.tag["This MAC was found on the following interfaces: ",
                        T.ul [ [ T.li[
                     T.invisible(data=l[0],
                                 render=T.directive("hostname")),
                     " (", T.invisible(data=l[1],
                                       render=T.directive("ip")), ") "
                     "interface ", T.span(_class="data") [ l[2] ] ]
-                         for l in data] ] ]
+                         for l in data] ] ])
 
 class SearchIPInEquipment(rend.Fragment, RenderMixIn):
 
@@ -449,10 +458,9 @@ class SearchIPInEquipment(rend.Fragment, RenderMixIn):
         rend.Fragment.__init__(self)
 
     def data_ipeqt(self, ctx, data):
-        return self.dbpool.runQueryInPast(ctx,
-                                    "SELECT e.name FROM equipment_full e "
-                                    "WHERE e.ip=%(ip)s AND e.deleted='infinity'",
-                                    {'ip': self.ip})
+        d = equipments.get(ctx, self.dbpool)
+        d.addCallback(lambda snapshot: snapshot.ip(self.ip))
+        return d
 
     def render_ipeqt(self, ctx, data):
         if not data:
@@ -464,7 +472,7 @@ class SearchIPInEquipment(rend.Fragment, RenderMixIn):
                        T.span(data=self.ip,
                               render=T.directive("ip")),
                        " belongs to ",
-                       T.span(data=data[0][0],
+                       T.span(data=data[1],
                               render=T.directive("hostname")),
                        "."]
 
@@ -492,7 +500,7 @@ class SearchIPInSonmp(rend.Fragment, RenderMixIn):
     def render_sonmp(self, ctx, data):
         if not data:
             return ctx.tag["This IP has not been seen with SONMP."]
-        return ctx.tag["This IP has been seen with SONMP: ",
+        return self.prefetch(ctx, ctx.tag["This IP has been seen with SONMP: ",
                        T.ul[ [ T.li [
                     "from port ",
                     T.span(_class="data") [d[1]],
@@ -501,7 +509,7 @@ class SearchIPInSonmp(rend.Fragment, RenderMixIn):
                            render=T.directive("hostname")),
                     " connected to port ",
                     T.span(data=d[2], _class="data",
-                           render=T.directive("sonmpport")) ] for d in data] ] ]
+                           render=T.directive("sonmpport")) ] for d in data] ] ])
 
 class SearchIPInDiscovery(rend.Fragment, RenderMixIn):
 
@@ -517,7 +525,7 @@ class SearchIPInDiscovery(rend.Fragment, RenderMixIn):
     def render_discovery(self, ctx, data):
         if not data:
             return ctx.tag["This IP has not been seen with %s." % self.discovery_name]
-        return ctx.tag["This IP has been seen with %s: " % self.discovery_name,
+        return self.prefetch(ctx, ctx.tag["This IP has been seen with %s: " % self.discovery_name,
                        T.ul [ [ T.li [
                     "from port ",
                     T.span(_class="data") [d[1]],
@@ -528,7 +536,7 @@ class SearchIPInDiscovery(rend.Fragment, RenderMixIn):
                     T.span(_class="data") [d[2]],
                     " of ",
                     T.span(data=d[3],
-                           render=T.directive("hostname"))] for d in data] ] ]
+                           render=T.directive("hostname"))] for d in data] ] ])
 
 class SearchIPInLldp(SearchIPInDiscovery):
 
@@ -1,4 +1,6 @@
 import re
+import itertools
+import weakref
 from zope.interface import Interface
 from twisted.python import log
 from nevow import rend, tags as T, loaders
@@ -7,6 +9,110 @@ class IPastDate(Interface):
     """Remember a past date for time travel"""
     pass
 
+class Statement:
+    """A SQL statement run as a prepared statement when possible.
+
+    The statement is prepared once on each connection it is run
+    on. If PostgreSQL cannot guess the type of a parameter, it is
+    always run as a regular query. On other errors, it is run as a
+    regular query this time only.
+    """
+
+    _unpreparable = ("42P18",   # indeterminate_datatype
+                     "42725")   # ambiguous_function
+
+    _regexp_param = re.compile(r"%\((\w+)\)s|%%")
+    _count = itertools.count()
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.name = "wiremaps_%d" % Statement._count.next()
+        self.params = []
+        def param(mo):
+            if mo.group(1) is None:
+                return "%"
+            if mo.group(1) not in self.params:
+                self.params.append(mo.group(1))
+            return "$%d" % (self.params.index(mo.group(1)) + 1)
+        self.prepare = "PREPARE %s AS %s" % (self.name,
+                                             self._regexp_param.sub(param, sql))
+        self.execute = "EXECUTE %s" % self.name
+        if self.params:
+            self.execute = "%s (%s)" % (self.execute,
+                                        ", ".join(["%%(%s)s" % p
+                                                   for p in self.params]))
+        self.preparable = True
+        # Connection -> backend PID, for connections where the
+        # statement is prepared. Closed connections go away.
+        self.connections = weakref.WeakKeyDictionary()
+
+    def run(self, txn, dic=None):
+        """Run the statement.
+
+        @param txn: transaction to use
+        @param dic: parameters of the statement
+        @return: all rows returned by the statement
+        """
+        connection = txn.connection
+        key = None
+        if self.preparable and hasattr(connection, "get_backend_pid"):
+            key = connection.get_backend_pid()
+            if self.connections.get(connection) != key:
+                txn.execute("SAVEPOINT wiremaps_prepare")
+                try:
+                    txn.execute(self.prepare)
+                except Exception, e:
+                    log.msg("unable to prepare %r: %s" % (self.sql, e))
+                    txn.execute("ROLLBACK TO SAVEPOINT wiremaps_prepare")
+                    if getattr(e, "pgcode", None) in self._unpreparable:
+                        self.preparable = False
+                    key = None
+                else:
+                    txn.execute("RELEASE SAVEPOINT wiremaps_prepare")
+                    self.connections[connection] = key
+        if key is None:
+            if dic:
+                txn.execute(self.sql, dic)
+            else:
+                txn.execute(self.sql)
+        elif self.params:
+            txn.execute(self.execute, dic)
+        else:
+            txn.execute(self.execute)
+        return txn.fetchall()
+
+class Query:
+    """A query that can be run in the present or in the past.
+
+    Both variants are computed once, when the query is built. Queries
+    known at import time should be built then. Other queries are
+    registered on first use with L{Query.get}.
+    """
+
+    _registry = {}              # SQL -> Query
+    _regexp_deleted = re.compile(r"(?:(\w+)\.|)deleted='infinity'")
+    _regexp_full = re.compile(r"\B_full\b")
+
+    def __init__(self, sql):
+        def convert(mo):
+            if mo.group(1):
+                suffix = "%s." % mo.group(1)
+            else:
+                suffix = ""
+            return " AND ".join(['(%screated < %%(__date)s::abstime' % suffix,
+                                 '%sdeleted > %%(__date)s::abstime)' % suffix])
+        self.present = Statement(Query._regexp_full.sub("", sql))
+        self.past = Statement(Query._regexp_deleted.sub(convert, sql))
+
+    def get(cls, sql):
+        """Get the query for the given SQL text, registering it if needed."""
+        try:
+            return cls._registry[sql]
+        except KeyError:
+            query = cls._registry[sql] = cls(sql)
+            return query
+    get = classmethod(get)
+
 class PastConnectionPool:
     """Proxy for an existing connection pool to run queries in the past.
 
@@ -16,9 +122,6 @@ class PastConnectionPool:
     date).
     """
 
-    _regexp_deleted = re.compile(r"(?:(\w+)\.|)deleted='infinity'")
-    _regexp_full = re.compile(r"\B_full\b")
-
     def __init__(self, orig):
         self._orig = orig
 
@@ -29,35 +132,32 @@ class PastConnectionPool:
         """Run the specified query in the past.
 
         Occurences of C{deleted='infinity'} are replaced by C{(created
-        < %(__date)s AND deleted > %(__date)s)}
-        """
+        < %(__date)s AND deleted > %(__date)s)}. Since C{_full} views
+        are C{UNION ALL}, PostgreSQL pushes those conditions into the
+        current and the past tables and uses the index on C{deleted}
+        of the past table to only read rows deleted after the date.
+        In the present, C{_full} views are not used at all.
 
-        def convert(date, mo):
-            if mo.group(1):
-                suffix = "%s." % mo.group(1)
-            else:
-                suffix = ""
-            return " AND ".join(['(%screated < %%(__date)s::abstime' % suffix,
-                                 '%sdeleted > %%(__date)s::abstime)' % suffix])
+        The rewritten queries are computed only once for a given SQL
+        text and run as prepared statements.
+
+        @param query: SQL text or L{Query} to run
+        """
+        if not isinstance(query, Query):
+            query = Query.get(query)
 
         # Try to get the date from the context
         try:
             date = ctx.locate(IPastDate)
         except KeyError:
             # Not in the past
-            query = PastConnectionPool._regexp_full.sub("", query)
-            if dic:
-                return self._orig.runQuery(query, dic)
-            else:
-                return self._orig.runQuery(query)
+            return self._orig.runInteraction(query.present.run, dic)
 
         # We need to run this request in the past
         if not dic:
             dic = {}
         dic["__date"] = date
-        q = PastConnectionPool._regexp_deleted.sub(
-            lambda x: convert(date, x), query)
-        return self._orig.runQuery(q, dic)
+        return self._orig.runInteraction(query.past.run, dic)
 
 class PastResource(rend.Page):
     """This is a special resource that needs to be instanciated with